@@ -0,0 +1,225 @@
+import os
+import sys
+import math
+import time
+import random
+import getopt
+
+# Display power states, in order of decreasing power
+DISPLAY_STATES = ('on', 'dim', 'off')
+FULL_CONTRAST = 0xCF  # luma's default SSD1306 contrast
+DIM_CONTRAST = 0x08
+
+# Metrics the policy watches (declared as the 'adaptive' consumer in application.py)
+TEMPERATURES = ('cpu_temp', 'case_temp')
+LOAD = 'cpu_usage'
+
+
+class AdaptivePolicy:
+    """
+    Chooses the period of the next monitor tick and the display power state.
+    While temperatures and load are stable the period grows by `growth` every
+    tick, up to `max_period`. A temperature that moved at least `deadband` °C
+    from its reference value at `slope_threshold` °C/min or faster, or a load
+    step of `load_step` percent points, brings the period back to `min_period`.
+    Any change resets the inactivity timer: the display is dimmed after
+    `dim_after` seconds without a change and switched off after `blank_after`,
+    the next change wakes it.
+    """
+    def __init__(self, min_period=1.0, max_period=8.0, growth=1.5, slope_threshold=2.0, deadband=1.0,
+                 load_step=20.0, dim_after=60, blank_after=300):
+        self.min_period = min_period
+        self.max_period = max_period
+        self.growth = growth
+        self.slope_threshold = slope_threshold
+        self.deadband = deadband
+        self.load_step = load_step
+        self.dim_after = dim_after
+        self.blank_after = blank_after
+        self.period = min_period
+        self.display_state = 'on'
+        self.changed = False       # Last update saw a change
+        self.fast = False          # Last update saw a fast change
+        self._reference = {}       # name -> (time, value) of the last change
+        self._last_change = None
+
+    def update(self, now, values):
+        # now: seconds on a monotonic clock, values: {name: value} of the watched metrics
+        # Returns the period in seconds until the next tick
+        changed = fast = False
+        reference = self._reference
+        for name in TEMPERATURES:
+            value = values.get(name)
+            if not isinstance(value, (int, float)):
+                continue
+            if name not in reference:
+                reference[name] = (now, value)
+                continue
+            t0, v0 = reference[name]
+            delta = value - v0
+            if abs(delta) >= self.deadband:
+                changed = True
+                elapsed = now - t0
+                if elapsed <= 0 or abs(delta) * 60.0 / elapsed >= self.slope_threshold:
+                    fast = True
+                reference[name] = (now, value)
+        load = values.get(LOAD)
+        if isinstance(load, (int, float)):
+            if LOAD not in reference:
+                reference[LOAD] = (now, load)
+            elif abs(load - reference[LOAD][1]) >= self.load_step:
+                changed = fast = True
+                reference[LOAD] = (now, load)
+
+        if fast:
+            self.period = self.min_period
+        elif not changed:
+            self.period = min(self.max_period, self.period * self.growth)
+
+        if changed or self._last_change is None:
+            self._last_change = now
+        idle = now - self._last_change
+        if idle >= self.blank_after:
+            self.display_state = 'off'
+        elif idle >= self.dim_after:
+            self.display_state = 'dim'
+        else:
+            self.display_state = 'on'
+        self.changed = changed
+        self.fast = fast
+        return self.period
+
+
+class UsageReport:
+    """
+    Wake-ups and I2C transactions of the monitor loop, as totals and per hour.
+    Expansion board transactions are the metric samples of the 'i2c' stage,
+    display transactions are frames shown plus contrast and power commands.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.wakeups = 0
+        self.board_transactions = 0
+        self.display_transactions = 0
+
+    def per_hour(self, now=None):
+        # {counter: transactions per hour} since the report was created
+        elapsed = (now if now is not None else self.clock()) - self.started
+        scale = 3600.0 / elapsed if elapsed > 0 else 0.0
+        return {
+            'wakeups': self.wakeups * scale,
+            'board_i2c': self.board_transactions * scale,
+            'display_i2c': self.display_transactions * scale,
+            'i2c': (self.board_transactions + self.display_transactions) * scale,
+        }
+
+    def summary(self, now=None):
+        rates = self.per_hour(now)
+        return (f"{rates['wakeups']:.0f} wake-ups/h, {rates['i2c']:.0f} I2C transactions/h "
+                f"(board {rates['board_i2c']:.0f}, display {rates['display_i2c']:.0f})")
+
+
+class VirtualClock:
+    """Monotonic clock for simulated runs: sleep() advances the time instead of waiting"""
+    def __init__(self):
+        self.now_ns = 0
+
+    def monotonic_ns(self):
+        return self.now_ns
+
+    def monotonic(self):
+        return self.now_ns / 1e9
+
+    def sleep(self, seconds):
+        self.now_ns += max(0, int(seconds * 1e9))
+
+
+def scenario(t):
+    """
+    Simulated day on the desk, t in seconds: idle, a 10 minute full-load job
+    after 20 minutes, cool down, idle again (repeats every hour).
+    Returns (CPU temperature, case temperature, CPU usage).
+    """
+    t = t % 3600
+    noise = 0.2 * math.sin(t / 7.0) + 0.15 * math.sin(t / 3.1)
+    heat = 0.0
+    load = 3.0
+    if 1200 <= t < 1800:
+        heat = 1.0 - math.exp(-(t - 1200) / 90.0)
+        load = 95.0
+    elif t >= 1800:
+        heat = (1.0 - math.exp(-600 / 90.0)) * math.exp(-(t - 1800) / 150.0)
+    return 42.0 + 20.0 * heat + noise, 32.0 + 8.0 * heat, load
+
+
+def compare(hours=1.0, verbose=True):
+    """
+    Run Pi_Monitor on the simulated board for `hours` of virtual time in fixed
+    and in adaptive mode and report wake-ups and I2C transactions per hour.
+    The board and display counters (SimulatedExpansion.transactions,
+    DummyDisplay.bytes_sent) are reported next to the loop's own counts.
+    """
+    os.environ['PI_MONITOR_SHM'] = '0'
+    os.environ['PI_MONITOR_SCROLL'] = 'off'
+    from application import Pi_Monitor
+    from oled import OLED
+    from simulated import SimulatedExpansion, DummyDisplay
+
+    class ScenarioMonitor(Pi_Monitor):
+        # CPU temperature and load come from the scenario instead of the host, the host's fan is not read
+        def get_raspberry_cpu_temperature(self):
+            return round(scenario(clock.monotonic())[0] + random.uniform(-0.3, 0.3), 1)
+
+        def get_raspberry_cpu_usage(self):
+            return scenario(clock.monotonic())[2]
+
+        def get_raspberry_fan_pwm(self):
+            return -1
+
+    results = {}
+    for adaptive in (False, True):
+        random.seed(1)
+        clock = VirtualClock()
+        expansion = SimulatedExpansion()
+        display = DummyDisplay()
+        os.environ['PI_MONITOR_ADAPTIVE'] = '1' if adaptive else '0'
+        monitor = ScenarioMonitor(oled=OLED(device=display), expansion=expansion)
+        setup_transactions = expansion.transactions
+        setup_bytes = display.bytes_sent
+        monitor.usage = UsageReport(clock.monotonic)
+        end_ns = int(hours * 3600e9)
+
+        def sleep(seconds):
+            clock.sleep(seconds)
+            expansion.temperature = scenario(clock.monotonic())[1]
+            if clock.now_ns >= end_ns:
+                monitor.stop_event.set()
+
+        monitor.run_monitor_loop(sleep=sleep, clock=clock.monotonic_ns)
+        rates = monitor.usage.per_hour(clock.monotonic())
+        rates['board_measured'] = (expansion.transactions - setup_transactions) / hours
+        rates['display_bytes'] = (display.bytes_sent - setup_bytes) / hours
+        mode = 'adaptive' if adaptive else 'fixed'
+        results[mode] = rates
+        monitor.cleanup()
+    if verbose:
+        print(f"{'':10}{'wake-ups/h':>12}{'I2C/h':>10}{'board/h':>10}{'display/h':>11}{'display kB/h':>14}")
+        for mode, rates in results.items():
+            print(f"{mode:10}{rates['wakeups']:>12.0f}{rates['i2c']:>10.0f}{rates['board_measured']:>10.0f}"
+                  f"{rates['display_i2c']:>11.0f}{rates['display_bytes'] / 1000:>14.1f}")
+    return results
+
+
+if __name__ == '__main__':
+    usage = 'Usage: adaptive.py --compare [--hours H]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "compare", "hours="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '--compare' not in options:
+        print(usage)
+        sys.exit(2)
+    compare(float(options.get('--hours', 1)))
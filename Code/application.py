@@ -10,7 +10,6 @@
 import os
 import sys
 import time
-import psutil
 import atexit
 import signal
 import socket
@@ -19,8 +18,18 @@ import datetime
 import logging
 import traceback
 
+from profiler import LoopProfiler, StartupTimeline
+startup = StartupTimeline()  # Startup milestones, see startup_bench.py
+
 from oled import OLED
-from expansion import Expansion, set_led_palette
+from providers import MetricRegistry
+from recorder import Recorder
+from monitor_log import setup_logging, StateChangeLogger
+from systemd_notify import Notifier
+from shared_telemetry import SharedTelemetryWriter, DEFAULT_PATH as TELEMETRY_PATH
+from adaptive import AdaptivePolicy, UsageReport, FULL_CONTRAST, DIM_CONTRAST
+from config import CONFIG_PATH, BOARD_SETTINGS, ConfigError, ConfigWatcher, load_config, defaults, diff, led_colors
+startup.mark('imports')
 
 #logging.basicConfig(filename='error.log', level=logging.ERROR)
 
@@ -40,17 +49,87 @@ def set_led_palette(expansion_board, palette=None, led_brightness=5):
 
 class Pi_Monitor:
     __slots__ = ['oled', 'expansion', 'font_size', 'cleanup_done', 
-                 'stop_event', '_fan_pwm_path', '_format_strings']
+                 'stop_event', '_fan_pwm_path', '_format_strings', 'profiler',
+                 'metrics', '_screens', 'trace',
+                 'logger', 'state_log', 'notifier', 'shared', 'fleet',
+                 'marquee', '_scroll_lines', '_scroll_mode', 'adaptive', 'usage',
+                 'config', 'config_path', '_config_watcher', '_reload_requested']
 
-    def __init__(self):
+    def __init__(self, profile=None, oled=None, expansion=None, trace=None):
         # Initialize OLED and Expansion objects
+        # oled/expansion can be passed in (e.g. stand-in devices from simulated.py),
+        # trace is a recorder.Recorder or recorder.Replayer that taps reads and writes
 
         self.oled = None
         self.expansion = None
-        self.font_size = 12
         self.cleanup_done = False
         self.stop_event = threading.Event()  # Keep for signal handling
+        self.notifier = Notifier()  # READY/WATCHDOG for the Type=notify unit of generate_service.py
+
+        # Settings from monitor_config.json or PI_MONITOR_CONFIG=<path> (see config.py), reloaded on SIGHUP
+        # and, with PI_MONITOR_CONFIG_WATCH=1, whenever the file changes
+        self.config_path = os.environ.get('PI_MONITOR_CONFIG', CONFIG_PATH)
+        try:
+            self.config = load_config(self.config_path)
+        except ConfigError as e:
+            print(f"Invalid config, using the defaults: {e}")
+            self.config = defaults()
+        self._reload_requested = False
+        self._config_watcher = None
+        if os.environ.get('PI_MONITOR_CONFIG_WATCH', '0') not in ('', '0'):
+            self._config_watcher = ConfigWatcher(self.config_path)
+        self.font_size = self.config['font_size']
+
+        # Loop instrumentation, enabled with PI_MONITOR_PROFILE=1 (dump with SIGUSR1)
+        if profile is None:
+            profile = os.environ.get('PI_MONITOR_PROFILE', '0') not in ('', '0')
+        self.profiler = LoopProfiler(enabled=profile)
+
+        # Record every sensor read and hardware write with PI_MONITOR_RECORD=<trace file>
+        if trace is None and os.environ.get('PI_MONITOR_RECORD'):
+            trace = Recorder(os.environ['PI_MONITOR_RECORD'])
+        self.trace = trace
+
+        # State-change logging through a non-blocking queue, optional JSONL sink with PI_MONITOR_LOG_JSONL=<file>
+        self.logger, _, _ = setup_logging(jsonl_path=os.environ.get('PI_MONITOR_LOG_JSONL'))
+        self.state_log = StateChangeLogger(self.logger,
+                                           summary_interval=int(os.environ.get('PI_MONITOR_LOG_SUMMARY', '300')))
         
+        # Latest values for other local processes, PI_MONITOR_SHM=<path> or 0 to disable (see shared_telemetry.py)
+        # Runs on stand-in devices (simulation, replay, benchmarks) only publish when PI_MONITOR_SHM is set,
+        # so they never touch the segment of the running service
+        self.shared = None
+        simulated = oled is not None or expansion is not None or trace is not None
+        shared_path = os.environ.get('PI_MONITOR_SHM', '0' if simulated else TELEMETRY_PATH)
+        if shared_path not in ('', '0'):
+            try:
+                self.shared = SharedTelemetryWriter(shared_path)
+            except (OSError, ValueError) as e:
+                print(f"Shared telemetry disabled: {e}")
+
+        # Batched UDP telemetry for the rack aggregator, PI_MONITOR_FLEET=<host:port> (see fleet.py)
+        self.fleet = None
+        if os.environ.get('PI_MONITOR_FLEET'):
+            from fleet import FleetPublisher, parse_address
+            self.fleet = FleetPublisher(parse_address(os.environ['PI_MONITOR_FLEET']), os.environ.get('PI_MONITOR_NODE'))
+
+        # Lines too wide for the display scroll in place, PI_MONITOR_SCROLL=content|window|off (see marquee.py)
+        self.marquee = None
+        self._scroll_lines = []
+        self._scroll_mode = os.environ.get('PI_MONITOR_SCROLL', 'content')
+
+        # Stretch the tick while nothing changes and dim/blank the idle display, PI_MONITOR_ADAPTIVE=1 (see adaptive.py)
+        # The longest tick stays within a third of the systemd watchdog interval: Notifier.watchdog() skips pings
+        # less than half an interval apart, so a skipped ping plus one more tick must still be under the interval
+        self.adaptive = None
+        if os.environ.get('PI_MONITOR_ADAPTIVE', '0') not in ('', '0'):
+            max_period = 8.0
+            if self.notifier.watchdog_interval:
+                max_period = max(1.0, min(max_period, self.notifier.watchdog_interval / 3))
+            # A configured period above the cap is clamped, the shortest tick must not be longer than the longest
+            self.adaptive = AdaptivePolicy(min_period=min(self.config['period'], max_period), max_period=max_period)
+        self.usage = UsageReport()  # Wake-ups and I2C transactions per hour, logged with SIGUSR1
+
         # Cache hwmon path lookup for performance
         self._fan_pwm_path = None
         
@@ -70,30 +149,131 @@ class Pi_Monitor:
             'led_mode': "LED Mode: {}"
         }
 
+        # The expansion board is initialized in parallel with the OLED splash screen
+        expansion_result = {}
+        expansion_thread = threading.Thread(target=self._init_expansion, args=(expansion, expansion_result), daemon=True)
+        expansion_thread.start()
+
         try:
-            self.oled = OLED()
+            self.oled = oled if oled is not None else OLED()
+            self.oled.show_splash()
+            startup.mark('first_frame')
+            if self.profiler.enabled:
+                self.oled.profiler = self.profiler
+            if self.trace is not None:
+                self.oled = self.trace.wrap_device(self.oled, 'oled')
         except Exception as e:
             traceback.print_exc()
             sys.exit(1)
 
-        try:
-            self.expansion = Expansion()
-            set_led_palette(self.expansion)
-            # self.expansion.set_led_mode(1)
-            # self.expansion.set_all_led_color(5, 5, 5)
-            self.expansion.set_fan_mode(2)
-            self.expansion.set_fan_threshold(45, 70)
-        except Exception as e:
-            traceback.print_exc()
+        expansion_thread.join()
+        if 'error' in expansion_result:
+            error = expansion_result['error']
+            traceback.print_exception(type(error), error, error.__traceback__)  # Three arguments for Python 3.9
             sys.exit(1)
+        self.expansion = expansion_result['expansion']
+        startup.mark('expansion_ready')
+
+        # Load the screen fonts in the background, the first screen is drawn a few seconds later
+        threading.Thread(target=self.oled.preload_fonts,
+                         args=((self.font_size, self.font_size - 1, self.font_size - 2),), daemon=True).start()
 
         atexit.register(self.cleanup)
         signal.signal(signal.SIGTERM, self.handle_signal)
         signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGUSR1, self.handle_dump_signal)
+        signal.signal(signal.SIGHUP, self.handle_reload_signal)
         
         # Initialize fan PWM path cache
         self._find_fan_pwm_path()
 
+        # Metric providers, sampled at most once per loop iteration
+        self.metrics = MetricRegistry(profiler=self.profiler)
+        self._register_metrics()
+
+    def _init_expansion(self, expansion, result):
+        """Create and configure the expansion board, runs in a thread during startup"""
+        try:
+            if expansion is None:
+                from expansion import Expansion
+                expansion = Expansion()
+            if self.trace is not None:
+                expansion = self.trace.wrap_device(expansion, 'expansion')
+            config = self.config
+            set_led_palette(expansion, {led_id: tuple(color) for led_id, color in enumerate(config['palette'])},
+                            config['led_brightness'])
+            # expansion.set_led_mode(1)
+            # expansion.set_all_led_color(5, 5, 5)
+            self._apply_fan_settings(expansion, config)
+            result['expansion'] = expansion
+        except Exception as e:
+            result['error'] = e
+
+    def _apply_fan_settings(self, expansion, config, previous=None):
+        # Fan mode with its duty (manual) or thresholds (auto), only what differs from `previous` is sent
+        mode = config['fan_mode']
+        mode_changed = previous is None or previous['fan_mode'] != mode
+        if mode_changed:
+            expansion.set_fan_mode(mode)
+        if mode == 1:
+            if mode_changed or previous['fan_duty'] != config['fan_duty']:
+                expansion.set_fan_duty(*config['fan_duty'])
+        elif mode_changed or previous['fan_threshold'] != config['fan_threshold']:
+            # Without thresholds in the config: the ones fitted by thermal.py, (45, 70) without a run
+            from thermal import load_fan_threshold
+            expansion.set_fan_threshold(*(config['fan_threshold'] or load_fan_threshold()))
+
+    def _register_metrics(self):
+        """Register metric providers and declare what each consumer reads"""
+        if self.trace is not None:
+            wrap = self.trace.wrap_metric
+            register = lambda name, provider, stage='sensors': self.metrics.register(name, wrap(name, provider), stage)
+        else:
+            register = self.metrics.register
+        register('date', self.get_raspberry_date)
+        register('weekday', self.get_raspberry_weekday)
+        register('time', self.get_raspberry_time)
+        register('netinfo', self.get_raspberry_netinfo)
+        register('cpu_usage', self.get_raspberry_cpu_usage)
+        register('memory_usage', self.get_raspberry_memory_usage)
+        register('disk_usage', self.get_raspberry_disk_usage)
+        register('cpu_temp', self.get_raspberry_cpu_temperature)
+        register('fan_pwm', self.get_raspberry_fan_pwm)
+        register('throttled', self.get_raspberry_throttled)
+        register('case_temp', self.get_computer_temperature, stage='i2c')
+        register('fan_mode', self.get_computer_fan_mode, stage='i2c')
+        register('fan_duty', self.get_computer_fan_duty, stage='i2c')
+        register('fan_threshold', self.get_computer_fan_threshold, stage='i2c')
+        register('led_mode', self.get_computer_led_mode, stage='i2c')
+
+        self.metrics.declare('console', ('case_temp', 'cpu_temp', 'fan_pwm', 'fan_mode', 'fan_threshold'))
+        self.metrics.declare('fleet', ('case_temp', 'cpu_temp', 'fan_pwm', 'fan_mode', 'cpu_usage', 'throttled'))
+        self.metrics.declare('adaptive', ('cpu_temp', 'case_temp', 'cpu_usage'))
+
+        for name, metrics, _ in self._screen_definitions():
+            self.metrics.declare(name, metrics)
+        self._screens = self._select_screens(self.config['screens'])
+
+    def _screen_definitions(self):
+        # Every OLED screen: (name, metrics, draw function)
+        screens = [
+            ('clock', ('date', 'weekday', 'time', 'led_mode'), self._draw_clock_screen),
+            ('netinfo', ('netinfo',), self._draw_netinfo_screen),
+            ('system', ('cpu_usage', 'memory_usage', 'disk_usage'), self._draw_system_screen),
+            ('thermal', ('cpu_temp', 'case_temp', 'fan_mode', 'fan_duty'), self._draw_thermal_screen),
+        ]
+        if self.profiler.enabled:
+            screens.append(('profile', (), self._draw_profile_screen))
+        return screens
+
+    def _select_screens(self, names):
+        # Screens in display order, the profile screen is always shown last when profiling
+        definitions = {screen[0]: screen for screen in self._screen_definitions()}
+        screens = [definitions[name] for name in names if name in definitions]
+        if 'profile' in definitions and 'profile' not in names:
+            screens.append(definitions['profile'])
+        return screens or [definitions['clock']]
+
     def _find_fan_pwm_path(self):
         """Cache the fan PWM path to avoid repeated directory lookups"""
         try:
@@ -135,6 +315,7 @@ class Pi_Monitor:
     def get_raspberry_cpu_usage(self):
         """Get the CPU usage percentage"""
         try:
+            import psutil  # Imported on first use to keep startup fast
             return psutil.cpu_percent(interval=0)
         except Exception:
             return 0
@@ -142,6 +323,7 @@ class Pi_Monitor:
     def get_raspberry_memory_usage(self):
         """Get the memory usage percentage"""
         try:
+            import psutil  # Imported on first use to keep startup fast
             memory = psutil.virtual_memory()
             return memory.percent
         except Exception:
@@ -150,6 +332,7 @@ class Pi_Monitor:
     def get_raspberry_disk_usage(self, path='/'):
         """Get the disk usage percentage for the specified path"""
         try:
+            import psutil  # Imported on first use to keep startup fast
             disk_usage = psutil.disk_usage(path)
             return disk_usage.percent
         except Exception:
@@ -183,6 +366,7 @@ class Pi_Monitor:
             hostname = socket.gethostname()
 
             # Get the IP address         
+            import psutil
             ip_address = []
             for iface, addrs in psutil.net_if_addrs().items():
                 for addr in addrs:
@@ -198,6 +382,14 @@ class Pi_Monitor:
         except Exception as exc:
             return str(exc)
 
+    def get_raspberry_throttled(self):
+        """Get the firmware throttling bits (under-voltage, frequency capped, throttled, soft limit), 0 if unknown"""
+        try:
+            with open('/sys/devices/platform/soc/soc:firmware/get_throttled', 'r') as f:
+                return int(f.read().strip(), 16)
+        except Exception:
+            return 0
+
     def get_raspberry_cpu_temperature(self):
         """Get the CPU temperature in Celsius using direct file read"""
         try:
@@ -228,12 +420,13 @@ class Pi_Monitor:
         except Exception as e:
             return 0
     
-    # def get_computer_fan_threshold(self):
-    #     # Get the computer fan threshold cycle using Expansion object
-    #     try:
-    #         return *self.expansion.get_computer_fan_threshold()
-    #     except Exception as e:
-    #         return 0
+    def get_computer_fan_threshold(self):
+        # Get the computer fan temperature thresholds (low, high) using Expansion object
+        try:
+            low, high = self.expansion.get_fan_threshold()
+            return low, high
+        except Exception as e:
+            return 0, 0
 
     def get_computer_led_mode(self):
         # Get the computer LED mode using Expansion object
@@ -247,6 +440,11 @@ class Pi_Monitor:
         if self.cleanup_done:
             return
         self.cleanup_done = True
+        self.notifier.stopping()
+        try:
+            self._stop_marquee()
+        except Exception as e:
+            pass
         try:
             if self.oled:
                 self.oled.close()
@@ -282,6 +480,43 @@ class Pi_Monitor:
                 self.expansion.end()
         except Exception as e:
             pass
+        try:
+            if self.trace:
+                self.trace.close()
+        except Exception as e:
+            pass
+        try:
+            if self.shared:
+                self.shared.close()
+        except Exception as e:
+            pass
+        try:
+            if self.fleet:
+                self.fleet.close()
+        except Exception as e:
+            pass
+        try:
+            if self._config_watcher:
+                self._config_watcher.close()
+        except Exception as e:
+            pass
+
+    def _start_marquee(self):
+        # Scroll the lines collected while drawing the screen (at the smallest netinfo size), the rest of the frame stays as shown
+        from marquee import Marquee
+        try:
+            self.marquee = Marquee(self.oled, self._scroll_lines, font_size=self.font_size - 3, mode=self._scroll_mode)
+            self.marquee.start()
+        except Exception as e:
+            self.logger.warning("Scrolling disabled: %s", e)
+            self.marquee = None
+            self._scroll_mode = 'off'
+        self._scroll_lines = []
+
+    def _stop_marquee(self):
+        if self.marquee is not None:
+            self.marquee.stop()
+            self.marquee = None
 
     def handle_signal(self, signum, frame):
         # Handle signal to stop the application
@@ -289,8 +524,116 @@ class Pi_Monitor:
         self.cleanup()
         sys.exit(0)
 
-    def run_monitor_loop(self):
-        """Main monitoring loop - single-threaded infinite loop for both OLED display and fan control"""
+    def handle_reload_signal(self, signum, frame):
+        # The loop reloads the settings at its next tick, not in the middle of an I2C transaction
+        self._reload_requested = True
+
+    def reload_config(self):
+        """Read the settings again and apply only what changed, returns the names of the changed settings
+        Caches (fonts, memoized metrics, logs, profile) are kept; an invalid file leaves everything as it is"""
+        try:
+            config = load_config(self.config_path)
+        except ConfigError as e:
+            self.logger.error("Config not reloaded: %s", e)
+            return []
+        changed = diff(self.config, config)
+        if not changed:
+            return []
+        self.notifier.notify('RELOADING=1')
+        previous = self.config
+        try:
+            if 'palette' in changed or 'led_brightness' in changed:
+                for led_id, (before, after) in enumerate(zip(led_colors(previous), led_colors(config))):
+                    if before != after:
+                        self.expansion.set_led_color(led_id, *after)
+            if {'fan_mode', 'fan_threshold', 'fan_duty'}.intersection(changed):
+                self._apply_fan_settings(self.expansion, config, previous)
+        except Exception as e:
+            # A failed I2C write must not stop the service: the board settings keep their previous values
+            # in self.config, so they still differ from the file and the next reload sends them again
+            self.logger.error("Board settings not applied, retried on the next reload: %s", e)
+            config = dict(config)
+            for name in BOARD_SETTINGS:
+                config[name] = previous[name]
+            changed = [name for name in changed if name not in BOARD_SETTINGS]
+        self.config = config
+        if 'font_size' in changed:
+            self.font_size = config['font_size']
+            threading.Thread(target=self.oled.preload_fonts,
+                             args=((self.font_size, self.font_size - 1, self.font_size - 2),), daemon=True).start()
+        if 'screens' in changed:
+            self._screens = self._select_screens(config['screens'])
+        if self.adaptive is not None:
+            self.adaptive.min_period = min(config['period'], self.adaptive.max_period)
+        self.notifier.ready()
+        self.logger.info("Config reloaded, changed: %s", ', '.join(changed))
+        return changed
+
+    def handle_dump_signal(self, signum, frame):
+        # Dump the loop profile and the wake-up/I2C usage without stopping the service
+        self.profiler.dump()
+        self.logger.info("Usage: %s", self.usage.summary())
+
+    def _set_display_state(self, state, previous):
+        # Apply an AdaptivePolicy display state: 'on', 'dim' (low contrast) or 'off' (panel asleep)
+        if state == 'off':
+            self._stop_marquee()
+            self.oled.set_power(False)
+            self.usage.display_transactions += 1
+            return
+        if previous == 'off':
+            self.oled.set_power(True)
+            self.usage.display_transactions += 1
+        self.oled.set_contrast(DIM_CONTRAST if state == 'dim' else FULL_CONTRAST)
+        self.usage.display_transactions += 1
+
+    def _draw_clock_screen(self, values):
+        # Screen 1: Date/Time/LED
+        self.oled.draw_text(self._format_strings['date'].format(values['date']), position=(0, 0), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['week'].format(values['weekday']), position=(0, 16), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['time'].format(values['time']), position=(0, 32), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['led_mode'].format(values['led_mode']), position=(0, 48), font_size=self.font_size)
+
+    def _draw_netinfo_screen(self, values):
+        # Screen 2: Hostname and IP adresses, one 16 px row (two display pages) per line
+        # Each line gets the largest font that fits its row (down to 3 sizes smaller), lines wider than
+        # the display even then are scrolled by a Marquee once the frame is shown
+        # The title keeps the first row; with more than two interfaces the rest share the last row, which then scrolls
+        width = self.oled.device.width
+        lines = self._format_strings['netinfo'].format(values['netinfo']).split('\n')
+        if len(lines) > 4:
+            lines = lines[:3] + ['  '.join(lines[3:])]
+        for row, line in enumerate(lines):
+            font_size = self.oled.draw_text_box(line, (0, row * 16, width, 16), fit=True, min_size=self.font_size - 3,
+                                                max_size=self.font_size, wrap=False)
+            if self._scroll_mode != 'off' and self.oled.layout.width(line, font_size) > width:
+                self._scroll_lines.append((row * 2, line))
+
+    def _draw_system_screen(self, values):
+        # Screen 3: System Parameters
+        self.oled.draw_text("PI Parameters", position=(0, 0), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['cpu'].format(values['cpu_usage']), position=(0, 16), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['mem'].format(values['memory_usage']), position=(0, 32), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['disk'].format(values['disk_usage']), position=(0, 48), font_size=self.font_size)
+
+    def _draw_thermal_screen(self, values):
+        # Screen 4: Temperature/Fan
+        self.oled.draw_text(self._format_strings['pi_temp'].format(values['cpu_temp']), position=(0, 0), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['pc_temp'].format(values['case_temp']), position=(0, 16), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['fan_mode'].format(values['fan_mode']), position=(0, 32), font_size=self.font_size)
+        self.oled.draw_text(self._format_strings['fan_duty'].format(int(float(values['fan_duty']/255.0)*100)), position=(0, 48), font_size=self.font_size)
+
+    def _draw_profile_screen(self, values):
+        # Screen 5: Loop profile (only when profiling is enabled)
+        profiler = self.profiler
+        self.oled.draw_text(f"Loop {profiler.iterations} ovr {profiler.overruns}", position=(0, 0), font_size=self.font_size-2)
+        for row, line in enumerate(profiler.summary_lines(limit=4)):
+            self.oled.draw_text(line, position=(0, 13 + row * 12), font_size=self.font_size-2)
+
+    def run_monitor_loop(self, max_iterations=None, sleep=time.sleep, clock=time.monotonic_ns):
+        """Main monitoring loop - single-threaded infinite loop for both OLED display and fan control
+        max_iterations and sleep are used by the replay harness to run a fixed trace as fast as possible,
+        clock (nanoseconds) lets adaptive.py run the loop on virtual time"""
         last_fan_pwm = 0
         last_fan_pwm_limit = 0
         temp_threshold_high = 170
@@ -298,21 +641,47 @@ class Pi_Monitor:
         max_pwm = 255
         min_pwm = 0
         oled_counter = 0  # Counter to control OLED update frequency
-        oled_screen = 0   # Which screen to show (0, 1, or 2)
+        oled_screen = 0   # Index in self._screens of the next screen to show
+        profiler = self.profiler
+        metrics = self.metrics
+        period_ns = int(self.config['period'] * 1e9)  # Base interval, 1 second by default
+        screen_ticks = max(1, round(self.config['screen_period'] / self.config['period']))
+        next_deadline = clock() + period_ns
+        adaptive = self.adaptive
+        usage = self.usage
+        board_base = metrics.stage_samples.get('i2c', 0)
+        display_state = 'on'
+        screen_period_ns = int(self.config['screen_period'] * 1e9)  # Adaptive mode changes screens on time
+        next_screen = 0
+        last_frame = None
         
-        print("Running monitor loop")
+        self.logger.info("Running monitor loop")
+        self.notifier.ready()
         
+        iterations = 0
         while not self.stop_event.is_set():
+            if max_iterations is not None and iterations >= max_iterations:
+                break
+            iterations += 1
+            usage.wakeups += 1
+            if self._reload_requested or (self._config_watcher is not None and self._config_watcher.changed()):
+                self._reload_requested = False
+                if self.reload_config():
+                    period_ns = int(self.config['period'] * 1e9)
+                    screen_ticks = max(1, round(self.config['screen_period'] / self.config['period']))
+                    screen_period_ns = int(self.config['screen_period'] * 1e9)
+            t_iteration = profiler.start()
+            metrics.new_tick()
+            if self.trace is not None:
+                self.trace.mark_tick()
+
             # Fan control logic (runs every iteration - every 1 second)
-            current_cpu_temp = self.get_raspberry_cpu_temperature()
-            current_rpi_temp = self.get_computer_temperature()
-            current_fan_pwm = self.get_raspberry_fan_pwm()
-            current_fan_mode = self.get_computer_fan_mode()
-            current_fan_threshold_min = self.expansion.get_fan_threshold()[0] 
-            current_fan_threshold_max = self.expansion.get_fan_threshold()[1] #self.get_computer_fan_threshold()
-
-            # Use single print statement to reduce I/O
-            print(f"RPI TEMP: {current_rpi_temp} °C, CPU TEMP: {current_cpu_temp} °C, FAN PWM: {current_fan_pwm}, FAN MODE: {current_fan_mode}, FAN Threshold: min {current_fan_threshold_min} °C, max {current_fan_threshold_max} °C)")
+            values = metrics.snapshot('console')
+
+            # Log only changes, threshold crossings and periodic summaries instead of a line per second
+            t0 = profiler.start()
+            self.state_log.update(values)
+            profiler.stop('log', t0)
             
             # if current_fan_pwm != -1:
             #     if last_fan_pwm_limit == 0 and current_fan_pwm > temp_threshold_high:
@@ -324,44 +693,88 @@ class Pi_Monitor:
             #         self.expansion.set_fan_duty(last_fan_pwm, last_fan_pwm)
             #         last_fan_pwm_limit = 0
             
-            # OLED update logic (runs every 3 seconds)
-            if oled_counter % 4 == 0:
+            if adaptive is not None:
+                # Next tick period and display power from how fast temperatures and load move
+                period_ns = int(adaptive.update(clock() / 1e9, metrics.snapshot('adaptive')) * 1e9)
+                if adaptive.display_state != display_state:
+                    self._set_display_state(adaptive.display_state, display_state)
+                    if display_state == 'off':
+                        next_screen = 0  # Woken up: draw at once
+                    display_state = adaptive.display_state
+                refresh = display_state != 'off' and clock() >= next_screen
+            else:
+                refresh = oled_counter % screen_ticks == 0
+
+            # OLED update logic (runs every screen_period seconds, 4 by default)
+            if refresh:
+                oled_screen %= len(self._screens)  # The screen list can change on reload
+                name, _, draw_screen = self._screens[oled_screen]
+                # Metrics already read this tick (e.g. temperatures for the console) are reused
+                screen_values = metrics.snapshot(name)
+                self._stop_marquee()
+                t0 = profiler.start()
                 self.oled.clear()
-                if oled_screen == 0:
-                    # Screen 1: Date/Time/LED
-                    self.oled.draw_text(self._format_strings['date'].format(self.get_raspberry_date()), position=(0, 0), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['week'].format(self.get_raspberry_weekday()), position=(0, 16), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['time'].format(self.get_raspberry_time()), position=(0, 32), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['led_mode'].format(self.get_computer_led_mode()), position=(0, 48), font_size=self.font_size)
-                elif oled_screen == 1:
-                    # Screen 2: Hostname and IP adresses
-                    self.oled.draw_text(self._format_strings['netinfo'].format(self.get_raspberry_netinfo()), position=(0, 0), font_size=self.font_size-1)
-                elif oled_screen == 2:
-                    # Screen 3: System Parameters
-                    self.oled.draw_text("PI Parameters", position=(0, 0), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['cpu'].format(self.get_raspberry_cpu_usage()), position=(0, 16), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['mem'].format(self.get_raspberry_memory_usage()), position=(0, 32), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['disk'].format(self.get_raspberry_disk_usage()), position=(0, 48), font_size=self.font_size)
-                else:  # oled_screen == 2
-                    # Screen 3: Temperature/Fan
-                    self.oled.draw_text(self._format_strings['pi_temp'].format(self.get_raspberry_cpu_temperature()), position=(0, 0), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['pc_temp'].format(self.get_computer_temperature()), position=(0, 16), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['fan_mode'].format(self.get_computer_fan_mode()), position=(0, 32), font_size=self.font_size)
-                    self.oled.draw_text(self._format_strings['fan_duty'].format(int(float(self.get_computer_fan_duty()/255.0)*100)), position=(0, 48), font_size=self.font_size)
-                
-                self.oled.show()
-                oled_screen = (oled_screen + 1) % 4  # Cycle through screens 0, 1, 2
+                draw_screen(screen_values)
+                profiler.stop('render', t0)
+
+                t0 = profiler.start()
+                if adaptive is None:
+                    self.oled.show()
+                    usage.display_transactions += 1
+                else:
+                    # Static screens are not resent, the display RAM already holds them
+                    frame = self.oled.buffer.tobytes()
+                    if frame != last_frame:
+                        self.oled.show()
+                        usage.display_transactions += 1
+                        last_frame = frame
+                    next_screen = clock() + screen_period_ns
+                profiler.stop('show', t0)
+                if self._scroll_lines:
+                    self._start_marquee()
+                oled_screen = (oled_screen + 1) % len(self._screens)  # Cycle through screens
             
             oled_counter += 1
-            time.sleep(1)  # Base interval of 1 second
+            usage.board_transactions = metrics.stage_samples.get('i2c', 0) - board_base
+
+            if self.fleet is not None:
+                self.fleet.add(metrics.tick, metrics.snapshot('fleet'))
+
+            # Publish whatever was sampled this tick, readers never touch the bus themselves
+            if self.shared is not None:
+                self.shared.publish(metrics.tick, metrics.sampled())
+            profiler.stop('iteration', t_iteration)
+
+            # Only a loop that got through its I2C reads and display update pets the watchdog,
+            # a wedged bus stops the pings and systemd restarts the service after WatchdogSec
+            self.notifier.watchdog()
+
+            # Sleep until the next deadline instead of a fixed second, so slow iterations show up as overruns
+            now = clock()
+            overrun_ns = now - next_deadline
+            if profiler.enabled:
+                profiler.end_iteration(overrun_ns)
+            if overrun_ns > 0:
+                next_deadline = now + period_ns
+            else:
+                sleep(-overrun_ns / 1e9)
+                next_deadline += period_ns
 
 if __name__ == "__main__":
     pi_monitor = None
 
     try:
-        time.sleep(1)
-
-        pi_monitor = Pi_Monitor()
+        if os.environ.get('PI_MONITOR_SIMULATE', '0') not in ('', '0'):
+            # Stand-in devices, no I2C hardware needed
+            from simulated import SimulatedExpansion, DummyDisplay
+            pi_monitor = Pi_Monitor(oled=OLED(device=DummyDisplay()), expansion=SimulatedExpansion())
+        else:
+            pi_monitor = Pi_Monitor()
+        startup.mark('ready')
+        if os.environ.get('PI_MONITOR_STARTUP_EXIT', '0') not in ('', '0'):
+            # Used by startup_bench.py: report the milestones and stop before the loop
+            print(startup.report())
+            sys.exit(0)
         # Use simple infinite loop instead of threading
         pi_monitor.run_monitor_loop()
 
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import mmap
+import time
+import getopt
+import struct
+import marshal
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Bundle file layout:
+#   header:  MAGIC + struct HEADER (display width, display height, index length)
+#   index:   marshal encoded dict {name: (data offset, frame count, (delay ms, ...))}
+#   data:    page-packed frames, width * height / 8 bytes each (SSD1306 layout, see OLED.show_packed)
+# Offsets are relative to the start of the data section.
+MAGIC = b'OLEDPAK\x01'
+HEADER = struct.Struct('<HHI')
+
+SOURCE_EXTENSIONS = ('.bmp', '.png', '.jpg', '.jpeg', '.gif')
+DITHER_MODES = ('floyd', 'bayer', 'threshold')
+DEFAULT_DELAY = 100  # ms, the default of OLED.draw_gif for frames without a duration
+
+
+class AssetBundle:
+    """
+    Read side of a compiled asset bundle.
+    The index is loaded once and the frame data is memory mapped, so looking up
+    an asset is a dict access and a frame is a slice of the mapping.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.data.close()
+            raise ValueError(f"Not an OLED asset bundle: {path}")
+        self.width, self.height, index_length = HEADER.unpack_from(self.data, len(MAGIC))
+        index_start = len(MAGIC) + HEADER.size
+        self.index = marshal.loads(self.data[index_start:index_start + index_length])
+        self.data_start = index_start + index_length
+        self.frame_size = self.width * self.height // 8
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return sorted(self.index)
+
+    def frame_count(self, name):
+        return self.index[name][1]
+
+    def delays(self, name):
+        # Per-frame delays in ms
+        return self.index[name][2]
+
+    def frame(self, name, index=0):
+        # Page-packed bytes of one frame, ready for OLED.show_packed
+        offset, count, delays = self.index[name]
+        start = self.data_start + offset + (index % count) * self.frame_size
+        return self.data[start:start + self.frame_size]
+
+    def frames(self, name):
+        # Yield (page-packed bytes, delay in ms) for every frame of an asset
+        offset, count, delays = self.index[name]
+        for index in range(count):
+            yield self.frame(name, index), delays[index]
+
+    def close(self):
+        if not self.data.closed:
+            self.data.close()
+
+
+def write_bundle(path, size, assets):
+    """Write {name: ([frame bytes, ...], [delay ms, ...])} as a bundle, atomically replacing `path`"""
+    index = {}
+    offset = 0
+    for name in sorted(assets):
+        frames, delays = assets[name]
+        index[name] = (offset, len(frames), tuple(delays))
+        offset += sum(len(frame) for frame in frames)
+    index_data = marshal.dumps(index)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC + HEADER.pack(size[0], size[1], len(index_data)))
+        f.write(index_data)
+        for name in sorted(assets):
+            for frame in assets[name][0]:
+                f.write(frame)
+    # A running OLED keeps its mapping of the previous file until it reloads
+    os.replace(temp_path, path)
+
+
+def frame_to_pages(frame, size=(128, 64), dither='floyd', fit='letterbox', gamma=2.2):
+    """Convert one source frame to page-packed 1bpp bytes for a display of `size`"""
+    from dither import to_greyscale, to_pages, letterbox
+    image = to_greyscale(frame)
+    if fit == 'letterbox':
+        image = letterbox(image)
+    return to_pages(image, size, dither, gamma)
+
+
+def compile_asset(path, size=(128, 64), dither='floyd', fit='letterbox', gamma=2.2):
+    """Compile one source file, returns ([frame bytes, ...], [delay ms, ...])"""
+    from PIL import Image, ImageSequence
+    frames = []
+    delays = []
+    with Image.open(path) as image:
+        animated = getattr(image, 'n_frames', 1) > 1
+        for frame in ImageSequence.Iterator(image):
+            frames.append(frame_to_pages(frame, size, dither, fit, gamma))
+            delays.append(frame.info.get('duration', DEFAULT_DELAY) if animated else 0)
+    return frames, delays
+
+
+def _compile_job(job):
+    # Worker process entry point
+    name, path, size, dither, fit, gamma = job
+    frames, delays = compile_asset(path, size, dither, fit, gamma)
+    return name, frames, delays
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_sources(source_dir):
+    # Asset names are the file names with their extension (1.bmp and 1.gif both exist), sub folders are not searched
+    sources = {}
+    for filename in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, filename)
+        if filename.lower().endswith(SOURCE_EXTENSIONS) and os.path.isfile(path):
+            sources[filename] = path
+    return sources
+
+
+def compile_directory(source_dir, bundle_path, size=(128, 64), dither='floyd', fit='letterbox', gamma=2.2,
+                      workers=None, force=False, verbose=False):
+    """
+    Compile every image and GIF in `source_dir` into one bundle.
+    A JSON manifest next to the bundle keeps the content hash and options of every
+    source; sources whose entry still matches are copied from the previous bundle
+    instead of being converted again. Returns a dict of counts.
+    """
+    started = time.perf_counter()
+    manifest_path = os.path.splitext(bundle_path)[0] + '.manifest.json'
+    options = {'size': list(size), 'dither': dither, 'fit': fit, 'gamma': gamma}
+    manifest = {}
+    previous = None
+    if not force and os.path.exists(manifest_path) and os.path.exists(bundle_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            previous = AssetBundle(bundle_path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring previous bundle: {e}")
+            manifest = {}
+
+    assets = {}
+    new_manifest = {}
+    jobs = []
+    for name, path in find_sources(source_dir).items():
+        entry = {'hash': file_hash(path), 'options': options}
+        new_manifest[name] = entry
+        if previous is not None and manifest.get(name) == entry and name in previous:
+            assets[name] = ([bytes(frame) for frame, _ in previous.frames(name)], list(previous.delays(name)))
+        else:
+            jobs.append((name, path, tuple(size), dither, fit, gamma))
+    if previous is not None:
+        previous.close()
+
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            for name, frames, delays in pool.map(_compile_job, jobs):
+                assets[name] = (frames, delays)
+                if verbose:
+                    print(f"Compiled {name}: {len(frames)} frame(s)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(bundle_path)), exist_ok=True)
+    write_bundle(bundle_path, size, assets)
+    with open(manifest_path, 'w') as f:
+        json.dump(new_manifest, f, indent=1, sort_keys=True)
+    return {
+        'assets': len(assets),
+        'compiled': len(jobs),
+        'reused': len(assets) - len(jobs),
+        'frames': sum(len(frames) for frames, _ in assets.values()),
+        'bytes': os.path.getsize(bundle_path),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+if __name__ == '__main__':
+    usage = ('Usage: asset_compiler.py [--source <folder>] [--output <bundle>] [--dither floyd|bayer|threshold] '
+             '[--fit letterbox|stretch] [--gamma G] [--size WxH] [--workers N] [--force] [--list] [--verbose]')
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hv", ["help", "source=", "output=", "dither=", "fit=", "gamma=",
+                                                         "size=", "workers=", "force", "list", "verbose"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options:
+        print(usage)
+        sys.exit()
+    here = os.path.dirname(os.path.abspath(__file__))
+    source_dir = options.get('--source', os.path.join(here, 'picture'))
+    bundle_path = options.get('--output', os.path.join(source_dir, 'assets.bin'))
+    if '--list' in options:
+        bundle = AssetBundle(bundle_path)
+        for name in bundle.names():
+            delays = bundle.delays(name)
+            print(f"{name:<24}{bundle.frame_count(name):>6} frame(s){sum(delays):>10} ms")
+        bundle.close()
+        sys.exit()
+    dither = options.get('--dither', 'floyd')
+    fit = options.get('--fit', 'letterbox')
+    if dither not in DITHER_MODES or fit not in ('letterbox', 'stretch'):
+        print(usage)
+        sys.exit(2)
+    size = tuple(int(value) for value in options.get('--size', '128x64').split('x'))
+    result = compile_directory(source_dir, bundle_path, size, dither, fit, float(options.get('--gamma', 2.2)),
+                               workers=int(options['--workers']) if '--workers' in options else None,
+                               force='--force' in options, verbose='-v' in options or '--verbose' in options)
+    print(f"{result['assets']} assets ({result['compiled']} compiled, {result['reused']} unchanged), "
+          f"{result['frames']} frames, {result['bytes']} bytes in {result['seconds']:.2f}s -> {bundle_path}")
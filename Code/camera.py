@@ -1,75 +1,212 @@
 import time
-from picamera2 import Picamera2, Preview
-from picamera2.encoders import H264Encoder, JpegEncoder
-from picamera2.outputs import FileOutput
-from libcamera import Transform
 from threading import Condition
+from collections import deque
 import io
 
+try:
+    from picamera2 import Picamera2, Preview
+    from picamera2.encoders import H264Encoder, JpegEncoder, MJPEGEncoder
+    from picamera2.outputs import FileOutput
+    from libcamera import Transform
+except ImportError:
+    Picamera2 = None  # StreamingOutput and the streaming server still work with a synthetic source
+
 class StreamingOutput(io.BufferedIOBase):
-    def __init__(self):
+    """
+    Encoder output keeping the last `capacity` frames in a ring with sequence
+    numbers and timestamps. Frames are stored as written by the encoder and
+    shared by every consumer (server clients, recorders, analyzers) without copies.
+    """
+    def __init__(self, capacity=8):
         self.frame = None
+        self.sequence = 0                # Number of the latest frame, 0 before the first one
+        self.timestamp = 0.0             # time.monotonic() of the latest frame
+        self.ring = deque(maxlen=capacity)  # (sequence, timestamp, frame), oldest first
         self.condition = Condition()     # Initialize the condition variable for thread synchronization
 
     def write(self, buf):
         with self.condition:
-            self.frame = buf             # Update the frame buffer with new data
+            self.frame = buf             # Update the frame buffer with new data (kept as is, never copied)
+            self.sequence += 1
+            self.timestamp = time.monotonic()
+            self.ring.append((self.sequence, self.timestamp, buf))
             self.condition.notify_all()  # Notify all waiting threads that new data is available
+        return len(buf)
+
+    def latest(self):
+        # Newest (sequence, timestamp, frame) without waiting, or None before the first frame
+        with self.condition:
+            return self.ring[-1] if self.ring else None
+
+    def frames_since(self, sequence):
+        # All frames still in the ring that are newer than `sequence`, oldest first
+        with self.condition:
+            if self.sequence <= sequence:
+                return []
+            return [entry for entry in self.ring if entry[0] > sequence]
+
+    def wait_newer_than(self, sequence, timeout=None):
+        # Wait for a frame newer than `sequence`, returns (sequence, frame) or (sequence, None) on timeout
+        # Frames that arrived in between are skipped, the caller always gets the newest one
+        with self.condition:
+            if self.sequence <= sequence:
+                self.condition.wait_for(lambda: self.sequence > sequence, timeout)
+            if self.sequence <= sequence:
+                return sequence, None
+            return self.sequence, self.frame
+
+    def iter_frames(self, sequence=None, timeout=None):
+        # Yield every frame (sequence, timestamp, frame) newer than `sequence` in order, waiting for new ones
+        # Frames already evicted from the ring are missing, callers can spot the gap in the sequence numbers
+        # Stops when no frame arrives within `timeout` seconds
+        if sequence is None:
+            sequence = self.sequence
+        while True:
+            with self.condition:
+                if self.sequence <= sequence and not self.condition.wait_for(lambda: self.sequence > sequence, timeout):
+                    return
+                entries = [entry for entry in self.ring if entry[0] > sequence]
+            for entry in entries:
+                yield entry
+            sequence = entries[-1][0]
 
 class Camera:
-    def __init__(self, preview_size=(640, 480), hflip=False, vflip=False, stream_size=(400, 300)):
+    """
+    One persistent configuration for everything: a main stream (stills, MJPEG, H.264),
+    a small YUV420 lores stream (motion detection, OLED preview) and optionally the raw
+    sensor stream. The sensor is configured and started once; stills, streaming and
+    recording run concurrently as separate encoders, so switching never restarts it.
+    """
+    def __init__(self, preview_size=(640, 480), hflip=False, vflip=False, stream_size=None, lores_size=(160, 120),
+                 raw=False):
+        if Picamera2 is None:
+            raise RuntimeError("picamera2 is not installed")
         self.camera = Picamera2()              # Initialize the Picamera2 object
         self.transform = Transform(hflip=1 if hflip else 0, vflip=1 if vflip else 0)  # Set the transformation for flipping the image
-        preview_config = self.camera.create_preview_configuration(main={"size": preview_size}, transform=self.transform)  # Create the preview configuration
-        self.camera.configure(preview_config)  # Configure the camera with the preview settings
-        
-        # Configure video stream
-        self.stream_size = stream_size             # Set the size of the video stream
-        self.stream_config = self.camera.create_video_configuration(main={"size": stream_size}, transform=self.transform)  # Create the video configuration
+        # There is a single main stream now: a stream_size (the old separate video configuration) sets its size
+        self.main_size = stream_size or preview_size  # Main stream, shared by stills, MJPEG and H.264
+        self.stream_size = self.main_size
+        self.lores_size = lores_size               # Small YUV420 stream for analysis (motion detection, OLED preview)
+        streams = {"main": {"size": self.main_size}, "lores": {"size": lores_size, "format": "YUV420"}}
+        if raw:
+            streams["raw"] = {}                    # Sensor native format, for capture_raw()
+        self.config = self.camera.create_video_configuration(transform=self.transform, **streams)
+        self.camera.configure(self.config)         # Configured once, never reconfigured
         self.streaming_output = StreamingOutput()  # Initialize the streaming output object
-        self.streaming = False                     # Initialize the streaming flag
+        self.encoders = {}                         # Running encoders by role: 'mjpeg', 'h264', 'circular'
+        self.preview_started = False
+
+    @property
+    def streaming(self):
+        # True while any encoder is running
+        return bool(self.encoders)
+
+    def _ensure_started(self):
+        if not self.camera.started:
+            self.camera.start()
 
     def start_image(self):
-        self.camera.start_preview(Preview.QTGL)  # Start the camera preview using the QTGL backend
-        self.camera.start()                      # Start the camera
+        # The QT preview window has to be attached while the camera is stopped, this is the only restart
+        if not self.preview_started:
+            was_started = self.camera.started
+            if was_started:
+                self.camera.stop()
+            self.camera.start_preview(Preview.QTGL)  # Start the camera preview using the QTGL backend
+            self.preview_started = True
+        self._ensure_started()                       # Start the camera
 
     def save_image(self, filename):
-        metadata = self.camera.capture_file(filename)  # Capture an image and save it to the specified file
+        # Capture from the running main stream, encoders keep running
+        self._ensure_started()
+        metadata = self.camera.capture_file(filename, name="main")  # Capture an image and save it to the specified file
         return metadata                                # Return the metadata of the captured image
 
+    def capture_array(self, name="main"):
+        # Next frame of a stream as an array, main is [R, G, B, 255] per pixel
+        self._ensure_started()
+        return self.camera.capture_array(name)
+
+    def capture_raw(self):
+        # Raw sensor frame as an array, requires Camera(raw=True)
+        self._ensure_started()
+        return self.camera.capture_array("raw")
+
+    def _start_encoder(self, role, encoder, output):
+        if role in self.encoders:
+            return False
+        self._ensure_started()
+        self.camera.start_encoder(encoder, output, name="main")
+        self.encoders[role] = encoder
+        return True
+
+    def stop_encoder(self, role):
+        # Stop one encoder, the camera and the other encoders keep running
+        encoder = self.encoders.pop(role, None)
+        if encoder is not None:
+            self.camera.stop_encoder(encoder)
+
+    def start_mjpeg(self):
+        # JPEG frames into self.streaming_output (see streaming.py)
+        # The hardware MJPEG encoder keeps the CPU free; boards without one (Pi 5) use the software JpegEncoder
+        try:
+            return self._start_encoder('mjpeg', MJPEGEncoder(), FileOutput(self.streaming_output))
+        except Exception as e:
+            print(f"Hardware MJPEG encoder not available, using JpegEncoder: {e}")
+            return self._start_encoder('mjpeg', JpegEncoder(), FileOutput(self.streaming_output))
+
+    def start_h264(self, filename):
+        # H.264 recording to a file
+        return self._start_encoder('h264', H264Encoder(), FileOutput(filename))
+
     def start_stream(self, filename=None):
-        if not self.streaming:
-            if self.camera.started:
-                self.camera.stop()                          # Stop the camera if it is currently running
-            
-            self.camera.configure(self.stream_config)       # Configure the camera with the video stream settings
-            if filename:
-                encoder = H264Encoder()                     # Use H264 encoder for video recording
-                output = FileOutput(filename)               # Set the output file for the recorded video
-            else:
-                encoder = JpegEncoder()                     # Use Jpeg encoder for streaming
-                output = FileOutput(self.streaming_output)  # Set the streaming output object
-            self.camera.start_recording(encoder, output)    # Start recording or streaming
-            self.streaming = True                           # Set the streaming flag to True
+        # Record H.264 to filename, or stream MJPEG when no filename is given
+        if filename:
+            self.start_h264(filename)
+        else:
+            self.start_mjpeg()
+
+    def start_circular_recording(self, output, iperiod=15):
+        # Continuous H.264 into a prerecord.PreTriggerOutput, clips are saved with output.trigger()
+        # iperiod is the keyframe interval in frames, it bounds how much extra pre-roll a clip may start with
+        encoder = H264Encoder(repeat=True, iperiod=iperiod)  # Repeat SPS/PPS so every keyframe starts a decodable stream
+        return self._start_encoder('circular', encoder, output)
 
     def stop_stream(self):
-        if self.streaming:
-            self.camera.stop_recording()  # Stop the recording or streaming
-            self.streaming = False        # Set the streaming flag to False
+        # Stop every encoder, the sensor keeps running for stills and lores
+        for role in list(self.encoders):
+            self.stop_encoder(role)
+
+    def get_frame(self, max_age=None, timeout=1.0):
+        # Return the latest frame right away if it is younger than max_age seconds (default: one frame interval at 30 fps),
+        # otherwise wait for the next one, None when no frame arrives within timeout seconds (encoder stopped)
+        if max_age is None:
+            max_age = 1.0 / 30
+        latest = self.streaming_output.latest()
+        if latest is not None and time.monotonic() - latest[1] <= max_age:
+            return latest[2]
+        # Newer than the stale frame just seen: one that arrived since then is returned without waiting
+        _, frame = self.streaming_output.wait_newer_than(latest[0] if latest is not None else 0, timeout)
+        return frame
 
-    def get_frame(self):
-        with self.streaming_output.condition:
-            self.streaming_output.condition.wait()  # Wait for a new frame to be available
-            return self.streaming_output.frame      # Return the current frame
+    def start_lores(self):
+        # Make sure frames flow on the lores stream
+        self._ensure_started()
+
+    def get_lores_y(self):
+        # Y plane of the next lores frame, uint8 array of shape (height, width)
+        width, height = self.lores_size
+        return self.camera.capture_array("lores")[:height, :width]
 
     def save_video(self, filename, duration=10):
-        self.start_stream(filename)  # Start the video recording
+        self.start_h264(filename)    # Start the video recording
         time.sleep(duration)         # Record for the specified duration
-        self.stop_stream()           # Stop the video recording
+        self.stop_encoder('h264')    # Stop the video recording, other encoders are not affected
 
     def close(self):
         if self.streaming:
             self.stop_stream()  # Stop the streaming if it is active
+        if self.camera.started:
+            self.camera.stop()
         self.camera.close()     # Close the camera
 
 if __name__ == '__main__':
@@ -86,6 +223,9 @@ if __name__ == '__main__':
         print("stream video...")
         picam2.start_stream()                    # Start the video stream
         time.sleep(3)                            # Stream for 3 seconds
+
+        print("capture image while streaming...")
+        picam2.save_image(filename="image_streaming.jpg")  # No reconfigure, the stream keeps running
         
         print("stop video...")
         picam2.stop_stream()                     # Stop the video stream
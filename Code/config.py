@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import getopt
+
+# Settings file of Pi_Monitor, PI_MONITOR_CONFIG=<path> overrides it; a missing file means all defaults
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitor_config.json")
+
+# Screens Pi_Monitor can draw ('profile' only exists with PI_MONITOR_PROFILE=1)
+SCREENS = ('clock', 'netinfo', 'system', 'thermal', 'profile')
+
+
+class ConfigError(ValueError):
+    """Invalid settings, the message lists every problem found"""
+
+
+def _number(minimum, maximum, integer=False):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+            return "must be an integer" if integer else "must be a number"
+        if not minimum <= value <= maximum:
+            return f"must be between {minimum} and {maximum}"
+        return None
+    return check
+
+
+def _list_of(check, length=None, minimum=0):
+    def check_list(value):
+        if not isinstance(value, list):
+            return "must be a list"
+        if length is not None and len(value) != length:
+            return f"must have {length} entries"
+        if len(value) < minimum:
+            return f"must have at least {minimum} entries"
+        for position, item in enumerate(value):
+            problem = check(item)
+            if problem:
+                return f"entry {position} {problem}"
+        return None
+    return check_list
+
+
+def _one_of(choices):
+    def check(value):
+        return None if value in choices else f"must be one of {', '.join(map(str, choices))}"
+    return check
+
+
+def _optional(check):
+    return lambda value: None if value is None else check(value)
+
+
+_byte = _number(0, 255, integer=True)
+
+# name -> (default, check returning None or a problem); null fan_threshold means the fan_curve.json of thermal.py
+SCHEMA = {
+    'palette': ([[255, 127, 2], [127, 255, 2], [2, 255, 127], [127, 2, 255]], _list_of(_list_of(_byte, 3), 4)),
+    'led_brightness': (5, _number(1, 255, integer=True)),  # Palette colors are divided by this
+    'fan_mode': (2, _one_of((1, 2))),                       # 1: manual (fan_duty), 2: auto (fan_threshold)
+    'fan_threshold': (None, _optional(_list_of(_number(0, 100, integer=True), 2))),
+    'fan_duty': ([0, 0], _list_of(_byte, 2)),
+    'font_size': (12, _number(8, 32, integer=True)),
+    'screens': (['clock', 'netinfo', 'system', 'thermal'], _list_of(_one_of(SCREENS), minimum=1)),
+    'period': (1.0, _number(0.2, 10)),                      # Seconds per monitor tick
+    'screen_period': (4.0, _number(0.2, 600)),              # Seconds each screen is shown
+}
+
+# Settings written to the expansion board on a reload
+BOARD_SETTINGS = ('palette', 'led_brightness', 'fan_mode', 'fan_threshold', 'fan_duty')
+
+
+def defaults():
+    return {name: json.loads(json.dumps(default)) for name, (default, _) in SCHEMA.items()}
+
+
+def validate(data):
+    """Settings with defaults filled in, ConfigError listing every unknown or invalid key"""
+    if not isinstance(data, dict):
+        raise ConfigError("The settings must be a JSON object")
+    problems = [f"{name}: unknown setting" for name in data if name not in SCHEMA]
+    config = defaults()
+    for name, value in data.items():
+        if name not in SCHEMA:
+            continue
+        problem = SCHEMA[name][1](value)
+        if problem:
+            problems.append(f"{name}: {problem}")
+        else:
+            config[name] = value
+    threshold = config['fan_threshold']
+    if threshold is not None and not problems and threshold[0] >= threshold[1]:
+        problems.append("fan_threshold: low must be below high")
+    if problems:
+        raise ConfigError('; '.join(problems))
+    return config
+
+
+def load_config(path=CONFIG_PATH):
+    """Validated settings of a file, all defaults when it does not exist"""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return defaults()
+    except ValueError as e:
+        raise ConfigError(f"{path}: {e}")
+    return validate(data)
+
+
+def diff(old, new):
+    # Names of the settings that differ
+    return [name for name in SCHEMA if old.get(name) != new.get(name)]
+
+
+def led_colors(config):
+    # Palette as the LED colors sent to the board, after the brightness division
+    brightness = config['led_brightness']
+    return [tuple(value // brightness for value in color) for color in config['palette']]
+
+
+class ConfigWatcher:
+    """
+    Reports changes of the settings file with inotify, without blocking and with
+    one read() per check. The directory is watched, so editors that replace the
+    file (write a copy, rename it over) are seen too. Linux only; when inotify is
+    not available, changed() compares the modification time instead.
+    """
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = os.path.abspath(path)
+        self.name = os.path.basename(self.path).encode()
+        self.fd = -1
+        self.mtime = self._mtime()
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if fd >= 0:
+                mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+                if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        except (OSError, AttributeError):
+            pass
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self):
+        if self.fd < 0:
+            mtime = self._mtime()
+            changed, self.mtime = mtime != self.mtime, mtime
+            return changed
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return changed
+            # struct inotify_event: wd, mask, cookie, len, then len bytes of NUL padded name
+            offset = 0
+            while offset + 16 <= len(data):
+                length = int.from_bytes(data[offset + 12:offset + 16], sys.byteorder)
+                name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+                if name == self.name:
+                    changed = True
+                offset += 16 + length
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+if __name__ == '__main__':
+    usage = 'Usage: config.py --defaults | --check [<file>]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "defaults", "check"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '--defaults' in options:
+        print(json.dumps(defaults(), indent=1))
+    elif '--check' in options:
+        path = args[0] if args else os.environ.get('PI_MONITOR_CONFIG', CONFIG_PATH)
+        try:
+            load_config(path)
+            print(f"{path}: OK")
+        except ConfigError as e:
+            print(f"{path}: {e}")
+            sys.exit(1)
+    else:
+        print(usage)
+        sys.exit(2)
@@ -0,0 +1,245 @@
+import sys
+import time
+import getopt
+from concurrent.futures import ThreadPoolExecutor
+
+EXPANSION_ADDRESSES = range(0x08, 0x78)  # Any 7-bit address set_i2c_addr can move a board to
+OLED_ADDRESSES = (0x3C, 0x3D)            # SSD1306 address select pin
+EXPANSION_BRAND = 'Freenove'             # What get_brand() of a Freenove expansion board returns
+
+# Registers read from every expansion board in a poll cycle: (name, getter)
+EXPANSION_POLL = (('temp', 'get_temp'), ('fan_mode', 'get_fan_mode'), ('fan_duty', 'get_fan0_duty'))
+
+
+def smbus_probe(bus_number, address):
+    """True if a device acknowledges `address` on the bus (a one byte read, like i2cdetect -r)"""
+    import smbus
+    bus = smbus.SMBus(bus_number)
+    try:
+        bus.read_byte(address)
+        return True
+    except OSError:
+        return False
+    finally:
+        bus.close()
+
+
+def device_id(kind, bus_number, address):
+    return f"{kind}@{bus_number}:0x{address:02x}"
+
+
+class DeviceManager:
+    """
+    Owns every expansion board and display across I2C buses and addresses.
+    Each bus has one worker thread, and every transaction for a device on that
+    bus (poll cycles, writes, display frames) runs on it, so transactions on one
+    bus never interleave and follow each other without gaps. Different buses
+    run in parallel, so a poll takes about as long as the busiest bus instead
+    of the sum of all devices.
+    """
+    def __init__(self, expansion_factory=None, oled_factory=None, probe=smbus_probe):
+        self.expansion_factory = expansion_factory or self._default_expansion
+        self.oled_factory = oled_factory or self._default_oled
+        self.probe = probe
+        self.expansions = {}  # id -> (bus number, board)
+        self.oleds = {}       # id -> (bus number, OLED)
+        self.workers = {}     # bus number -> single thread executor
+        self.cycles = 0
+        self.last_poll_seconds = 0.0
+        self.bus_seconds = {}  # bus number -> duration of its part of the last poll
+
+    @staticmethod
+    def _default_expansion(bus_number, address):
+        from expansion import Expansion
+        return Expansion(bus_number, address)
+
+    @staticmethod
+    def _default_oled(bus_number, address):
+        from oled import OLED
+        return OLED(bus_number, address)
+
+    def _worker(self, bus_number):
+        worker = self.workers.get(bus_number)
+        if worker is None:
+            worker = self.workers[bus_number] = ThreadPoolExecutor(max_workers=1,
+                                                                    thread_name_prefix=f"i2c-{bus_number}")
+        return worker
+
+    def add_expansion(self, bus_number, address, board=None):
+        board = board if board is not None else self.expansion_factory(bus_number, address)
+        key = device_id('expansion', bus_number, address)
+        self.expansions[key] = (bus_number, board)
+        self._worker(bus_number)
+        return key
+
+    def add_oled(self, bus_number, address, oled=None):
+        oled = oled if oled is not None else self.oled_factory(bus_number, address)
+        key = device_id('oled', bus_number, address)
+        self.oleds[key] = (bus_number, oled)
+        self._worker(bus_number)
+        return key
+
+    def discover(self, buses=(1,), expansion_addresses=EXPANSION_ADDRESSES, oled_addresses=OLED_ADDRESSES):
+        """Probe every address of every bus (buses in parallel) and add what answers, returns the new ids"""
+        def scan(bus_number):
+            found = []
+            for address in oled_addresses:
+                try:
+                    if self.probe(bus_number, address):
+                        found.append(('oled', address))
+                except OSError:
+                    return found  # Bus does not exist
+            for address in expansion_addresses:
+                if address in oled_addresses:
+                    continue
+                try:
+                    if self.probe(bus_number, address):
+                        found.append(('expansion', address))
+                except OSError:
+                    return found
+            return found
+
+        added = []
+        with ThreadPoolExecutor(max_workers=max(1, len(buses))) as pool:
+            for bus_number, found in zip(buses, pool.map(scan, buses)):
+                for kind, address in found:
+                    board = None
+                    try:
+                        if kind == 'oled':
+                            added.append(self.add_oled(bus_number, address))
+                            continue
+                        board = self.expansion_factory(bus_number, address)
+                        brand = board.get_brand()
+                        if brand != EXPANSION_BRAND:  # Some other chip that happens to answer the address
+                            raise ValueError(f"brand {brand!r} is not {EXPANSION_BRAND!r}")
+                        added.append(self.add_expansion(bus_number, address, board))
+                    except Exception as e:
+                        print(f"Ignoring device at bus {bus_number} address 0x{address:02x}: {e}")
+                        if board is not None:
+                            try:
+                                board.end()
+                            except Exception:
+                                pass
+        return added
+
+    def submit(self, key, function, *args):
+        # Run function(device, *args) on the thread of the device's bus, returns a Future
+        bus_number, device = self.expansions.get(key) or self.oleds[key]
+        return self.workers[bus_number].submit(function, device, *args)
+
+    def readdress(self, key, address):
+        # Move a board to a new address with set_i2c_addr (e.g. before adding a second board at 0x21), returns the new id
+        # set_i2c_addr sends the command to the old address and only then switches board.address
+        bus_number, board = self.expansions[key]
+        self.submit(key, lambda board: board.set_i2c_addr(address)).result()
+        del self.expansions[key]
+        return self.add_expansion(bus_number, address, board)
+
+    def show(self, key, pages):
+        # Queue a page-packed frame for one display
+        return self.submit(key, lambda oled: oled.show_packed(pages))
+
+    def _poll_bus(self, bus_number, boards):
+        started = time.perf_counter()
+        results = {}
+        for key, board in boards:
+            values = {}
+            for name, getter in EXPANSION_POLL:
+                try:
+                    values[name] = getattr(board, getter)()
+                except Exception as e:
+                    values[name] = None
+                    values['error'] = str(e)
+            results[key] = values
+        self.bus_seconds[bus_number] = time.perf_counter() - started
+        return results
+
+    def poll(self):
+        """Read EXPANSION_POLL from every board, all buses in parallel, returns {id: {name: value}}"""
+        started = time.perf_counter()
+        per_bus = {}
+        for key, (bus_number, board) in self.expansions.items():
+            per_bus.setdefault(bus_number, []).append((key, board))
+        futures = [self.workers[bus_number].submit(self._poll_bus, bus_number, boards)
+                   for bus_number, boards in per_bus.items()]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        self.cycles += 1
+        self.last_poll_seconds = time.perf_counter() - started
+        return results
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.shutdown(wait=True)
+        for _, board in self.expansions.values():
+            try:
+                board.end()
+            except Exception:
+                pass
+        for _, oled in self.oleds.values():
+            oled.close()
+
+
+def simulated_manager(boards, buses, io_delay=0.0005):
+    """Manager with `boards` simulated expansion boards spread over `buses` buses and one dummy display per bus"""
+    from oled import OLED
+    from simulated import SimulatedExpansion, DummyDisplay
+    present = set()
+    for index in range(boards):
+        present.add((1 + index % buses, 0x21 + index // buses))
+    for bus_number in range(1, buses + 1):
+        present.add((bus_number, 0x3C))
+
+    def expansion_factory(bus_number, address):
+        board = SimulatedExpansion(bus_number, address)
+        board.io_delay = io_delay
+        return board
+    manager = DeviceManager(expansion_factory, lambda bus, address: OLED(bus, address, device=DummyDisplay()),
+                            probe=lambda bus_number, address: (bus_number, address) in present)
+    manager.discover(buses=tuple(range(1, buses + 1)), expansion_addresses=range(0x21, 0x30))
+    return manager
+
+
+def benchmark(max_boards=8, io_delay=0.0005, rounds=5):
+    """Poll time against board count, all boards on one bus versus spread over up to 4 buses"""
+    for boards in range(1, max_boards + 1):
+        line = f"{boards} boards:"
+        for buses in (1, min(boards, 4)):
+            manager = simulated_manager(boards, buses, io_delay)
+            manager.poll()
+            started = time.perf_counter()
+            for _ in range(rounds):
+                manager.poll()
+            line += f"  {buses} bus(es) {1000 * (time.perf_counter() - started) / rounds:6.2f} ms"
+            manager.close()
+        print(line)
+
+
+if __name__ == '__main__':
+    usage = 'Usage: devices.py [--bus N ...] [--interval S] | --bench [--boards N]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "bus=", "interval=", "bench", "boards="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options:
+        print(usage)
+        sys.exit()
+    if '--bench' in options:
+        benchmark(int(options.get('--boards', 8)))
+        sys.exit()
+    buses = tuple(int(value) for option, value in opts if option == '--bus') or (1,)
+    manager = DeviceManager()
+    print("Found:", ', '.join(manager.discover(buses)) or 'nothing')
+    try:
+        while True:
+            for key, values in manager.poll().items():
+                print(key, values)
+            print(f"poll {1000 * manager.last_poll_seconds:.2f} ms")
+            time.sleep(float(options.get('--interval', 1)))
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
+    finally:
+        manager.close()
@@ -0,0 +1,171 @@
+import sys
+import time
+import getopt
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+MODES = ('floyd', 'bayer', 'threshold')
+
+# 8x8 Bayer matrix, thresholds in the 0..1 range
+BAYER_8X8 = (np.array([[0, 32, 8, 40, 2, 34, 10, 42],
+                       [48, 16, 56, 24, 50, 18, 58, 26],
+                       [12, 44, 4, 36, 14, 46, 6, 38],
+                       [60, 28, 52, 20, 62, 30, 54, 22],
+                       [3, 35, 11, 43, 1, 33, 9, 41],
+                       [51, 19, 59, 27, 49, 17, 57, 25],
+                       [15, 47, 7, 39, 13, 45, 5, 37],
+                       [63, 31, 55, 23, 61, 29, 53, 21]], dtype=np.float32) + 0.5) / 64
+
+
+def pack_pages(bits):
+    """Pack a (height, width) boolean array into SSD1306 page layout: byte = 8 vertical pixels, LSB on top"""
+    height, width = bits.shape
+    # (pages, 8 rows, width) -> pack the 8 rows of every column into one byte
+    return np.packbits(bits.reshape(height // 8, 8, width), axis=1, bitorder='little').reshape(-1)
+
+
+def to_greyscale(image):
+    """PIL image to an 'L' image, transparent areas become black like the OLED background"""
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (0, 0, 0, 255))
+        return Image.alpha_composite(background, rgba).convert('L')
+    return image.convert('L')
+
+
+def letterbox(image):
+    """Pad a greyscale frame centered on black to at least 2:1 (the display aspect), never cropped"""
+    width, height = image.size
+    target_width = height * 2
+    if width >= target_width:
+        return image
+    new_image = Image.new('L', (target_width, height), 0)
+    new_image.paste(image, ((target_width - width) // 2, 0))
+    return new_image
+
+
+@lru_cache(maxsize=32)
+def _area_weights(src, dst):
+    # (dst, src) matrix: share of every source pixel in every destination pixel, rows sum to 1
+    scale = src / dst
+    edges = np.arange(dst + 1, dtype=np.float64) * scale
+    j = np.arange(src, dtype=np.float64)
+    overlap = np.minimum(edges[1:, None], j[None, :] + 1) - np.maximum(edges[:-1, None], j[None, :])
+    return (np.clip(overlap, 0, None) / scale).astype(np.float32)
+
+
+def area_downscale(values, size):
+    """
+    Resize a 2-D float array to `size` (width, height) by area averaging.
+    Every output pixel is the mean of the source area it covers, computed as
+    two small matrix products; the weight matrices are cached per size pair.
+    """
+    height, width = values.shape
+    rows = _area_weights(height, size[1])
+    cols = _area_weights(width, size[0])
+    return rows @ values @ cols.T
+
+
+@lru_cache(maxsize=8)
+def _linear_table(gamma):
+    # uint8 value -> linear light in 0..1, one table lookup per pixel instead of a power
+    return (np.arange(256, dtype=np.float32) / 255) ** gamma
+
+
+@lru_cache(maxsize=8)
+def _bayer_thresholds(size):
+    width, height = size
+    return np.tile(BAYER_8X8, (height // 8 + 1, width // 8 + 1))[:height, :width]
+
+
+def to_bits(image, size=(128, 64), mode='floyd', gamma=2.2, threshold=128):
+    """
+    Convert a PIL image or a 2-D uint8 array to a (height, width) boolean array.
+    Pixels are decoded to linear light with `gamma` before averaging and
+    dithering, so the share of lit pixels follows the real brightness
+    (gamma=1 works on the stored values). `threshold` is in 0..255 stored units.
+    """
+    if isinstance(image, Image.Image):
+        image = np.asarray(to_greyscale(image))
+    values = _linear_table(gamma)[image]
+    if values.shape != (size[1], size[0]):
+        values = area_downscale(values, size)
+    if mode == 'bayer':
+        return values > _bayer_thresholds(size)
+    if mode == 'threshold':
+        return values >= (threshold / 255.0) ** gamma
+    # Error diffusion is sequential, Pillow's C implementation does the Floyd-Steinberg pass
+    levels = np.clip(values * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    return np.asarray(Image.fromarray(levels, 'L').convert('1'), dtype=bool)
+
+
+def to_pages(image, size=(128, 64), mode='floyd', gamma=2.2, threshold=128):
+    """Convert an image to SSD1306 page-packed bytes (width * height / 8), ready for OLED.show_packed"""
+    return pack_pages(to_bits(image, size, mode, gamma, threshold)).tobytes()
+
+
+def to_image(image, size=(128, 64), mode='floyd', gamma=2.2, threshold=128):
+    """Convert an image to a 1-bit PIL image of `size`, for pasting into the OLED buffer"""
+    bits = to_bits(image, size, mode, gamma, threshold)
+    return Image.frombytes('1', size, np.packbits(bits, axis=1).tobytes())
+
+
+def pil_path(image, size=(128, 64)):
+    # Previous OLED.draw_image conversion: binarize first, then resample the 1-bit image
+    return image.convert('1').resize(size, Image.LANCZOS)
+
+
+def _blur(values):
+    # 3x3 box blur with edge padding, a rough model of how the eye averages neighbouring pixels
+    padded = np.pad(values, 1, mode='edge')
+    height, width = values.shape
+    return sum(padded[y:y + height, x:x + width] for y in range(3) for x in range(3)) / 9.0
+
+
+def quality(bits, reference):
+    """PSNR in dB between a blurred 1-bit result and the blurred linear-light reference, higher is better"""
+    error = _blur(bits.astype(np.float32)) - _blur(reference)
+    mse = float(np.mean(error * error))
+    return 10 * np.log10(1.0 / mse) if mse else float('inf')
+
+
+def benchmark(paths, size=(128, 64), repeat=20, gamma=2.2):
+    """Time and score the previous PIL path against every mode on the given images, one line per method"""
+    images = [Image.open(path).convert('RGB') for path in paths]
+    references = [area_downscale((np.asarray(image.convert('L'), dtype=np.float32) / 255) ** gamma, size)
+                  for image in images]
+    methods = [('pil convert+LANCZOS', lambda image: np.asarray(pil_path(image, size), dtype=bool))]
+    for mode in MODES:
+        methods.append((mode, lambda image, mode=mode: to_bits(image, size, mode, gamma)))
+    results = []
+    for label, method in methods:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for image in images:
+                method(image)
+        ms = 1000 * (time.perf_counter() - started) / (repeat * len(images))
+        score = np.mean([quality(method(image), reference) for image, reference in zip(images, references)])
+        results.append((label, ms, score))
+        print(f"{label:<22}{ms:>8.2f} ms/image{score:>8.2f} dB")
+    return results
+
+
+if __name__ == '__main__':
+    usage = ('Usage: dither.py --bench [image ...] [--gamma G] | <image> <output.png> '
+             '[--mode floyd|bayer|threshold] [--gamma G]')
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "bench", "mode=", "gamma="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    gamma = float(options.get('--gamma', 2.2))
+    if '--bench' in options:
+        benchmark(args or ['picture/1.bmp', 'picture/2.png', 'picture/3.jpg'], gamma=gamma)
+    elif len(args) == 2 and options.get('--mode', 'floyd') in MODES:
+        to_image(Image.open(args[0]), mode=options.get('--mode', 'floyd'), gamma=gamma).save(args[1])
+    else:
+        print(usage)
+        sys.exit(2)
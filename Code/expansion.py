@@ -56,9 +56,9 @@ class Expansion:
         self.bus.close()
 
     def set_i2c_addr(self, addr):
-        # Set I2C address
-        self.address = addr
+        # Set I2C address: the board takes the command at its current address, then answers at the new one
         self.write(self.REG_I2C_ADDRESS, addr)
+        self.address = addr
 
     def set_led_color(self, led_id, r, g, b):
         # Set color for specified LED
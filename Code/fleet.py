@@ -0,0 +1,380 @@
+import sys
+import time
+import heapq
+import random
+import socket
+import struct
+import asyncio
+import getopt
+from collections import deque
+
+# Datagram layout (little endian):
+#   HEADER: magic, version, node name length, batch sequence, tick of the first sample,
+#           wall clock time of the first sample, sample count
+#   node name (UTF-8)
+#   samples: varint tick delta, zigzag varint time delta in ms, bit mask of changed fields,
+#            one zigzag varint per changed field
+# Every sample carries its own time, ticks are not assumed to be evenly spaced (adaptive tick, configured period).
+# Values are sent as integers (value * scale) and every field is delta encoded against the previous
+# sample of the same batch; the first sample is encoded against zero, so each datagram decodes on its own.
+MAGIC = b'PIMT'
+VERSION = 2
+HEADER = struct.Struct('<4sBBIIdB')
+
+# (metric, scale) in wire order, at most 8 fields (one mask byte)
+FIELDS = (('case_temp', 10), ('cpu_temp', 10), ('fan_pwm', 1), ('fan_mode', 1), ('cpu_usage', 10), ('throttled', 1))
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+
+
+def _put_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def encode_batch(node, sequence, samples):
+    """samples: list of (tick, timestamp, values tuple in FIELDS order), returns one datagram"""
+    name = node.encode('utf-8')
+    first_tick, first_time = samples[0][0], samples[0][1]
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(name), sequence, first_tick, first_time, len(samples)))
+    out += name
+    previous_tick = first_tick
+    previous_ms = 0
+    previous = [0] * len(FIELDS)
+    for tick, timestamp, values in samples:
+        _put_varint(out, tick - previous_tick)
+        previous_tick = tick
+        ms = int(round((timestamp - first_time) * 1000))
+        delta = ms - previous_ms
+        _put_varint(out, (delta << 1) ^ (delta >> 63))  # The wall clock can step backwards
+        previous_ms = ms
+        mask_at = len(out)
+        out.append(0)
+        mask = 0
+        for index, (value, (_, scale)) in enumerate(zip(values, FIELDS)):
+            scaled = int(round(value * scale))
+            delta = scaled - previous[index]
+            if delta:
+                mask |= 1 << index
+                _put_varint(out, (delta << 1) ^ (delta >> 63))  # Zigzag: small negative deltas stay small
+                previous[index] = scaled
+        out[mask_at] = mask
+    return bytes(out)
+
+
+def decode_batch(data):
+    """Returns (node, sequence, [(tick, timestamp, values tuple), ...]), raises ValueError on bad datagrams"""
+    try:
+        magic, version, name_length, sequence, tick, first_time, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a telemetry datagram")
+        offset = HEADER.size
+        node = bytes(data[offset:offset + name_length]).decode('utf-8')
+        offset += name_length
+        current = [0] * len(FIELDS)
+        ms = 0
+        samples = []
+        for _ in range(count):
+            delta_tick, offset = _get_varint(data, offset)
+            tick += delta_tick
+            zigzag, offset = _get_varint(data, offset)
+            ms += (zigzag >> 1) ^ -(zigzag & 1)
+            mask = data[offset]
+            offset += 1
+            index = 0
+            while mask:
+                if mask & 1:
+                    zigzag, offset = _get_varint(data, offset)
+                    current[index] += (zigzag >> 1) ^ -(zigzag & 1)
+                mask >>= 1
+                index += 1
+            samples.append((tick, first_time + ms / 1000.0,
+                            tuple(value / scale for value, (_, scale) in zip(current, FIELDS))))
+        return node, sequence, samples
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Truncated telemetry datagram: {e}")
+
+
+class FleetPublisher:
+    """
+    Sends the metrics of one Pi_Monitor to the fleet aggregator.
+    Samples are collected once per tick and sent as one delta encoded UDP
+    datagram (about 10 bytes per sample plus the header) when `batch_size`
+    samples are queued or the oldest is `max_age` seconds old, so long ticks
+    still reach the aggregator well within its stale_after.
+    Sending never blocks the loop: a full socket buffer drops the batch.
+    """
+    def __init__(self, address, node=None, batch_size=10, sock=None, max_age=10.0):
+        self.address = address
+        self.node = node or socket.gethostname()
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self._first_added = 0.0
+        self.socket = sock
+        if self.socket is None:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setblocking(False)
+        self.samples = []
+        self.sequence = 0
+        self.sent = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    def add(self, tick, values):
+        # values: dict of metric values, missing or non-numeric ones are sent as 0
+        row = []
+        for name in FIELD_NAMES:
+            value = values.get(name, 0)
+            row.append(value if isinstance(value, (int, float)) and value == value else 0)
+        now = time.monotonic()
+        if not self.samples:
+            self._first_added = now
+        self.samples.append((tick, time.time(), tuple(row)))
+        if len(self.samples) >= self.batch_size or now - self._first_added >= self.max_age:
+            self.flush()
+
+    def flush(self):
+        if not self.samples:
+            return
+        datagram = encode_batch(self.node, self.sequence, self.samples)
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        self.samples = []
+        try:
+            self.socket.sendto(datagram, self.address)
+            self.sent += 1
+            self.bytes += len(datagram)
+        except OSError:
+            self.dropped += 1
+
+    def close(self):
+        self.flush()
+        self.socket.close()
+
+
+def parse_address(text, default_port=9750):
+    # "host:port" or "host" -> (host, port)
+    host, _, port = text.rpartition(':') if ':' in text else (text, '', '')
+    return host or '127.0.0.1', int(port) if port else default_port
+
+
+class NodeState:
+    """Samples of one node in a ring buffer, plus loss accounting from the batch sequence numbers"""
+    __slots__ = ['name', 'ring', 'latest', 'last_seen', 'next_sequence', 'batches', 'lost']
+
+    def __init__(self, name, ring_size):
+        self.name = name
+        self.ring = deque(maxlen=ring_size)  # (tick, timestamp, values)
+        self.latest = None
+        self.last_seen = 0.0
+        self.next_sequence = None
+        self.batches = 0
+        self.lost = 0
+
+
+class FleetAggregator:
+    """
+    Collects telemetry datagrams from many nodes.
+    Decoding and bookkeeping are a few dict and deque operations per datagram,
+    so one core handles hundreds of nodes; queries look only at the latest
+    sample of every node.
+    """
+    def __init__(self, ring_size=600, stale_after=30.0):
+        self.ring_size = ring_size
+        self.stale_after = stale_after
+        self.nodes = {}
+        self.datagrams = 0
+        self.samples = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def ingest(self, data, now=None):
+        started = time.perf_counter()
+        try:
+            name, sequence, samples = decode_batch(data)
+        except ValueError:
+            self.errors += 1
+            return None
+        node = self.nodes.get(name)
+        if node is None:
+            node = self.nodes[name] = NodeState(name, self.ring_size)
+        if node.next_sequence is not None and sequence != node.next_sequence:
+            gap = (sequence - node.next_sequence) & 0xFFFFFFFF
+            if gap < 0x80000000:
+                node.lost += gap  # Otherwise a reordered or restarted sender
+        node.next_sequence = (sequence + 1) & 0xFFFFFFFF
+        node.batches += 1
+        node.ring.extend(samples)
+        node.latest = samples[-1] if samples else node.latest
+        node.last_seen = time.monotonic() if now is None else now
+        self.datagrams += 1
+        self.samples += len(samples)
+        self.busy_seconds += time.perf_counter() - started
+        return node
+
+    def hottest(self, count=5, field='cpu_temp'):
+        # [(value, node name), ...] of the nodes with the highest latest value
+        index = FIELD_NAMES.index(field)
+        return heapq.nlargest(count, ((node.latest[2][index], node.name)
+                                      for node in self.nodes.values() if node.latest is not None))
+
+    def throttling(self):
+        # Names of the nodes whose latest sample reports throttling (non-zero get_throttled bits)
+        index = FIELD_NAMES.index('throttled')
+        return sorted(node.name for node in self.nodes.values()
+                      if node.latest is not None and node.latest[2][index])
+
+    def stale(self, now=None):
+        now = time.monotonic() if now is None else now
+        return sorted(node.name for node in self.nodes.values() if now - node.last_seen > self.stale_after)
+
+    def history(self, name, field='cpu_temp'):
+        # [(tick, value), ...] from the ring buffer of one node
+        index = FIELD_NAMES.index(field)
+        return [(tick, values[index]) for tick, _, values in self.nodes[name].ring]
+
+    def report(self, count=5):
+        lines = [f"{len(self.nodes)} nodes, {self.datagrams} datagrams, {self.samples} samples, "
+                 f"{sum(node.lost for node in self.nodes.values())} lost, {self.errors} bad"]
+        for value, name in self.hottest(count):
+            lines.append(f"  hot {name:<20} cpu {value:5.1f} C")
+        for value, name in self.hottest(count, 'case_temp'):
+            lines.append(f"  hot {name:<20} case {value:5.1f} C")
+        throttling = self.throttling()
+        if throttling:
+            lines.append(f"  throttling: {', '.join(throttling[:count])}" + (" ..." if len(throttling) > count else ""))
+        stale = self.stale()
+        if stale:
+            lines.append(f"  stale: {', '.join(stale[:count])}" + (" ..." if len(stale) > count else ""))
+        return "\n".join(lines)
+
+
+class _AggregatorProtocol(asyncio.DatagramProtocol):
+    def __init__(self, aggregator):
+        self.aggregator = aggregator
+
+    def datagram_received(self, data, addr):
+        self.aggregator.ingest(data)
+
+
+async def serve(aggregator, host='0.0.0.0', port=9750, report_interval=10.0, duration=None):
+    """Receive datagrams until cancelled (or for `duration` seconds), printing a report every interval"""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _AggregatorProtocol(aggregator),
+                                                       local_addr=(host, port))
+    # A larger receive buffer absorbs bursts when many nodes flush in the same second
+    try:
+        transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    except OSError:
+        pass
+    started = loop.time()
+    try:
+        while duration is None or loop.time() - started < duration:
+            await asyncio.sleep(report_interval if duration is None else min(report_interval, duration))
+            if report_interval:
+                print(aggregator.report())
+    finally:
+        transport.close()
+
+
+class SimulatedNode:
+    """Random walk of the published metrics, with an occasional overheating and throttling node"""
+    def __init__(self, name, seed=0):
+        self.name = name
+        self.random = random.Random(seed)
+        self.hot = self.random.random() < 0.05
+        self.cpu_temp = self.random.uniform(40, 55)
+        self.case_temp = self.cpu_temp - 10
+        self.tick = 0
+
+    def step(self):
+        self.tick += 1
+        rnd = self.random
+        drift = 0.3 if self.hot else 0.0
+        self.cpu_temp = min(90.0, max(30.0, self.cpu_temp + rnd.uniform(-0.5, 0.5) + drift))
+        self.case_temp += (self.cpu_temp - 10 - self.case_temp) * 0.1
+        return {
+            'case_temp': round(self.case_temp),
+            'cpu_temp': round(self.cpu_temp, 1),
+            'fan_pwm': min(255, max(0, int((self.cpu_temp - 40) * 8))),
+            'fan_mode': 2,
+            'cpu_usage': round(rnd.uniform(2, 30), 1),
+            'throttled': 0x20002 if self.cpu_temp > 80 else 0,
+        }
+
+
+async def simulate_nodes(count, address, interval=1.0, ticks=None, batch_size=10):
+    """Run `count` simulated nodes sending to `address` over one UDP socket, returns their publishers"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    nodes = [SimulatedNode(f"node{index:03d}", seed=index) for index in range(count)]
+    publishers = [FleetPublisher(address, node.name, batch_size, sock=sock) for node in nodes]
+    loop = asyncio.get_running_loop()
+    next_time = loop.time()
+    tick = 0
+    while ticks is None or tick < ticks:
+        tick += 1
+        for node, publisher in zip(nodes, publishers):
+            publisher.add(node.tick + 1, node.step())
+        next_time += interval
+        await asyncio.sleep(max(0.0, next_time - loop.time()))
+    for publisher in publishers:
+        publisher.flush()
+    sock.close()
+    return publishers
+
+
+async def loopback_test(nodes=200, ticks=60, interval=0.01, port=9750):
+    """Aggregator and simulated nodes in one event loop over 127.0.0.1, returns the aggregator"""
+    aggregator = FleetAggregator()
+    server = asyncio.ensure_future(serve(aggregator, '127.0.0.1', port, report_interval=0))
+    await asyncio.sleep(0.1)
+    cpu0 = time.process_time()
+    publishers = await simulate_nodes(nodes, ('127.0.0.1', port), interval, ticks)
+    await asyncio.sleep(0.2)
+    cpu = time.process_time() - cpu0
+    server.cancel()
+    sent = sum(publisher.sent for publisher in publishers)
+    sent_bytes = sum(publisher.bytes for publisher in publishers)
+    print(f"{nodes} nodes x {ticks} ticks: {sent} datagrams sent ({sent_bytes / max(1, nodes * ticks):.1f} bytes/sample), "
+          f"{aggregator.datagrams} received, {aggregator.samples} samples, {cpu:.2f}s CPU for both sides, "
+          f"{1e6 * aggregator.busy_seconds / max(1, aggregator.datagrams):.1f} us/datagram ingest")
+    print(aggregator.report())
+    return aggregator
+
+
+if __name__ == '__main__':
+    usage = ('Usage: fleet.py aggregate [--listen host:port] [--interval S] | '
+             'simulate --nodes N [--target host:port] [--interval S] | loopback [--nodes N] [--ticks N]')
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "h", ["help", "listen=", "target=", "interval=", "nodes=", "ticks="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options or len(args) != 1 or args[0] not in ('aggregate', 'simulate', 'loopback'):
+        print(usage)
+        sys.exit(2)
+    try:
+        if args[0] == 'aggregate':
+            host, port = parse_address(options.get('--listen', '0.0.0.0:9750'))
+            asyncio.run(serve(FleetAggregator(), host, port, float(options.get('--interval', 10))))
+        elif args[0] == 'simulate':
+            asyncio.run(simulate_nodes(int(options.get('--nodes', 100)), parse_address(options.get('--target', '127.0.0.1')),
+                                       float(options.get('--interval', 1))))
+        else:
+            asyncio.run(loopback_test(int(options.get('--nodes', 200)), int(options.get('--ticks', 60))))
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
@@ -1,10 +1,16 @@
 import os
 import time
 import sys
-import shutil
+import getopt
+import compileall
 
 DEBUG = False
 
+SERVICE_NAME = 'my_app_running.service'
+UNIT_DIRECTORY = '/etc/systemd/system/'
+# Bytecode cache outside the source tree, written here as root and read-only for the service user
+PYCACHE_PREFIX = '/var/cache/my_app_running/pycache'
+
 def check_application_py(filenanme="application.py"):
     if not os.path.exists(filenanme):
         print("Error: {filenanme} does not exist in the current directory.")
@@ -29,30 +35,52 @@ def get_current_username_from_directory(directory):
         print(f"Error extracting username from directory path: {e}")
         sys.exit(1)
 
-def create_my_app_running_service(directory, username):
-    service_content = f"""[Unit]
+def render_my_app_running_service(directory, username, python='/usr/bin/python3', pycache_prefix=PYCACHE_PREFIX,
+                                   watchdog_sec=15, memory_high='96M', memory_max='128M', nice=5):
+    # Type=notify: the service counts as started once application.py sends READY=1,
+    # and is restarted when its loop stops sending WATCHDOG=1 for watchdog_sec seconds.
+    # -O matches the opt-1 bytecode written by precompile().
+    # systemctl reload sends SIGHUP: application.py rereads monitor_config.json and applies what changed.
+    return f"""[Unit]
 Description=My Python Script Service
 
 [Service]
-ExecStart=/usr/bin/python3 {directory}/application.py
+Type=notify
+NotifyAccess=main
+ExecStart={python} -O {directory}/application.py
+ExecReload=/bin/kill -HUP $MAINPID
 WorkingDirectory={directory}
+Environment=PYTHONPYCACHEPREFIX={pycache_prefix}
+Environment=PYTHONDONTWRITEBYTECODE=1
 StandardOutput=inherit
 StandardError=inherit
 Restart=always
+RestartSec=2
+TimeoutStartSec=60
+WatchdogSec={watchdog_sec}
+Nice={nice}
+IOSchedulingClass=best-effort
+IOSchedulingPriority=7
+MemoryHigh={memory_high}
+MemoryMax={memory_max}
 User={username}
 
 [Install]
 WantedBy=multi-user.target
 """
-    service_file_path = os.path.join('/etc/systemd/system/', 'my_app_running.service')
+
+def create_my_app_running_service(directory, username, unit_directory=UNIT_DIRECTORY, **options):
+    service_content = render_my_app_running_service(directory, username, **options)
+    service_file_path = os.path.join(unit_directory, SERVICE_NAME)
     if os.path.exists(service_file_path):
         os.remove(service_file_path)
         if DEBUG:
-            print(f"Existing my_app_running.service file removed: {service_file_path}")
+            print(f"Existing {SERVICE_NAME} file removed: {service_file_path}")
     with open(service_file_path, 'w') as service_file:
         service_file.write(service_content)
     if DEBUG:
-        print(f"my_app_running.service created at {service_file_path}")
+        print(f"{SERVICE_NAME} created at {service_file_path}")
+    return service_file_path
 
 def run_system_command(command):
     if DEBUG:
@@ -67,18 +95,42 @@ def run_system_command(command):
         print(e)
         sys.exit(1)
 
-def remove_pycache_folder(directory):
-    pycache_path = os.path.join(directory, '__pycache__')
-    if os.path.exists(pycache_path):
-        try:
-            shutil.rmtree(pycache_path)
-            if DEBUG:
-                print(f"__pycache__ folder removed: {pycache_path}")
-        except Exception as e:
-            print(f"Error removing __pycache__ folder: {e}")
+def _set_cache_mode(pycache_prefix, file_mode, dir_mode):
+    for root, dirs, files in os.walk(pycache_prefix):
+        for name in files:
+            os.chmod(os.path.join(root, name), file_mode)
+        for name in dirs:
+            os.chmod(os.path.join(root, name), dir_mode)
+
+def precompile(directory, pycache_prefix=PYCACHE_PREFIX, optimize=1):
+    # Compile every module once, at install time, instead of on each boot of the service.
+    # The cache lives under pycache_prefix and is made read-only, the service never writes bytecode.
+    _set_cache_mode(pycache_prefix, 0o644, 0o755)  # Writable again while recompiling
+    previous_prefix = sys.pycache_prefix
+    sys.pycache_prefix = pycache_prefix
+    try:
+        os.makedirs(pycache_prefix, exist_ok=True)
+        if not compileall.compile_dir(directory, maxlevels=0, optimize=optimize, quiet=1, force=True):
+            print("Error: Some modules could not be compiled.")
             sys.exit(1)
+    finally:
+        sys.pycache_prefix = previous_prefix
+    _set_cache_mode(pycache_prefix, 0o444, 0o555)
+    if DEBUG:
+        print(f"Bytecode written to {pycache_prefix}")
 
 if __name__ == "__main__":
+    usage = 'Usage: generate_service.py [--render <folder>] [--user <name>] [--pycache <folder>]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "render=", "user=", "pycache="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options:
+        print(usage)
+        sys.exit()
+
     # Step 1: Check if application.py exists
     check_application_py()
 
@@ -86,19 +138,36 @@ if __name__ == "__main__":
     current_directory = get_current_directory()
 
     # Step 3: Get current username from directory
-    current_username = get_current_username_from_directory(current_directory)
+    if '--user' in options:
+        current_username = options['--user']
+    else:
+        current_username = get_current_username_from_directory(current_directory)
 
     print(f"Current Directory: {current_directory}")
     print(f"Current Username: {current_username}")
 
-    # Step 4: Create my_app_running.service file
-    create_my_app_running_service(current_directory, current_username)
+    pycache_prefix = options.get('--pycache', PYCACHE_PREFIX)
+    if '--render' in options:
+        # Only write the unit file and the bytecode cache to a scratch folder, nothing is installed
+        # Without --pycache the cache goes under the folder too, so no root access is needed
+        os.makedirs(options['--render'], exist_ok=True)
+        pycache_prefix = options.get('--pycache', os.path.join(os.path.abspath(options['--render']), 'pycache'))
+        print(create_my_app_running_service(current_directory, current_username, options['--render'],
+                                            pycache_prefix=pycache_prefix))
+        precompile(current_directory, pycache_prefix)
+        sys.exit()
+
+    # Step 4: Precompile the modules into the read-only bytecode cache
+    precompile(current_directory, pycache_prefix)
+
+    # Step 5: Create my_app_running.service file
+    create_my_app_running_service(current_directory, current_username, pycache_prefix=pycache_prefix)
 
-    # Step 5: Run systemctl daemon-reload
+    # Step 6: Run systemctl daemon-reload
     run_system_command("sudo systemctl daemon-reload")
     time.sleep(1)
 
-    # Step 6: Enable my_app_running.service
+    # Step 7: Enable my_app_running.service
     run_system_command("sudo systemctl enable my_app_running.service")
     time.sleep(1)
 
@@ -112,10 +181,8 @@ if __name__ == "__main__":
     time.sleep(1)
     '''
 
-    # Step 7: Start my_app_running.service
+    # Step 8: Start my_app_running.service
     run_system_command("sudo systemctl start my_app_running.service")
     time.sleep(1)
-    
-    remove_pycache_folder(current_directory)
 
 
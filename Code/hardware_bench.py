@@ -0,0 +1,285 @@
+import io
+import os
+import json
+import time
+import socket
+import platform
+import datetime
+
+# Read registers of the expansion board and the getter that reads each of them
+REGISTER_READS = [
+    ('REG_I2C_ADDRESS_READ', 'get_iic_addr', ()),
+    ('REG_LED_SPECIFIED_READ', 'get_led_color', (0,)),
+    ('REG_LED_ALL_READ', 'get_all_led_color', ()),
+    ('REG_LED_MODE_READ', 'get_led_mode', ()),
+    ('REG_FAN_MODE_READ', 'get_fan_mode', ()),
+    ('REG_FAN_FREQUENCY_READ', 'get_fan_frequency', ()),
+    ('REG_FAN0_DUTY_READ', 'get_fan0_duty', ()),
+    ('REG_FAN1_DUTY_READ', 'get_fan1_duty', ()),
+    ('REG_FAN_THRESHOLD_READ', 'get_fan_threshold', ()),
+    ('REG_TEMP_READ', 'get_temp', ()),
+    ('REG_BRAND', 'get_brand', ()),
+    ('REG_VERSION', 'get_version', ()),
+]
+
+
+def percentiles(samples_ns):
+    """Summary of a list of durations in ns, reported in microseconds"""
+    if not samples_ns:
+        return {'count': 0}
+    ordered = sorted(samples_ns)
+    count = len(ordered)
+
+    def pick(fraction):
+        return round(ordered[min(count - 1, int(fraction * count))] / 1000, 1)
+    return {
+        'count': count,
+        'mean_us': round(sum(ordered) / count / 1000, 1),
+        'p50_us': pick(0.50),
+        'p90_us': pick(0.90),
+        'p99_us': pick(0.99),
+        'max_us': round(ordered[-1] / 1000, 1),
+    }
+
+
+def time_calls(function, args=(), count=200):
+    # Durations in ns of `count` calls
+    samples = []
+    for _ in range(count):
+        t0 = time.perf_counter_ns()
+        function(*args)
+        samples.append(time.perf_counter_ns() - t0)
+    return samples
+
+
+def bench_registers(expansion, count=200):
+    """Round-trip latency of every read register"""
+    results = {}
+    for register, getter, args in REGISTER_READS:
+        try:
+            results[register] = percentiles(time_calls(getattr(expansion, getter), args, count))
+        except Exception as e:
+            results[register] = {'error': str(e)}
+    return results
+
+
+def bench_write_rate(function, make_args, seconds=2.0):
+    """Back-to-back writes for `seconds`, returns the achieved rate and the per-write latency"""
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    index = 0
+    while time.perf_counter() - started < seconds:
+        args = make_args(index)
+        t0 = time.perf_counter_ns()
+        try:
+            function(*args)
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter_ns() - t0)
+        index += 1
+    elapsed = time.perf_counter() - started
+    result = percentiles(samples)
+    result['writes_per_second'] = round(index / elapsed, 1)
+    result['errors'] = errors
+    return result
+
+
+def bench_writes(expansion, seconds=2.0):
+    results = {
+        'set_fan_duty': bench_write_rate(expansion.set_fan_duty, lambda i: (i % 256, i % 256), seconds),
+        'set_led_color': bench_write_rate(expansion.set_led_color,
+                                          lambda i: (i % 4, i % 256, (i * 3) % 256, (i * 7) % 256), seconds),
+    }
+    # Expansion.write prints I/O errors instead of raising, so read the last value back
+    try:
+        results['set_fan_duty']['readback'] = expansion.get_fan0_duty()
+    except Exception as e:
+        results['set_fan_duty']['readback'] = str(e)
+    expansion.set_fan_duty(0, 0)
+    expansion.set_all_led_color(0, 0, 0)
+    return results
+
+
+def bench_oled(oled, seconds=2.0):
+    """Frames per second for full frames (PIL buffer and pre-packed) and for one changed text line"""
+    width, height = oled.device.width, oled.device.height
+    packed = bytes(width * height // 8)
+    line = bytes(width * 2)  # Two pages, one 12 px text line
+
+    def run(function, args):
+        result = bench_write_rate(function, lambda i: args, seconds)
+        result['fps'] = result.pop('writes_per_second')
+        return result
+    oled.clear()
+    oled.draw_text("Benchmark", position=(0, 0))
+    return {
+        'full_frame_show': run(oled.show, ()),
+        'full_frame_packed': run(oled.show_packed, (packed,)),
+        'partial_two_pages': run(oled.show_region, (line, 2, 3)),
+    }
+
+
+class _CountingFile(io.RawIOBase):
+    # Encoder sink that only counts writes (one per encoded frame) and bytes
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, buffer):
+        self.frames += 1
+        self.bytes += len(buffer)
+        return len(buffer)
+
+
+def bench_camera(camera, seconds=3.0):
+    """Encoded frames per second and Mbit/s of the hardware JPEG (MJPEG) and H.264 encoders"""
+    results = {}
+    output = camera.streaming_output
+    camera.start_mjpeg()
+    time.sleep(0.5)  # Let the encoder settle
+    first_sequence, started = output.sequence, time.perf_counter()
+    byte_count = 0
+    sequence = first_sequence
+    while time.perf_counter() - started < seconds:
+        sequence, frame = output.wait_newer_than(sequence, timeout=1.0)
+        if frame is not None:
+            byte_count += len(frame)
+    elapsed = time.perf_counter() - started
+    camera.stop_encoder('mjpeg')
+    results['jpeg'] = {'fps': round((sequence - first_sequence) / elapsed, 1),
+                       'mbit_per_second': round(byte_count * 8 / elapsed / 1e6, 2)}
+
+    sink = _CountingFile()
+    camera.start_h264(sink)
+    time.sleep(seconds)
+    camera.stop_encoder('h264')
+    results['h264'] = {'fps': round(sink.frames / seconds, 1),
+                       'mbit_per_second': round(sink.bytes * 8 / seconds / 1e6, 2)}
+    return results
+
+
+def bench_software_jpeg(size=(640, 480), seconds=3.0, quality=80):
+    """Stand-in for the camera: software JPEG encoding of synthetic frames with PIL (no H.264)"""
+    from PIL import Image
+    from simulated import SyntheticFrameSource
+    source = SyntheticFrameSource(size)
+    frames = 0
+    byte_count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        buffer = io.BytesIO()
+        Image.fromarray(source.capture_array()).save(buffer, format='JPEG', quality=quality)
+        byte_count += buffer.tell()
+        frames += 1
+    elapsed = time.perf_counter() - started
+    return {'jpeg': {'fps': round(frames / elapsed, 1), 'mbit_per_second': round(byte_count * 8 / elapsed / 1e6, 2),
+                     'encoder': 'PIL software'},
+            'h264': {'skipped': 'no camera'}}
+
+
+def open_devices(simulate=False):
+    """Real devices where they respond, stand-ins from simulated.py otherwise. Returns (devices, sources)"""
+    from oled import OLED
+    from simulated import SimulatedExpansion, DummyDisplay
+    devices = {}
+    sources = {}
+    expansion = None
+    if not simulate:
+        try:
+            from expansion import Expansion
+            expansion = Expansion()
+            expansion.get_brand()  # Fails when the board is not on the bus
+        except Exception as e:
+            print(f"Expansion board unavailable ({e}), using the simulated board")
+            expansion = None
+    devices['expansion'] = expansion if expansion is not None else SimulatedExpansion()
+    sources['expansion'] = 'hardware' if expansion is not None else 'simulated'
+
+    oled = None
+    if not simulate:
+        try:
+            oled = OLED()
+        except Exception as e:
+            print(f"OLED unavailable ({e}), using the dummy display")
+    devices['oled'] = oled if oled is not None else OLED(device=DummyDisplay())
+    sources['oled'] = 'hardware' if oled is not None else 'simulated'
+
+    camera = None
+    if not simulate:
+        try:
+            from camera import Camera
+            camera = Camera()
+        except Exception as e:
+            print(f"Camera unavailable ({e}), using software JPEG encoding")
+    devices['camera'] = camera
+    sources['camera'] = 'hardware' if camera is not None else 'simulated'
+    return devices, sources
+
+
+def environment(sources):
+    # Metadata stored with the results so runs on different boards and builds can be compared
+    model = ''
+    try:
+        with open('/proc/device-tree/model') as f:
+            model = f.read().rstrip('\x00\n')
+    except OSError:
+        pass
+    versions = {}
+    for module in ('PIL', 'numpy', 'smbus', 'luma.oled', 'picamera2'):
+        try:
+            versions[module] = getattr(__import__(module, fromlist=['__version__']), '__version__', 'unknown')
+        except Exception:
+            versions[module] = None
+    return {
+        'timestamp': datetime.datetime.now().astimezone().isoformat(timespec='seconds'),
+        'hostname': socket.gethostname(),
+        'model': model,
+        'machine': platform.machine(),
+        'kernel': platform.release(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'devices': sources,
+        'versions': versions,
+    }
+
+
+def run(output_path='bench_results.json', simulate=False, seconds=2.0, samples=200):
+    """Run every benchmark, print a summary and write the JSON results"""
+    devices, sources = open_devices(simulate)
+    results = {'environment': environment(sources)}
+    expansion = devices['expansion']
+    try:
+        print("I2C register reads...")
+        results['i2c_read'] = bench_registers(expansion, samples)
+        print("I2C write rates...")
+        results['i2c_write'] = bench_writes(expansion, seconds)
+        print("OLED frame rates...")
+        results['oled'] = bench_oled(devices['oled'], seconds)
+        print("Camera encoders...")
+        if devices['camera'] is not None:
+            results['camera'] = bench_camera(devices['camera'], seconds)
+        else:
+            results['camera'] = bench_software_jpeg(seconds=seconds)
+    finally:
+        expansion.end()
+        devices['oled'].clear()
+        devices['oled'].show()
+        if devices['camera'] is not None:
+            devices['camera'].close()
+
+    for register, stats in results['i2c_read'].items():
+        print(f"  {register:<24} p50 {stats.get('p50_us', '-')} us  p99 {stats.get('p99_us', '-')} us")
+    for name, stats in results['i2c_write'].items():
+        print(f"  {name:<24} {stats['writes_per_second']} writes/s  p99 {stats['p99_us']} us")
+    for name, stats in results['oled'].items():
+        print(f"  {name:<24} {stats['fps']} fps")
+    for name, stats in results['camera'].items():
+        print(f"  camera {name:<17} {stats}")
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results written to {output_path}")
+    return results
@@ -0,0 +1,155 @@
+import sys
+import time
+import getopt
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from dither import pack_pages
+
+MODES = ('content', 'window')
+
+
+class Marquee:
+    """
+    Scrolls lines of text that are wider than the display.
+    Every line is rendered once into a page-packed strip (text plus a gap,
+    wrapping around); the strip is never redrawn. Each step then sends only
+    what changed, depending on `mode`:
+      'content'  one 2Dh content-scroll command plus the single new column (a few bytes)
+      'window'   the band of pages of the line, as a column window (128 bytes per page)
+    Only the pages of the scrolling lines are touched; the rest of the screen stays as drawn.
+    The controller's continuous scroll (26h/27h) is not used: it only rotates the 128 columns
+    already in display RAM, so it cannot show the hidden part of a line wider than the display.
+    """
+    def __init__(self, oled, lines, font_size=None, mode='content', speed=30, gap=32):
+        # lines: [(first page, text), ...], a line covers the pages its font needs
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.oled = oled
+        self.mode = mode
+        self.speed = speed  # Pixels per second
+        self.width = oled.device.width
+        font = oled.get_font(font_size)
+        self.bands = []     # (first page, last page, strip as a (pages, strip width) uint8 array)
+        for first_page, text in lines:
+            left, top, right, bottom = font.getbbox(text)
+            pages = (bottom + 7) // 8
+            image = Image.new('1', (int(right) + gap, pages * 8))
+            ImageDraw.Draw(image).text((0, 0), text, font=font, fill=1)
+            strip = pack_pages(np.asarray(image, dtype=bool)).reshape(pages, image.width)
+            self.bands.append((first_page, first_page + pages - 1, strip))
+        self.offset = 0
+        self.steps = 0
+        self.running = False
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _window(self, strip, offset):
+        # Visible part of a strip starting at `offset`, wrapped around, in page-major byte order
+        columns = (offset + np.arange(self.width)) % strip.shape[1]
+        return strip[:, columns].reshape(-1)
+
+    def start(self):
+        # Draw the first position and start scrolling
+        self.offset = 0
+        for first_page, last_page, strip in self.bands:
+            self.oled.show_region(self._window(strip, 0).tobytes(), first_page, last_page)
+        self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def step(self):
+        # Advance every line by one pixel
+        self.offset += 1
+        self.steps += 1
+        last_column = self.width - 1
+        for first_page, last_page, strip in self.bands:
+            if self.mode == 'content':
+                self.oled.scroll_content(first_page, last_page, 0, last_column, 'left')
+                column = strip[:, (self.offset + last_column) % strip.shape[1]]
+                self.oled.show_region(column.tobytes(), first_page, last_page, last_column, last_column)
+            else:
+                self.oled.show_region(self._window(strip, self.offset).tobytes(), first_page, last_page)
+
+    def _run(self):
+        period = 1.0 / self.speed
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            self.step()
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+
+def traffic(text="Wlan0: 192.168.100.200  Eth0: 192.168.1.10", seconds=2.0, speed=30):
+    """Display bytes per second and host CPU per second of every mode, next to full-frame software scrolling"""
+    from oled import OLED
+    from simulated import DummyDisplay
+    results = {}
+    for mode in ('full frame',) + MODES:
+        oled = OLED(device=DummyDisplay())
+        steps = int(seconds * speed)
+        cpu0 = time.process_time()
+        if mode == 'full frame':
+            # Redraw and resend the whole screen for every pixel of movement
+            for offset in range(steps):
+                oled.clear()
+                oled.draw_text(text, position=(-offset, 16), font_size=11)
+                oled.show()
+        else:
+            marquee = Marquee(oled, [(2, text)], font_size=11, mode=mode, speed=speed)
+            marquee.start()
+            marquee.stop()
+            for _ in range(steps):
+                marquee.step()
+        cpu = time.process_time() - cpu0
+        results[mode] = (oled.device.bytes_sent / seconds, cpu / seconds)
+        print(f"{mode:<12}{oled.device.bytes_sent / seconds:>10.0f} bytes/s{1000 * cpu / seconds:>8.2f} ms CPU/s")
+    return results
+
+
+if __name__ == '__main__':
+    usage = 'Usage: marquee.py <text> [--mode content|window] [--speed px/s] [--page N] | --traffic'
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "h", ["help", "mode=", "speed=", "page=", "traffic"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '--traffic' in options:
+        traffic()
+        sys.exit()
+    if '-h' in options or '--help' in options or len(args) != 1:
+        print(usage)
+        sys.exit(2)
+    from oled import OLED
+    oled = OLED()
+    marquee = Marquee(oled, [(int(options.get('--page', 2)), args[0])], mode=options.get('--mode', 'content'),
+                      speed=float(options.get('--speed', 30)))
+    try:
+        oled.clear()
+        oled.show()
+        marquee.start()
+        print("Use Ctrl+C to exit...")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
+    finally:
+        marquee.stop()
+        oled.clear()
+        oled.show()
@@ -0,0 +1,191 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+
+LOGGER_NAME = 'pi_monitor'
+
+_listener = None  # Listener of the last setup_logging(), stopped when replaced and at exit
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler on a bounded queue that drops records instead of blocking the loop"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Keep the structured fields, only pre-format the message once
+        # The traceback is formatted into the message here, like QueueHandler.prepare, the listener only gets text
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            message += '\n' + record.exc_text
+        if record.stack_info:
+            message += '\n' + record.stack_info
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human readable 'message key=value ...' lines for the journal"""
+    def format(self, record):
+        fields = getattr(record, 'fields', None)
+        if not fields:
+            return record.getMessage()
+        return record.getMessage() + ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per record, for the optional JSONL sink"""
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'event': getattr(record, 'event', 'log'),
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, separators=(',', ':'))
+
+
+def setup_logging(jsonl_path=None, max_bytes=1024 * 1024, backup_count=3, queue_size=1000, stream=None):
+    """
+    Configure the pi_monitor logger: records go through a bounded queue to a
+    listener thread, which writes them to stdout (the journal under systemd) and,
+    if jsonl_path is given, to a size-rotated JSONL file.
+    Calling it again replaces the handlers and stops the previous listener.
+    Returns (logger, queue_handler, listener).
+    """
+    global _listener
+    handlers = []
+    console = logging.StreamHandler(stream if stream is not None else sys.stdout)
+    console.setFormatter(KeyValueFormatter())
+    handlers.append(console)
+    if jsonl_path:
+        jsonl = logging.handlers.RotatingFileHandler(jsonl_path, maxBytes=max_bytes, backupCount=backup_count)
+        jsonl.setFormatter(JsonLineFormatter())
+        handlers.append(jsonl)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=False)
+    listener.start()
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    previous, _listener = _listener, listener
+    if previous is not None:
+        stop_listener(previous)  # Writes what is still queued for the old handlers
+    return logger, queue_handler, listener
+
+
+def stop_listener(listener):
+    # Flush and stop a QueueListener, safe to call more than once
+    if listener._thread is not None:
+        listener.stop()
+
+
+@atexit.register
+def _stop_current():
+    if _listener is not None:
+        stop_listener(_listener)
+
+
+class StateChangeLogger:
+    """
+    Logs monitor values only when something worth reading happens:
+    - a discrete value (fan mode, thresholds) changes
+    - a continuous value moves by at least its step since it was last logged
+    - a temperature crosses one of the fan thresholds
+    and emits a min/mean/max summary every summary_interval seconds.
+    """
+    def __init__(self, logger, summary_interval=300, steps=None, discrete=('fan_mode', 'fan_threshold'),
+                 clock=time.monotonic):
+        self.logger = logger
+        self.summary_interval = summary_interval
+        self.steps = steps if steps is not None else {'case_temp': 2, 'cpu_temp': 2.0, 'fan_pwm': 16}
+        self.discrete = discrete
+        self.clock = clock
+        self.logged = {}       # Last logged value of every key
+        self.window = {}       # key: [count, total, minimum, maximum] since the last summary
+        self.window_start = clock()
+        self.records = 0       # Number of records emitted
+
+    def _emit(self, event, message, fields):
+        self.records += 1
+        self.logger.info(message, extra={'event': event, 'fields': fields})
+
+    def update(self, values):
+        # Feed the values of one loop iteration
+        changed = {}
+        for key in self.discrete:
+            if key in values and values[key] != self.logged.get(key):
+                changed[key] = values[key]
+        for key, step in self.steps.items():
+            if key not in values:
+                continue
+            value = values[key]
+            last = self.logged.get(key)
+            if last is None or abs(value - last) >= step:
+                changed[key] = value
+            stats = self.window.get(key)
+            if stats is None:
+                self.window[key] = [1, value, value, value]
+            else:
+                stats[0] += 1
+                stats[1] += value
+                if value < stats[2]:
+                    stats[2] = value
+                if value > stats[3]:
+                    stats[3] = value
+
+        thresholds = values.get('fan_threshold')
+        if thresholds:
+            for key in ('case_temp', 'cpu_temp'):
+                if key not in values or key not in self.logged:
+                    continue
+                last, value = self.logged[key], values[key]
+                for label, limit in zip(('low', 'high'), thresholds):
+                    if (last < limit) != (value < limit):
+                        direction = 'above' if value >= limit else 'below'
+                        self._emit('threshold', f"{key} went {direction} {label} fan threshold",
+                                   {key: value, 'threshold': limit})
+                        changed[key] = value
+
+        if changed:
+            self.logged.update(changed)
+            self._emit('change', "state changed", changed)
+
+        now = self.clock()
+        if now - self.window_start >= self.summary_interval:
+            self.summary(now)
+
+    def summary(self, now=None):
+        # Emit the min/mean/max summary of the current window and start a new one
+        now = self.clock() if now is None else now
+        fields = {'period_s': round(now - self.window_start)}
+        for key, (count, total, minimum, maximum) in self.window.items():
+            fields[key] = f"{minimum}/{round(total / count, 1)}/{maximum}"
+        self._emit('summary', "summary min/mean/max", fields)
+        self.window = {}
+        self.window_start = now
@@ -0,0 +1,185 @@
+import sys
+import time
+import getopt
+from collections import namedtuple
+
+import numpy as np
+
+# One detection: bounding box in lores pixels (x0, y0, x1, y1), fraction of masked pixels that changed
+MotionEvent = namedtuple('MotionEvent', ['timestamp', 'sequence', 'box', 'changed', 'fraction'])
+
+
+def rectangle_mask(size, rectangles, invert=False):
+    """Boolean mask of shape (height, width), True inside the given (x0, y0, x1, y1) rectangles"""
+    width, height = size
+    mask = np.zeros((height, width), dtype=bool)
+    for x0, y0, x1, y1 in rectangles:
+        mask[max(0, y0):min(height, y1), max(0, x0):min(width, x1)] = True
+    return ~mask if invert else mask
+
+
+class MotionDetector:
+    """
+    Frame differencing against a running background average on a small Y plane.
+    Pixels that differ from the background by more than `threshold` grey levels
+    count as changed; an event is emitted when at least `min_fraction` of the
+    masked area changed. Work per frame is a handful of vectorized passes over
+    160x120 pixels, and `cpu_budget` (fraction of one core) skips frames when
+    processing would exceed it.
+    """
+    def __init__(self, size=(160, 120), threshold=25, min_fraction=0.01, alpha=0.05, mask=None,
+                 cpu_budget=0.1, cooldown=1.0):
+        self.size = size
+        self.threshold = threshold
+        self.min_fraction = min_fraction
+        self.alpha = alpha                  # Background learning rate
+        self.mask = mask                    # Optional boolean (height, width) array, True = watched
+        self.mask_area = int(mask.sum()) if mask is not None else size[0] * size[1]
+        self.cpu_budget = cpu_budget
+        self.cooldown = cooldown            # Minimum seconds between two events
+        self.background = None
+        self.listeners = []
+        self.frames = 0
+        self.skipped = 0
+        self.events = 0
+        self.busy_seconds = 0.0
+        self._next_allowed = 0.0
+        self._last_event = -float('inf')
+        self._diff = None
+
+    def add_listener(self, callback):
+        # callback(event) is called for every detection, e.g. PreTriggerOutput.on_motion or an OLED alert
+        self.listeners.append(callback)
+
+    def process(self, y_plane, timestamp=None, sequence=0):
+        # Feed one Y plane (uint8, shape (height, width)), returns a MotionEvent or None
+        now = time.monotonic() if timestamp is None else timestamp
+        if self.cpu_budget and now < self._next_allowed:
+            self.skipped += 1
+            return None
+        started = time.perf_counter()
+        event = self._detect(y_plane, now, sequence)
+        cost = time.perf_counter() - started
+        self.busy_seconds += cost
+        self.frames += 1
+        if self.cpu_budget:
+            # Leave cost / budget seconds between processed frames
+            self._next_allowed = now + cost / self.cpu_budget
+        if event is not None:
+            self.events += 1
+            for callback in self.listeners:
+                callback(event)
+        return event
+
+    def _detect(self, y_plane, now, sequence):
+        height, width = self.size[1], self.size[0]
+        frame = y_plane[:height, :width]
+        if self.background is None:
+            self.background = frame.astype(np.float32)
+            self._diff = np.empty(frame.shape, dtype=np.float32)
+            return None
+        diff = self._diff
+        np.subtract(frame, self.background, out=diff)
+        np.abs(diff, out=diff)
+        changed = diff > self.threshold
+        if self.mask is not None:
+            changed &= self.mask
+        # Update the running average in place: bg += alpha * (frame - bg)
+        self.background *= (1.0 - self.alpha)
+        self.background += self.alpha * frame
+        count = int(np.count_nonzero(changed))
+        fraction = count / self.mask_area if self.mask_area else 0.0
+        if fraction < self.min_fraction or now - self._last_event < self.cooldown:
+            return None
+        self._last_event = now
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+        return MotionEvent(now, sequence, box, count, fraction)
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'events': self.events,
+            'ms_per_frame': 1000.0 * self.busy_seconds / self.frames if self.frames else 0.0,
+        }
+
+
+def synthetic_sequence(count=300, size=(160, 120), square=12, noise=4, seed=0):
+    """Frames of a noisy static background with a square crossing it halfway through, shape (count, h, w)"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 80, size=(height, width), dtype=np.uint8)
+    frames = np.empty((count, height, width), dtype=np.uint8)
+    for index in range(count):
+        frame = background + rng.integers(0, noise, size=(height, width), dtype=np.uint8)
+        if count // 2 <= index < count // 2 + count // 4:
+            x = (index - count // 2) * (width - square) // max(1, count // 4)
+            y = height // 2 - square // 2
+            frame[y:y + square, x:x + square] = 220
+        frames[index] = frame
+    return frames
+
+
+def benchmark(frames, fps=30, **detector_args):
+    """Run a detector over a (count, h, w) sequence as if it arrived at `fps`, returns (stats, events)"""
+    height, width = frames.shape[1:3]
+    detector = MotionDetector(size=(width, height), **detector_args)
+    events = []
+    for index, frame in enumerate(frames):
+        event = detector.process(frame, timestamp=index / fps, sequence=index)
+        if event is not None:
+            events.append(event)
+    return detector.stats(), events
+
+
+def record_sequence(camera, path, count=300):
+    # Save `count` lores Y planes from the camera to a .npy file for offline benchmarks
+    frames = np.stack([camera.get_lores_y() for _ in range(count)])
+    np.save(path, frames)
+    return frames.shape
+
+
+def run_camera(camera, detector):
+    # Feed lores frames from the camera to the detector until interrupted
+    sequence = 0
+    while True:
+        sequence += 1
+        detector.process(camera.get_lores_y(), sequence=sequence)
+
+
+if __name__ == '__main__':
+    usage = 'Usage: motion.py --bench <frames.npy> | --synthetic | --record <frames.npy> [--count N] | --camera'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "bench=", "synthetic", "record=", "count=", "camera"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    count = int(options.get('--count', 300))
+    if '--bench' in options or '--synthetic' in options:
+        frames = np.load(options['--bench']) if '--bench' in options else synthetic_sequence(count)
+        stats, events = benchmark(frames, cpu_budget=0)
+        print(f"{len(frames)} frames of {frames.shape[2]}x{frames.shape[1]}: {stats['ms_per_frame']:.3f} ms/frame, {len(events)} events")
+        for event in events:
+            print(f"  frame {event.sequence}: box {event.box}, {event.fraction * 100:.1f}% changed")
+    elif '--record' in options or '--camera' in options:
+        from camera import Camera
+        camera = Camera()
+        try:
+            camera.start_lores()
+            if '--record' in options:
+                print("Recorded", record_sequence(camera, options['--record'], count))
+            else:
+                detector = MotionDetector()
+                detector.add_listener(lambda event: print(f"Motion: box {event.box}, {event.fraction * 100:.1f}% changed"))
+                print("Use Ctrl+C to exit...")
+                run_camera(camera, detector)
+        except KeyboardInterrupt:
+            print("KeyboardInterrupt")
+        finally:
+            camera.close()
+    else:
+        print(usage)
+        sys.exit(2)
@@ -1,23 +1,83 @@
-from luma.core.interface.serial import i2c
-from luma.oled.device import ssd1306
 from PIL import Image, ImageDraw, ImageFont, ImageSequence
 import time
 import os
-import shutil
+
+from text_layout import TextLayout
+
+# Pre-rendered first frame, raw 1bpp buffer bytes written on the first boot
+SPLASH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "picture", "splash.raw")
+# Bundle of precompiled images and animations, built with asset_compiler.py
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "picture", "assets.bin")
 
 class OLED:
-    def __init__(self, bus_number=1, i2c_address=0x3C):
+    def __init__(self, bus_number=1, i2c_address=0x3C, device=None):
         # Initialize I2C interface and OLED display
+        # A stand-in device (see simulated.DummyDisplay) can be passed to run without hardware
         self.bus_number = bus_number
         self.i2c_address = i2c_address
-        self.serial = i2c(port=self.bus_number, address=self.i2c_address)
-        self.device = ssd1306(self.serial)
+        if device is None:
+            # luma is only imported when real hardware is used
+            from luma.core.interface.serial import i2c
+            from luma.oled.device import ssd1306
+            self.serial = i2c(port=self.bus_number, address=self.i2c_address)
+            self.device = ssd1306(self.serial)
+        else:
+            self.serial = None
+            self.device = device
         self.buffer = Image.new('1', (self.device.width, self.device.height))
         self.draw = ImageDraw.Draw(self.buffer)
 
         self.default_font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf" 
         self.default_font_size = 16
         self.font = ImageFont.load_default()
+        self.fonts = {}       # Loaded TrueType fonts by size
+        self.profiler = None  # Optional LoopProfiler, times font loading in draw_text
+        self.assets = None    # AssetBundle loaded by load_assets
+        self.layout = TextLayout(self.get_font, self.default_font_path)  # Memoized text measurement, see draw_text_box
+
+    def get_font(self, font_size=None):
+        # Get the default TrueType font at the given size, loaded once per size
+        if font_size is None:
+            return self.font
+        font = self.fonts.get(font_size)
+        if font is None:
+            if self.profiler is not None:
+                t0 = self.profiler.start()
+                font = ImageFont.truetype(self.default_font_path, font_size)
+                self.profiler.stop('font', t0)
+            else:
+                font = ImageFont.truetype(self.default_font_path, font_size)
+            self.fonts[font_size] = font
+        return font
+
+    def preload_fonts(self, sizes):
+        # Load fonts ahead of the first draw, e.g. from a background thread during startup
+        for font_size in sizes:
+            self.get_font(font_size)
+
+    def show_splash(self, splash_path=SPLASH_PATH, text="Starting..."):
+        # Show a first frame as fast as possible from a pre-rendered raw buffer
+        size = (self.device.width, self.device.height)
+        try:
+            with open(splash_path, 'rb') as f:
+                data = f.read()
+            if len(data) == size[0] * size[1] // 8:
+                self.buffer = Image.frombytes('1', size, data)
+                self.draw = ImageDraw.Draw(self.buffer)
+                self.show()
+                return True
+        except OSError:
+            pass
+        # No usable splash yet: render it with the built-in bitmap font and keep it for the next boot
+        self.clear()
+        self.draw.text((0, (size[1] - 11) // 2), text, font=self.font, fill="white")
+        self.show()
+        try:
+            with open(splash_path, 'wb') as f:
+                f.write(self.buffer.tobytes())
+        except OSError:
+            pass
+        return False
 
     def clear(self):
         # Clear the content in the buffer
@@ -28,8 +88,79 @@ class OLED:
         # Display the content in the buffer on the OLED screen
         self.device.display(self.buffer)
 
+    def show_packed(self, pages):
+        # Send a frame that is already in SSD1306 page layout (width * height / 8 bytes, one byte = 8 vertical pixels)
+        # This skips the PIL buffer and luma's per-pixel packing, the buffer is left untouched
+        width, page_count = self.device.width, self.device.height // 8
+        if hasattr(self.device, 'data'):
+            self.device.command(0x21, 0, width - 1, 0x22, 0, page_count - 1)  # Column and page address window
+            self.device.data(list(pages))
+        else:
+            # Device without raw access: unpack into an image
+            image = Image.new('1', (width, self.device.height))
+            pixels = image.load()
+            for page in range(page_count):
+                for x in range(width):
+                    byte = pages[page * width + x]
+                    for bit in range(8):
+                        if byte >> bit & 1:
+                            pixels[x, page * 8 + bit] = 1
+            self.device.display(image)
+
+    def show_region(self, data, first_page, last_page, first_column=0, last_column=None):
+        # Send only a rectangle of pages x columns (row-major page data), e.g. a line of text that changed
+        # Devices without raw access get a full show() of the buffer instead
+        if last_column is None:
+            last_column = self.device.width - 1
+        if not hasattr(self.device, 'data'):
+            self.show()
+            return
+        self.device.command(0x21, first_column, last_column, 0x22, first_page, last_page)
+        self.device.data(list(data))
+
+    def scroll_content(self, first_page, last_page, first_column=0, last_column=None, direction='left'):
+        # Shift a rectangle of the display RAM by one column (2Ch/2Dh), the freed column keeps its old content
+        # The controller needs about two frames to finish before the next command
+        if last_column is None:
+            last_column = self.device.width - 1
+        self.device.command(0x2D if direction == 'left' else 0x2C, 0x00, first_page, 0x01, last_page,
+                            0x00, first_column, last_column)
+
+    def set_contrast(self, level):
+        # Panel brightness 0-255 (81h), the display RAM is kept
+        self.device.command(0x81, max(0, min(255, int(level))))
+
+    def set_power(self, on):
+        # Switch the panel on (AFh) or off (AEh, sleep mode), the display RAM is kept while off
+        self.device.command(0xAF if on else 0xAE)
+
+    def load_assets(self, bundle_path=ASSETS_PATH):
+        # Load a bundle compiled by asset_compiler.py, assets are then looked up by name (e.g. "1.gif")
+        from asset_compiler import AssetBundle
+        if self.assets is not None:
+            self.assets.close()
+        self.assets = AssetBundle(bundle_path)
+        return self.assets.names()
+
+    def show_asset(self, name, frame=0):
+        # Send one precompiled frame straight to the display, the buffer is left untouched
+        self.show_packed(self.assets.frame(name, frame))
+
+    def play_asset(self, name, loops=1):
+        # Play a precompiled animation with its recorded frame delays
+        for _ in range(loops):
+            next_time = time.monotonic()
+            for pages, delay in self.assets.frames(name):
+                self.show_packed(pages)
+                next_time += delay / 1000.0
+                remaining = next_time - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+
     def close(self):
         # Close the I2C bus
+        if self.assets is not None:
+            self.assets.close()
         pass  # The luma.oled library does not require explicitly closing the I2C bus
 
     def draw_point(self, xy, fill=None):
@@ -62,71 +193,58 @@ class OLED:
 
     def draw_text(self, text, position=(0, 0), font_size=None):
         # Display text in the buffer
-        if font_size is None:
-            font = self.font
-        else:
-            font = ImageFont.truetype(self.default_font_path, font_size)
+        font = self.get_font(font_size)
         self.draw.text(position, text, font=font, fill="white")
 
-    def draw_image(self, image_path, position=(0, 0), resize=None):
+    def draw_text_box(self, text, box, font_size=None, fit=False, min_size=8, max_size=32, align='left',
+                      valign='top', wrap=True, spacing=0):
+        # Display text inside box = (x, y, width, height), wrapped and aligned ('left'/'center'/'right',
+        # 'top'/'middle'/'bottom'); fit=True picks the largest font size that fits
+        # The layout of a text is computed once and reused while the text stays the same, returns the font size used
+        x, y, width, height = box
+        font_size, lines = self.layout.layout(text, (width, height), font_size, fit, min_size, max_size,
+                                              align, valign, wrap, spacing)
+        font = self.get_font(font_size)
+        for dx, dy, line in lines:
+            self.draw.text((x + dx, y + dy), line, font=font, fill="white")
+        return font_size
+
+    def draw_image(self, image_path, position=(0, 0), resize=None, dither='floyd'):
         # Display an image in the buffer
+        # The greyscale image is scaled first and binarized last (see dither.py)
+        from dither import to_image
         try:
-            image = Image.open(image_path).convert('1')
-            if resize is not None:
-                image = image.resize(resize, Image.LANCZOS)
-            else:
-                image = image.resize((self.device.width, self.device.height), Image.LANCZOS)
-            self.buffer.paste(image, position)
+            size = resize if resize is not None else (self.device.width, self.device.height)
+            with Image.open(image_path) as image:
+                self.buffer.paste(to_image(image, size, dither), position)
         except FileNotFoundError:
             print(f"Error: File not found - {image_path}")
         except Exception as e:
             print(f"Error displaying image: {e}")
    
-    def draw_gif(self, gif_path, position=(0, 0), resize=None):
+    def draw_gif(self, gif_path, position=(0, 0), resize=None, dither='floyd'):
         # Display a GIF animation
-        temp_folder = "temp"
-        if not os.path.exists(temp_folder):
-            os.makedirs(temp_folder)
+        # Frames are letterboxed to 2:1 and converted once in memory, then shown with their own delays
+        from dither import to_greyscale, to_image, letterbox
         try:
-            gif = Image.open(gif_path)
+            size = resize if resize is not None else (self.device.width, self.device.height)
             frames = []
-            frame_delays = []
-            for frame in ImageSequence.Iterator(gif):
-                delay = frame.info.get('duration', 100) / 1000.0
-                frame_delays.append(delay)
-                width, height = frame.size
-                target_height = height
-                target_width = height * 2
-                if width < target_width:
-                    new_image = Image.new('L', (target_width, target_height), 0)
-                    x_offset = (target_width - width) // 2
-                    new_image.paste(frame, (x_offset, 0))
-                else:
-                    new_image = Image.new('L', (width, target_height), 0)
-                    y_offset = (target_height - height) // 2
-                    new_image.paste(frame, (0, y_offset))
-                    target_width = width
-                new_image = new_image.convert('1')
-                if resize is not None:
-                    new_image = new_image.resize(resize, Image.LANCZOS)
-                else:   
-                    new_image = new_image.resize((self.device.width, self.device.height), Image.LANCZOS)
-                new_image = new_image.resize((self.device.width, self.device.height), Image.LANCZOS)
-                frame_path = os.path.join(temp_folder, f"frame_{len(frames)}.png")
-                new_image.save(frame_path)
-                frames.append(frame_path)
-            for frame_path, delay in zip(frames, frame_delays):
-                self.draw_image(frame_path, position = position, resize = resize)
+            with Image.open(gif_path) as gif:
+                for frame in ImageSequence.Iterator(gif):
+                    delay = frame.info.get('duration', 100) / 1000.0
+                    frames.append((to_image(letterbox(to_greyscale(frame)), size, dither), delay))
+            next_time = time.monotonic()
+            for image, delay in frames:
+                self.buffer.paste(image, position)
                 self.show()
-                if delay > 0.17:
-                    time.sleep(delay - 0.17)
+                next_time += delay
+                remaining = next_time - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
         except FileNotFoundError:
             print(f"Error: File not found - {gif_path}")
         except Exception as e:
             print(f"Error displaying GIF: {e}")
-        finally:
-            if os.path.exists(temp_folder):
-                shutil.rmtree(temp_folder)
 
     def save_buffer_to_image(self, image_path="saved_image.png"):
         # Save the content in the buffer as an image file
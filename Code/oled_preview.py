@@ -0,0 +1,210 @@
+import sys
+import time
+import getopt
+import threading
+
+import numpy as np
+
+from dither import pack_pages
+
+# 4x4 Bayer matrix, thresholds in the 0..255 range
+BAYER_4X4 = (np.array([[0, 8, 2, 10],
+                       [12, 4, 14, 6],
+                       [3, 11, 1, 9],
+                       [15, 7, 13, 5]], dtype=np.float32) + 0.5) * (256.0 / 16)
+
+
+class PreviewConverter:
+    """
+    Lores Y plane -> 128x64 1bpp page-packed bytes.
+    The frame is letterboxed to the display aspect ratio with precomputed
+    nearest-neighbour index maps, then thresholded or Bayer dithered; every
+    step is a vectorized NumPy operation on at most 128x64 pixels.
+    """
+    def __init__(self, source_size=(160, 120), display_size=(128, 64), mode='bayer', threshold=128):
+        self.source_size = source_size
+        self.display_size = display_size
+        self.mode = mode                 # 'bayer' or 'threshold'
+        self.threshold = threshold
+        src_w, src_h = source_size
+        dst_w, dst_h = display_size
+        scale = min(dst_w / src_w, dst_h / src_h)
+        self.image_w, self.image_h = int(src_w * scale), int(src_h * scale)
+        self.x_offset = (dst_w - self.image_w) // 2
+        self.y_offset = (dst_h - self.image_h) // 2
+        self.rows = ((np.arange(self.image_h) + 0.5) / scale).astype(np.intp)
+        self.cols = ((np.arange(self.image_w) + 0.5) / scale).astype(np.intp)
+        tiles = (dst_h // 4 + 1, dst_w // 4 + 1)
+        self.bayer = np.tile(BAYER_4X4, tiles)[:self.image_h, :self.image_w]
+        self.bits = np.zeros((dst_h, dst_w), dtype=bool)
+
+    def convert(self, y_plane):
+        # Returns the page-packed frame as a bytes-like uint8 array
+        small = y_plane[self.rows[:, None], self.cols[None, :]]
+        if self.mode == 'bayer':
+            on = small > self.bayer
+        else:
+            on = small > self.threshold
+        self.bits[self.y_offset:self.y_offset + self.image_h, self.x_offset:self.x_offset + self.image_w] = on
+        return pack_pages(self.bits)
+
+
+class OLEDPreview:
+    """
+    Live camera thumbnail on the case OLED.
+    A capture thread converts lores frames at up to `fps`; an I2C thread sends
+    the newest converted frame whenever the bus is free. A frame that is
+    replaced before it could be sent is skipped rather than queued.
+    The bus is shared with other processes (the Pi_Monitor service), which take
+    no lock this process could see; the kernel serializes their transfers, so a
+    busy bus shows up as a send that took longer than the fastest one seen.
+    After a send slower than `busy_factor` times that, frames are skipped for
+    the extra time the send took, leaving the bus to the other user.
+    """
+    def __init__(self, oled, frame_source, source_size=(160, 120), fps=10, mode='bayer', busy_factor=2.0):
+        self.oled = oled
+        self.frame_source = frame_source      # Callable returning the next Y plane
+        self.converter = PreviewConverter(source_size, (oled.device.width, oled.device.height), mode)
+        self.fps = fps
+        self.busy_factor = busy_factor
+        self.fastest_send = None              # Seconds of the fastest frame transfer, the idle bus
+        self.busy_until = 0.0                 # Frames are skipped until then after a slow send
+        self.pending = None                   # (capture time, packed frame) waiting for the bus
+        self.condition = threading.Condition()
+        self.running = False
+        self.captured = 0
+        self.sent = 0
+        self.skipped = 0
+        self.skipped_busy = 0
+        self.convert_cpu_ns = 0
+        self.send_cpu_ns = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._threads = []
+
+    def start(self):
+        self.running = True
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                         threading.Thread(target=self._send_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _capture_loop(self):
+        period = 1.0 / self.fps
+        next_time = time.monotonic()
+        while self.running:
+            y_plane = self.frame_source()
+            captured_at = time.monotonic()
+            cpu0 = time.thread_time_ns()
+            packed = self.converter.convert(y_plane).tobytes()
+            self.convert_cpu_ns += time.thread_time_ns() - cpu0
+            with self.condition:
+                if self.pending is not None:
+                    self.skipped += 1  # The previous frame never made it to the bus
+                self.pending = (captured_at, packed)
+                self.captured += 1
+                self.condition.notify()
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def _send_loop(self):
+        while self.running:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                captured_at, packed = self.pending
+                self.pending = None
+            if time.monotonic() < self.busy_until:
+                self.skipped += 1
+                self.skipped_busy += 1
+                continue
+            started = time.monotonic()
+            cpu0 = time.thread_time_ns()
+            self.oled.show_packed(packed)
+            self.send_cpu_ns += time.thread_time_ns() - cpu0
+            finished = time.monotonic()
+            duration = finished - started
+            if self.fastest_send is None or duration < self.fastest_send:
+                self.fastest_send = duration
+            elif duration > self.busy_factor * self.fastest_send:
+                self.busy_until = finished + duration - self.fastest_send
+            latency = finished - captured_at
+            self.sent += 1
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+
+    def stats(self):
+        # End-to-end latency is from frame capture to the end of the I2C transfer
+        return {
+            'captured': self.captured,
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'skipped_busy': self.skipped_busy,
+            'latency_ms_mean': 1000.0 * self.latency_total / self.sent if self.sent else 0.0,
+            'latency_ms_max': 1000.0 * self.latency_max,
+            'convert_cpu_ms_per_frame': self.convert_cpu_ns / 1e6 / self.captured if self.captured else 0.0,
+            'send_cpu_ms_per_frame': self.send_cpu_ns / 1e6 / self.sent if self.sent else 0.0,
+        }
+
+
+if __name__ == '__main__':
+    usage = 'Usage: oled_preview.py [--fps N] [--mode bayer|threshold] [--seconds N] [--synthetic]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "fps=", "mode=", "seconds=", "synthetic"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options:
+        print(usage)
+        sys.exit()
+    fps = float(options.get('--fps', 10))
+    seconds = float(options.get('--seconds', 0))
+    camera = None
+    if '--synthetic' in options:
+        from motion import synthetic_sequence
+        from simulated import DummyDisplay
+        from oled import OLED
+        frames = synthetic_sequence(120, square=16)  # Larger than the motion benchmark, still visible once scaled down
+        counter = iter(range(1 << 62))
+        frame_source = lambda: frames[next(counter) % len(frames)]
+        oled = OLED(device=DummyDisplay())
+    else:
+        from camera import Camera
+        from oled import OLED
+        camera = Camera()
+        camera.start_lores()
+        frame_source = camera.get_lores_y
+        oled = OLED()
+    preview = OLEDPreview(oled, frame_source, fps=fps, mode=options.get('--mode', 'bayer'))
+    try:
+        preview.start()
+        print("Use Ctrl+C to exit...")
+        started = time.monotonic()
+        while not seconds or time.monotonic() - started < seconds:
+            time.sleep(1)
+            print(preview.stats())
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
+    finally:
+        preview.stop()
+        print(preview.stats())
+        if camera is not None:
+            camera.close()
+        oled.clear()
+        oled.show()
@@ -1,59 +1,216 @@
 import os
-from PIL import Image, ImageSequence
+import sys
+import json
+import time
 import glob
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageSequence, GifImagePlugin
 
-def extract_gif_to_images(gif_path, output_folder='picture'):
+DURATIONS_FILE = 'durations.json'  # Per-frame durations (ms) written next to the extracted frames
+DEFAULT_DURATION = 200             # Used for frames without a recorded duration
+
+
+def _save_png(mode, size, data, info, frame_path):
+    # Runs in a worker process: rebuild the frame from raw bytes and encode it as PNG
+    image = Image.frombytes(mode, size, data)
+    if mode == 'P':
+        image.putpalette(info['palette'])
+        if info.get('transparency') is not None:
+            image.info['transparency'] = info['transparency']
+    image.save(frame_path, 'PNG')
+    return frame_path
+
+
+def iter_gif_frames(gif_path):
+    # Yield (index, frame, duration in ms) one frame at a time, every frame is a full composited image
+    with Image.open(gif_path) as img:
+        for index, frame in enumerate(ImageSequence.Iterator(img)):
+            yield index, frame, frame.info.get('duration', DEFAULT_DURATION)
+
+
+def extract_gif_to_images(gif_path, output_folder='picture', workers=None, verbose=False):
     # Ensure that the output folder exists
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-    
-    # Open GIF file
-    with Image.open(gif_path) as img:
-        # Get the frame rate of GIF
-        frame_count = img.n_frames
-        
-        # 逐Save frame by frame as an image, named with zero padding numbers
-        for i in range(frame_count):
-            img.seek(i)
-            frame_filename = f'frame_{i:04d}.png'  # Use a 4-digit zero filled number
+
+    # Frames are decoded in order (GIF frames depend on the previous one) and PNG encoding
+    # is spread over a process pool; at most 2 frames per worker are in flight
+    durations = {}
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for index, frame, duration in iter_gif_frames(gif_path):
+            frame_filename = f'frame_{index:04d}.png'  # Use a 4-digit zero filled number
             frame_path = os.path.join(output_folder, frame_filename)
-            img.save(frame_path, 'PNG')
-            print(f'Saved {frame_path}')
+            durations[frame_filename] = duration
+            info = {}
+            if frame.mode == 'P':
+                info['palette'] = frame.getpalette()
+                info['transparency'] = frame.info.get('transparency')
+            pending.append(pool.submit(_save_png, frame.mode, frame.size, frame.tobytes(), info, frame_path))
+            if len(pending) >= 2 * workers:
+                done = pending.pop(0).result()
+                if verbose:
+                    print(f'Saved {done}')
+        for future in pending:
+            done = future.result()
+            if verbose:
+                print(f'Saved {done}')
 
-def images_to_gif(input_folder='picture', output_folder='gif', output_gif_path='output.gif'):
+    # Keep the source timing so images_to_gif can reproduce it
+    with open(os.path.join(output_folder, DURATIONS_FILE), 'w') as f:
+        json.dump(durations, f, indent=1)
+    print(f'Saved {len(durations)} frames to {output_folder}')
+    return len(durations)
+
+
+def _to_palette(image):
+    # GIF frames have to be palette images
+    if image.mode in ('P', 'L'):
+        return image
+    return image.convert('RGB').convert('P', palette=Image.ADAPTIVE)
+
+
+def write_gif(frames, output_path, loop=0):
+    """
+    Write a GIF from an iterable of (image, duration in ms), one frame at a time.
+    Unlike Image.save(save_all=True), which keeps every frame until the end,
+    only the frame being encoded is held in memory. Every frame gets its own palette.
+    """
+    count = 0
+    with open(output_path, 'wb') as fp:
+        for image, duration in frames:
+            frame = _to_palette(image)
+            if count == 0:
+                header, _ = GifImagePlugin.getheader(frame, info={'loop': loop, 'duration': duration})
+                for chunk in header:
+                    fp.write(chunk)
+            params = {'duration': duration, 'include_color_table': True}
+            if frame.info.get('transparency') is not None:
+                params['transparency'] = frame.info['transparency']
+            for chunk in GifImagePlugin.getdata(frame, offset=(0, 0), **params):
+                fp.write(chunk)
+            count += 1
+            image.close()
+        fp.write(b';')  # GIF trailer
+    return count
+
+
+def images_to_gif(input_folder='picture', output_folder='gif', output_gif_path='output.gif', duration=None):
     # Ensure that the input folder exists
     if not os.path.exists(input_folder):
         raise FileNotFoundError(f"The folder '{input_folder}' does not exist.")
-    
+
     # Ensure that the output folder exists
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-    
+
     # Use the glob module to match all image files by file name pattern and sort them accordingly
     image_files = sorted(glob.glob(os.path.join(input_folder, 'frame_*.png')))
-    
+
     # Check if the image file has been obtained
     if not image_files:
         raise FileNotFoundError(f"No image files found in the folder '{input_folder}'.")
-    
-    # Open the first image as the initial frame and create a frame list
-    frames = [Image.open(img_file) for img_file in image_files]
-    
+
+    # Durations recorded by extract_gif_to_images, unless a fixed duration is given
+    durations = {}
+    durations_path = os.path.join(input_folder, DURATIONS_FILE)
+    if duration is None and os.path.exists(durations_path):
+        with open(durations_path) as f:
+            durations = json.load(f)
+
+    # Frames are opened lazily, one at a time
+    def frames():
+        for img_file in image_files:
+            frame_duration = duration if duration is not None else durations.get(os.path.basename(img_file), DEFAULT_DURATION)
+            yield Image.open(img_file), frame_duration
+
     # Save to a new GIF file
     output_path = os.path.join(output_folder, output_gif_path)
-    frames[0].save(output_path,
-                   save_all=True,
-                   append_images=frames[1:],
-                   duration=200,  # The duration of each frame (in milliseconds)
-                   loop=0)  # 0 represents a perpetual loop
+    write_gif(frames(), output_path, loop=0)  # 0 represents a perpetual loop
     print(f'Saved {output_path}')
 
 
+def extract_gif_to_images_sequential(gif_path, output_folder='picture'):
+    # Previous implementation, one frame decoded and encoded at a time (kept for the benchmark)
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    with Image.open(gif_path) as img:
+        for i in range(img.n_frames):
+            img.seek(i)
+            img.save(os.path.join(output_folder, f'frame_{i:04d}.png'), 'PNG')
+
+
+def images_to_gif_in_memory(input_folder='picture', output_path='output.gif'):
+    # Previous implementation, every frame open at once (kept for the benchmark)
+    image_files = sorted(glob.glob(os.path.join(input_folder, 'frame_*.png')))
+    frames = [Image.open(img_file) for img_file in image_files]
+    frames[0].save(output_path, save_all=True, append_images=frames[1:], duration=200, loop=0)
+
+
+def make_test_gif(path, frames=300, size=(480, 270)):
+    # Large synthetic GIF with varying durations for the benchmark
+    def frame_iter():
+        for index in range(frames):
+            image = Image.new('RGB', size, ((index * 3) % 256, 40, 200 - (index % 200)))
+            x = index * size[0] // frames
+            image.paste((255, 255, 255), (x, size[1] // 3, x + 20, 2 * size[1] // 3))
+            yield image, 40 + (index % 5) * 20
+    write_gif(frame_iter(), path)
+
+
+def _bench_child(variant, gif_path, work_dir):
+    # Runs one benchmark variant in a fresh process so the peak memory is its own
+    import resource
+    started = time.perf_counter()
+    frames_dir = os.path.join(work_dir, 'frames')
+    if variant == 'extract_sequential':
+        extract_gif_to_images_sequential(gif_path, frames_dir)
+    elif variant == 'extract_parallel':
+        extract_gif_to_images(gif_path, frames_dir)
+    elif variant == 'assemble_in_memory':
+        images_to_gif_in_memory(frames_dir, os.path.join(work_dir, 'in_memory.gif'))
+    elif variant == 'assemble_streaming':
+        images_to_gif(frames_dir, work_dir, 'streaming.gif')
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'variant': variant, 'seconds': round(elapsed, 3), 'peak_rss_mb': round(peak_kb / 1024, 1)}))
+
+
+def benchmark(gif_path=None, frames=300, work_dir='bench'):
+    # Compare the previous and the streaming/parallel implementations on a large GIF
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    if gif_path is None:
+        gif_path = os.path.join(work_dir, 'large.gif')
+        make_test_gif(gif_path, frames)
+    results = []
+    for variant in ('extract_sequential', 'extract_parallel', 'assemble_in_memory', 'assemble_streaming'):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--bench-child', variant, gif_path, work_dir],
+                                capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith('{')]
+        if not lines:
+            print(output.stdout + output.stderr)
+            continue
+        result = json.loads(lines[-1])
+        results.append(result)
+        print(f"{result['variant']:<22}{result['seconds']:>8.2f} s{result['peak_rss_mb']:>10.1f} MB peak")
+    return results
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--bench-child':
+        _bench_child(*sys.argv[2:5])
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == '--bench':
+        benchmark(sys.argv[2] if len(sys.argv) > 2 else None)
+        sys.exit()
+
     gif_path = 'example.gif'  # Please replace with your GIF file path
 
     # Decompose GIF into images frame by frame
     #extract_gif_to_images(gif_path)
 
     # Synthesize images into a GIF
-    images_to_gif()
\ No newline at end of file
+    images_to_gif()
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+import queue
+import signal
+import datetime
+import threading
+from collections import deque
+
+try:
+    from picamera2.outputs import Output
+except ImportError:
+    class Output:
+        # Minimal stand-in for picamera2.outputs.Output, enough for synthetic frames
+        def __init__(self, pts=None):
+            self.recording = False
+
+        def start(self):
+            self.recording = True
+
+        def stop(self):
+            self.recording = False
+
+
+class PreTriggerOutput(Output):
+    """
+    H.264 encoder output that always keeps the last `pre_seconds` of video in memory.
+    The buffer starts on a keyframe so the saved clip is decodable from its first byte.
+    trigger() saves the buffered pre-roll plus the next `post_seconds` to a new file;
+    writes happen on a background thread so the encoder is never blocked by the disk.
+    """
+    def __init__(self, pre_seconds=5, post_seconds=10, directory='.', max_bytes=32 * 1024 * 1024, prefix='event'):
+        super().__init__()
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.directory = directory
+        self.max_bytes = max_bytes           # Hard cap on the memory used by the pre-roll
+        self.prefix = prefix
+        self.buffer = deque()                # (timestamp in s, keyframe, data), oldest first
+        self.buffer_bytes = 0
+        self.lock = threading.Lock()
+        self.recording_until = None          # Encoder timestamp (s) at which the current clip ends
+        self.clip_path = None
+        self.clips = []                      # Paths of finished clips
+        self.clip_count = 0                  # Clips started, part of the name so two clips never share a file
+        self.frames_written = 0
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+        # Called by the encoder for every encoded frame, timestamp is in microseconds
+        now = timestamp / 1e6 if timestamp is not None else time.monotonic()
+        data = bytes(frame)  # The encoder reuses its buffers
+        with self.lock:
+            self.buffer.append((now, keyframe, data))
+            self.buffer_bytes += len(data)
+            self._trim(now)
+            if self.recording_until is not None:
+                if now <= self.recording_until:
+                    self._writes.put(('frame', self.clip_path, data))
+                else:
+                    self._writes.put(('close', self.clip_path, None))
+                    self.recording_until = None
+                    self.clip_path = None
+
+    def _trim(self, now):
+        # Drop whole groups of pictures from the front while the next keyframe is still old enough
+        # (or while over the memory cap), so the buffer always starts on a keyframe
+        cutoff = now - self.pre_seconds
+        while len(self.buffer) > 1:
+            next_key = None
+            for index in range(1, len(self.buffer)):
+                if self.buffer[index][1]:
+                    next_key = index
+                    break
+            if next_key is None:
+                break
+            if self.buffer[next_key][0] > cutoff and self.buffer_bytes <= self.max_bytes:
+                break
+            for _ in range(next_key):
+                self.buffer_bytes -= len(self.buffer.popleft()[2])
+        # Never start on a non-key frame
+        while self.buffer and not self.buffer[0][1]:
+            self.buffer_bytes -= len(self.buffer.popleft()[2])
+
+    def trigger(self, reason='api'):
+        # Save the pre-roll and the next post_seconds, a trigger during a clip extends it
+        with self.lock:
+            now = self.buffer[-1][0] if self.buffer else time.monotonic()
+            if self.recording_until is not None:
+                self.recording_until = now + self.post_seconds
+                return self.clip_path
+            stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]  # Milliseconds
+            self.clip_count += 1
+            self.clip_path = os.path.join(self.directory, f"{self.prefix}_{stamp}_{self.clip_count}_{reason}.h264")
+            self.recording_until = now + self.post_seconds
+            self._writes.put(('open', self.clip_path, None))
+            for _, _, data in self.buffer:
+                self._writes.put(('frame', self.clip_path, data))
+            return self.clip_path
+
+    def on_motion(self, event):
+        # Listener for motion.MotionDetector.add_listener(): a detection saves a clip named after 'motion'
+        return self.trigger('motion')
+
+    def _write_loop(self):
+        files = {}
+        while True:
+            action, path, data = self._writes.get()
+            try:
+                if action == 'open':
+                    files[path] = open(path, 'wb')
+                elif action == 'frame':
+                    files[path].write(data)
+                    self.frames_written += 1
+                elif action == 'close':
+                    files.pop(path).close()
+                    self.clips.append(path)
+                elif action == 'flush':
+                    for f in files.values():
+                        f.flush()
+                    data.set()
+                elif action == 'stop':
+                    for open_path, f in files.items():
+                        f.close()
+                        self.clips.append(open_path)
+                    data.set()
+                    return
+            except Exception as e:
+                print(f"Error writing clip {path}: {e}")
+
+    def flush(self, timeout=None):
+        # Wait until everything queued so far is on disk
+        done = threading.Event()
+        self._writes.put(('flush', None, done))
+        return done.wait(timeout)
+
+    def stop(self):
+        # Close an unfinished clip and stop the writer
+        super().stop()
+        if self._writer.is_alive():
+            done = threading.Event()
+            self._writes.put(('stop', None, done))
+            done.wait()
+
+
+class TemperatureTrigger:
+    """Poll the expansion board temperature and trigger a clip when it reaches a threshold"""
+    def __init__(self, expansion, output, threshold=70, interval=2.0, hysteresis=3):
+        self.expansion = expansion
+        self.output = output
+        self.threshold = threshold
+        self.interval = interval
+        self.hysteresis = hysteresis
+        self._armed = True
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                temperature = self.expansion.get_temp()
+            except Exception:
+                continue
+            if self._armed and temperature >= self.threshold:
+                self._armed = False
+                self.output.trigger(f"temp{temperature}")
+            elif temperature < self.threshold - self.hysteresis:
+                self._armed = True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def install_signal_trigger(output, signum=signal.SIGUSR2):
+    # Trigger a clip when the process receives signum (default SIGUSR2)
+    # The trigger runs on its own thread, the handler may interrupt a thread holding the output lock
+    def handler(signum, frame):
+        threading.Thread(target=output.trigger, args=('signal',), daemon=True).start()
+    signal.signal(signum, handler)
+
+
+if __name__ == '__main__':
+    # Usage: prerecord.py [<directory>] [--motion]
+    from camera import Camera
+    args = [arg for arg in sys.argv[1:] if arg != '--motion']
+    directory = args[0] if args else '.'
+    camera = Camera()
+    output = PreTriggerOutput(pre_seconds=5, post_seconds=10, directory=directory)
+    install_signal_trigger(output)
+    try:
+        camera.start_circular_recording(output)
+        if '--motion' in sys.argv[1:]:
+            # Motion on the lores stream saves clips too
+            from motion import MotionDetector, run_camera
+            camera.start_lores()
+            detector = MotionDetector()
+            detector.add_listener(output.on_motion)
+            threading.Thread(target=run_camera, args=(camera, detector), daemon=True).start()
+        print(f"Recording into a 5 s pre-roll, send SIGUSR2 to pid {os.getpid()} or press Enter to save a clip, Ctrl+C to exit...")
+        while True:
+            input()
+            print("Saving", output.trigger('key'))
+    except (KeyboardInterrupt, EOFError):
+        print("KeyboardInterrupt")
+    finally:
+        camera.close()
+        output.stop()
+        print("Clips:", output.clips)
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+
+class Histogram:
+    """
+    Fixed power-of-two bucket histogram for nanosecond durations.
+    Bucket i holds samples below 2**(i + MIN_SHIFT) ns, so recording is a
+    bit_length() and a list increment, with no allocation.
+    """
+    MIN_SHIFT = 10    # First bucket: < 1.024 us
+    BUCKETS = 22      # Last bucket: >= ~1.07 s
+
+    __slots__ = ['counts', 'count', 'total_ns', 'max_ns']
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        # Record one duration in nanoseconds
+        index = ns.bit_length() - self.MIN_SHIFT
+        if index < 0:
+            index = 0
+        elif index >= self.BUCKETS:
+            index = self.BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, pct):
+        # Upper bound of the bucket containing the given percentile, in ns
+        if self.count == 0:
+            return 0
+        target = self.count * pct / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(1 << (index + self.MIN_SHIFT), self.max_ns)
+        return self.max_ns
+
+    def mean(self):
+        # Mean duration in ns
+        return self.total_ns // self.count if self.count else 0
+
+    def reset(self):
+        # Drop all samples
+        for index in range(self.BUCKETS):
+            self.counts[index] = 0
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+class LoopProfiler:
+    """
+    Per-stage timing for the monitor loop.
+    Callers take a timestamp with start() and hand it back to stop(stage, t0).
+    When disabled, start() returns 0 and stop() returns immediately, so the
+    cost in the loop is two attribute lookups per stage.
+    """
+    __slots__ = ['enabled', 'stages', 'iterations', 'overruns', 'worst_overrun_ns', 'started_at']
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.iterations = 0
+        self.overruns = 0
+        self.worst_overrun_ns = 0
+        self.started_at = time.monotonic()
+
+    def start(self):
+        # Timestamp for the beginning of a stage
+        if not self.enabled:
+            return 0
+        return time.perf_counter_ns()
+
+    def stop(self, stage, t0):
+        # Record the time elapsed since t0 under the given stage name
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter_ns() - t0
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(elapsed)
+
+    def end_iteration(self, overrun_ns):
+        # Account for one loop iteration, overrun_ns > 0 means the deadline was missed
+        self.iterations += 1
+        if overrun_ns > 0:
+            self.overruns += 1
+            if overrun_ns > self.worst_overrun_ns:
+                self.worst_overrun_ns = overrun_ns
+
+    def reset(self):
+        # Drop all samples and counters
+        for histogram in self.stages.values():
+            histogram.reset()
+        self.iterations = 0
+        self.overruns = 0
+        self.worst_overrun_ns = 0
+        self.started_at = time.monotonic()
+
+    def summary_lines(self, limit=None):
+        # Short per-stage lines sorted by total time spent, used by the OLED debug screen
+        ranked = sorted(self.stages.items(), key=lambda item: item[1].total_ns, reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [f"{name[:6]} {hist.percentile(50) / 1e6:.1f}/{hist.max_ns / 1e6:.0f}ms" for name, hist in ranked]
+
+    def report(self):
+        # Full text report of all stages
+        lines = []
+        uptime = time.monotonic() - self.started_at
+        state = "enabled" if self.enabled else "disabled"
+        lines.append(f"Loop profile ({state}): {self.iterations} iterations in {uptime:.0f}s, "
+                     f"{self.overruns} overruns, worst overrun {self.worst_overrun_ns / 1e6:.1f} ms")
+        lines.append(f"{'stage':<12}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, hist in sorted(self.stages.items(), key=lambda item: item[1].total_ns, reverse=True):
+            lines.append(f"{name:<12}{hist.count:>8}{hist.mean() / 1e6:>10.3f}"
+                         f"{hist.percentile(50) / 1e6:>10.3f}{hist.percentile(99) / 1e6:>10.3f}"
+                         f"{hist.max_ns / 1e6:>10.3f}")
+        return "\n".join(lines)
+
+    def dump(self, stream=None):
+        # Write the report, used from the SIGUSR1 handler
+        stream = stream if stream is not None else sys.stderr
+        stream.write(self.report() + "\n")
+        stream.flush()
+
+
+class StartupTimeline:
+    """
+    Wall clock milestones of the startup path, in ms since t0.
+    t0 is taken from PI_MONITOR_T0 (a time.time() value set by the launcher,
+    see startup_bench.py) so interpreter start-up is included, else from creation.
+    """
+    def __init__(self, t0=None):
+        if t0 is None:
+            try:
+                t0 = float(os.environ['PI_MONITOR_T0'])
+            except (KeyError, ValueError):
+                t0 = time.time()
+        self.t0 = t0
+        self.marks = []
+
+    def mark(self, name):
+        # Record a milestone
+        self.marks.append((name, (time.time() - self.t0) * 1000.0))
+
+    def get(self, name):
+        # Milestone time in ms, or None
+        for mark_name, ms in self.marks:
+            if mark_name == name:
+                return ms
+        return None
+
+    def report(self):
+        return "\n".join(f"startup: {name} {ms:.1f} ms" for name, ms in self.marks)
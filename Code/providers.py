@@ -0,0 +1,69 @@
+class MetricRegistry:
+    """
+    Registry of lazily sampled metrics.
+    Each metric has one provider function. Consumers (console log, OLED screens, ...)
+    declare the metrics they need; a value is computed the first time it is requested
+    in a tick and memoized until new_tick() is called, so a metric shared by several
+    consumers costs one hardware read per tick and an unused metric is never sampled.
+    """
+    __slots__ = ['_providers', '_stages', '_consumers', '_values', 'profiler', 'tick', 'samples', 'stage_samples']
+
+    def __init__(self, profiler=None):
+        self._providers = {}
+        self._stages = {}
+        self._consumers = {}
+        self._values = {}
+        self.profiler = profiler  # Optional LoopProfiler, provider calls are timed under their stage
+        self.tick = 0
+        self.samples = 0          # Number of provider calls, for checking that nothing is read twice
+        self.stage_samples = {}   # Provider calls per stage, e.g. 'i2c' counts expansion board transactions
+
+    def register(self, name, provider, stage='sensors'):
+        # Register the provider function of a metric
+        if name in self._providers:
+            raise ValueError(f"Metric already registered: {name}")
+        self._providers[name] = provider
+        self._stages[name] = stage
+        self.stage_samples.setdefault(stage, 0)
+
+    def declare(self, consumer, metrics):
+        # Declare the metrics a consumer reads
+        for name in metrics:
+            if name not in self._providers:
+                raise KeyError(f"Unknown metric '{name}' declared by '{consumer}'")
+        self._consumers[consumer] = tuple(metrics)
+
+    def metrics_of(self, consumer):
+        # Metrics declared by a consumer
+        return self._consumers.get(consumer, ())
+
+    def new_tick(self):
+        # Forget all memoized values, the next get() samples again
+        self._values.clear()
+        self.tick += 1
+
+    def get(self, name):
+        # Value of a metric for the current tick, sampled on first use
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        profiler = self.profiler
+        if profiler is not None and profiler.enabled:
+            t0 = profiler.start()
+            value = self._providers[name]()
+            profiler.stop(self._stages[name], t0)
+        else:
+            value = self._providers[name]()
+        self.samples += 1
+        self.stage_samples[self._stages[name]] += 1
+        self._values[name] = value
+        return value
+
+    def sampled(self):
+        # Metrics already sampled in the current tick, as a dict (no provider is called)
+        return self._values
+
+    def snapshot(self, consumer):
+        # Values of all metrics declared by a consumer, as a dict
+        return {name: self.get(name) for name in self._consumers.get(consumer, ())}
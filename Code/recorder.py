@@ -0,0 +1,254 @@
+import os
+import sys
+import time
+import struct
+import marshal
+
+# Trace file layout:
+#   header:  MAGIC + struct HEADER (wall clock start time in ns)
+#   records: struct RECORD (kind, microseconds since previous record, name id, payload length) + payload
+# Names are interned: the first use of a name emits a NAME record holding the string.
+# Payloads are marshal encoded (ints, floats, strings, tuples, lists, bytes).
+MAGIC = b'PIMREC\x01\x00'
+HEADER = struct.Struct('<q')
+RECORD = struct.Struct('<BIHH')
+
+KIND_NAME = 0
+KIND_READ = 1
+KIND_WRITE = 2
+KIND_TICK = 3
+
+# Replayed value of a metric that is not in the trace yet (e.g. added after the trace was recorded):
+# the value its provider in application.py returns when the read fails, 0 for the numeric ones
+METRIC_DEFAULTS = {
+    'date': "1990-1-1",
+    'weekday': "Error",
+    'time': '0:0:0',
+    'netinfo': '',
+    'fan_threshold': (0, 0),
+}
+
+
+class TraceWriter:
+    """Append-only binary trace of sensor reads and hardware writes"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + HEADER.pack(time.time_ns()))
+        self.names = {}
+        self.last_ns = time.monotonic_ns()
+
+    def _emit(self, kind, name_id, payload):
+        now = time.monotonic_ns()
+        delta_us = min((now - self.last_ns) // 1000, 0xFFFFFFFF)
+        self.last_ns = now
+        self.file.write(RECORD.pack(kind, delta_us, name_id, len(payload)))
+        if payload:
+            self.file.write(payload)
+
+    def _name_id(self, name):
+        name_id = self.names.get(name)
+        if name_id is None:
+            name_id = self.names[name] = len(self.names)
+            self._emit(KIND_NAME, name_id, name.encode('utf-8'))
+        return name_id
+
+    def write_record(self, kind, name, value):
+        name_id = self._name_id(name) if name is not None else 0
+        self._emit(kind, name_id, marshal.dumps(value) if value is not None else b'')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_trace(path):
+    """Yield (kind, time in ns since start, name, value) for every record in a trace file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"Not a monitor trace file: {path}")
+    offset = len(MAGIC) + HEADER.size
+    names = {}
+    t_ns = 0
+    while offset + RECORD.size <= len(data):
+        kind, delta_us, name_id, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        t_ns += delta_us * 1000
+        if kind == KIND_NAME:
+            names[name_id] = payload.decode('utf-8')
+            continue
+        if kind == KIND_TICK:
+            yield kind, t_ns, None, None
+            continue
+        value = marshal.loads(payload) if payload else None
+        yield kind, t_ns, names.get(name_id), value
+
+
+class _WriteTap:
+    """Proxy that reports set_* calls of a device to a trace and forwards everything"""
+    def __init__(self, target, prefix, trace):
+        self._target = target
+        self._prefix = prefix
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or not (name.startswith('set_') or name in ('write', 'show')):
+            return attr
+        trace = self._trace
+        event = f"{self._prefix}.{name}"
+
+        def tapped(*args, **kwargs):
+            if name == 'show':
+                trace.write_event(event, (self._target.buffer.tobytes(),))
+            else:
+                # Keyword arguments are recorded as a trailing dict, sorted so the comparison does not depend on order
+                trace.write_event(event, args + (dict(sorted(kwargs.items())),) if kwargs else args)
+            return attr(*args, **kwargs)
+        return tapped
+
+
+class Recorder:
+    """
+    Recording side of the trace: metric providers and device writes of Pi_Monitor
+    are wrapped so every value read and every command sent is appended to the trace.
+    Enabled in application.py with PI_MONITOR_RECORD=<path>.
+    """
+    def __init__(self, path):
+        self.writer = TraceWriter(path)
+        self.tick = 0
+
+    def wrap_metric(self, name, provider):
+        writer = self.writer
+        def recorded():
+            value = provider()
+            writer.write_record(KIND_READ, name, value)
+            return value
+        return recorded
+
+    def wrap_device(self, device, prefix):
+        return _WriteTap(device, prefix, self)
+
+    def write_event(self, name, args):
+        self.writer.write_record(KIND_WRITE, name, tuple(args))
+
+    def mark_tick(self):
+        self.tick += 1
+        self.writer.write_record(KIND_TICK, None, None)
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+class Replayer:
+    """
+    Replay side of the trace: metric providers return the values recorded for the
+    current tick (or the last recorded value of that metric) and device writes are
+    collected in self.writes for comparison with the recorded ones.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.ticks = [{}]             # Recorded metric values per tick, ticks[0] is before the loop
+        self.recorded_writes = []     # (tick, name, args)
+        self.writes = []              # (tick, name, args) produced during the replay
+        self.tick = 0
+        self.duration_ns = 0
+        for kind, t_ns, name, value in read_trace(path):
+            self.duration_ns = t_ns
+            if kind == KIND_TICK:
+                self.ticks.append({})
+            elif kind == KIND_READ:
+                self.ticks[-1][name] = value
+            elif kind == KIND_WRITE:
+                self.recorded_writes.append((len(self.ticks) - 1, name, value))
+        self._last = {}
+
+    @property
+    def tick_count(self):
+        # Number of loop iterations in the trace
+        return len(self.ticks) - 1
+
+    def wrap_metric(self, name, provider):
+        def replayed():
+            tick = self.ticks[self.tick] if self.tick < len(self.ticks) else {}
+            if name in tick:
+                self._last[name] = tick[name]
+            return self._last.get(name, METRIC_DEFAULTS.get(name, 0))
+        return replayed
+
+    def wrap_device(self, device, prefix):
+        return _WriteTap(device, prefix, self)
+
+    def write_event(self, name, args):
+        self.writes.append((self.tick, name, tuple(args)))
+
+    def mark_tick(self):
+        self.tick += 1
+
+    def close(self):
+        pass
+
+    def diff_writes(self, include_display=False):
+        # List of (recorded, replayed) pairs that differ, display frames are skipped by default
+        def keep(entry):
+            return include_display or not entry[1].startswith('oled.')
+        recorded = [entry for entry in self.recorded_writes if keep(entry)]
+        replayed = [entry for entry in self.writes if keep(entry)]
+        diffs = []
+        for index in range(max(len(recorded), len(replayed))):
+            a = recorded[index] if index < len(recorded) else None
+            b = replayed[index] if index < len(replayed) else None
+            if a != b:
+                diffs.append((a, b))
+        return diffs
+
+
+def replay(path, fast=True, profile=True):
+    """Run Pi_Monitor against a trace with stand-in devices, returns (monitor, replayer)"""
+    from application import Pi_Monitor
+    from oled import OLED
+    from simulated import SimulatedExpansion, DummyDisplay
+
+    replayer = Replayer(path)
+    monitor = Pi_Monitor(profile=profile, oled=OLED(device=DummyDisplay()),
+                         expansion=SimulatedExpansion(), trace=replayer)
+    sleep = (lambda seconds: None) if fast else time.sleep
+    started = time.perf_counter()
+    monitor.run_monitor_loop(max_iterations=replayer.tick_count, sleep=sleep)
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {replayer.tick_count} ticks ({replayer.duration_ns / 1e9:.0f}s recorded) in {elapsed:.3f}s")
+    return monitor, replayer
+
+
+def dump(path):
+    # Print every record of a trace file
+    for kind, t_ns, name, value in read_trace(path):
+        label = {KIND_READ: 'read', KIND_WRITE: 'write', KIND_TICK: 'tick'}[kind]
+        if kind == KIND_TICK:
+            print(f"{t_ns / 1e9:12.6f} {label}")
+        else:
+            print(f"{t_ns / 1e9:12.6f} {label:<6}{name} = {value!r}")
+
+
+if __name__ == "__main__":
+    usage = 'Usage: recorder.py dump <trace> | replay <trace> [--realtime]'
+    if len(sys.argv) < 3 or sys.argv[1] not in ('dump', 'replay') or not os.path.exists(sys.argv[2]):
+        print(usage)
+        sys.exit(2)
+    if sys.argv[1] == 'dump':
+        dump(sys.argv[2])
+    else:
+        monitor, replayer = replay(sys.argv[2], fast='--realtime' not in sys.argv[3:])
+        monitor.profiler.dump(sys.stdout)
+        monitor.cleanup()  # The recorded trace ends with the cleanup writes too
+        diffs = replayer.diff_writes()
+        print(f"Hardware writes: {len(replayer.recorded_writes)} recorded, {len(replayer.writes)} replayed, {len(diffs)} differences")
+        for recorded, replayed in diffs[:20]:
+            print(f"  recorded {recorded} != replayed {replayed}")
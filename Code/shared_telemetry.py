@@ -0,0 +1,194 @@
+import os
+import sys
+import math
+import mmap
+import fcntl
+import time
+import struct
+import getopt
+
+# Segment layout (little endian, all offsets fixed for the lifetime of the file):
+#   0   MAGIC
+#   8   sequence   uint64, odd while the writer is updating the payload (seqlock)
+#   16  field names, uint16 length + comma separated UTF-8, padded to NAMES_SIZE
+#   PAYLOAD_OFFSET  tick uint64, wall clock timestamp float64, one float64 per field (NaN = never sampled)
+MAGIC = b'PIMSHM\x01\x00'
+SEQUENCE = struct.Struct('<Q')
+NAMES_SIZE = 512
+PAYLOAD_OFFSET = 16 + NAMES_SIZE
+HEAD = struct.Struct('<Qd')
+
+DEFAULT_PATH = '/dev/shm/pi_monitor.telemetry' if os.path.isdir('/dev/shm') else '/tmp/pi_monitor.telemetry'
+
+# Published fields and the metric each one comes from; tuple metrics are split into several fields
+FIELDS = ('case_temp', 'cpu_temp', 'fan_pwm', 'fan_mode', 'fan_duty', 'fan_threshold_low', 'fan_threshold_high',
+          'led_mode', 'cpu_usage', 'memory_usage', 'disk_usage')
+
+
+class SharedTelemetryWriter:
+    """
+    Publishes the latest metric values of Pi_Monitor to a memory mapped file.
+    Other processes read the values with SharedTelemetryReader instead of
+    opening the I2C bus. Updates follow a seqlock: the sequence number is odd
+    while the payload is being written, so readers never need a lock.
+    The writer holds an exclusive flock on the file for its lifetime: a second
+    writer on the same path fails with OSError instead of taking the segment over.
+    """
+    def __init__(self, path=DEFAULT_PATH, fields=FIELDS):
+        self.path = path
+        self.fields = tuple(fields)
+        self.payload = struct.Struct('<Qd' + 'd' * len(self.fields))
+        names = ','.join(self.fields).encode('utf-8')
+        if len(names) + 2 > NAMES_SIZE:
+            raise ValueError("Too many telemetry fields")
+        size = PAYLOAD_OFFSET + self.payload.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise OSError(f"{path} is in use by another monitor")
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+        except OSError:
+            os.close(fd)
+            raise
+        self._lock_fd = fd  # Closing it releases the lock
+        self.sequence = 0
+        self.map[0:8] = MAGIC
+        SEQUENCE.pack_into(self.map, 8, self.sequence)
+        struct.pack_into(f'<H{NAMES_SIZE - 2}s', self.map, 16, len(names), names)
+        self.values = [math.nan] * len(self.fields)
+        self.index = {name: position for position, name in enumerate(self.fields)}
+        self.publish(0, {})
+
+    def publish(self, tick, metrics):
+        # metrics: {metric name: value} sampled this tick, fields that were not sampled keep their last value
+        values = self.values
+        index = self.index
+        for name, value in metrics.items():
+            if name == 'fan_threshold':
+                values[index['fan_threshold_low']], values[index['fan_threshold_high']] = value
+            elif name in index and isinstance(value, (int, float)):
+                values[index[name]] = value
+        self.sequence += 1  # Odd: update in progress
+        SEQUENCE.pack_into(self.map, 8, self.sequence)
+        self.payload.pack_into(self.map, PAYLOAD_OFFSET, tick, time.time(), *values)
+        self.sequence += 1  # Even: consistent
+        SEQUENCE.pack_into(self.map, 8, self.sequence)
+
+    def close(self, remove=True):
+        if self._lock_fd < 0:
+            return
+        if not self.map.closed:
+            self.map.close()
+        if remove:
+            # Still holding the lock, so the file is this writer's own
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        os.close(self._lock_fd)
+        self._lock_fd = -1
+
+
+class SharedTelemetryReader:
+    """
+    Read side of the telemetry segment.
+    The file is mapped once; every read afterwards is plain memory access with
+    no system call. A read is retried when the writer was updating at the same
+    time (odd or changed sequence number); after a few spins the retries back
+    off, and TimeoutError is raised when no consistent read succeeds within
+    `timeout` seconds (e.g. a writer killed in the middle of an update).
+    """
+    def __init__(self, path=DEFAULT_PATH, timeout=0.1):
+        self.path = path
+        self.timeout = timeout
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[0:8] != MAGIC:
+            self.map.close()
+            raise ValueError(f"Not a telemetry segment: {path}")
+        length, = struct.unpack_from('<H', self.map, 16)
+        self.fields = tuple(bytes(self.map[18:18 + length]).decode('utf-8').split(','))
+        self.payload = struct.Struct('<Qd' + 'd' * len(self.fields))
+        self.offsets = {name: PAYLOAD_OFFSET + HEAD.size + 8 * position for position, name in enumerate(self.fields)}
+        self.retries = 0
+
+    def _consistent(self, read):
+        # Run read() until it saw no concurrent update
+        data = self.map
+        attempts = 0
+        deadline = None
+        while True:
+            before, = SEQUENCE.unpack_from(data, 8)
+            if not before & 1:
+                result = read()
+                after, = SEQUENCE.unpack_from(data, 8)
+                if before == after:
+                    return result
+            self.retries += 1
+            attempts += 1
+            if attempts > 10:
+                # An update takes microseconds, longer means the writer is descheduled or gone
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                elif now > deadline:
+                    raise TimeoutError(f"No consistent telemetry in {self.path} (writer stopped mid-update?)")
+                time.sleep(0.0005)
+
+    def get(self, name):
+        # One field, NaN until the monitor sampled it
+        offset = self.offsets[name]
+        return self._consistent(lambda: struct.unpack_from('<d', self.map, offset)[0])
+
+    def snapshot(self):
+        # All fields from the same update, plus 'tick' and 'timestamp'
+        values = self._consistent(lambda: self.payload.unpack_from(self.map, PAYLOAD_OFFSET))
+        result = dict(zip(self.fields, values[2:]))
+        result['tick'] = values[0]
+        result['timestamp'] = values[1]
+        return result
+
+    def age(self):
+        # Seconds since the last update, large when the monitor is not running
+        return time.time() - self._consistent(lambda: HEAD.unpack_from(self.map, PAYLOAD_OFFSET)[1])
+
+    def close(self):
+        if not self.map.closed:
+            self.map.close()
+
+
+if __name__ == '__main__':
+    usage = 'Usage: shared_telemetry.py [--path <segment>] [--watch] [--field <name>]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "path=", "watch", "field="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options:
+        print(usage)
+        sys.exit()
+    try:
+        reader = SharedTelemetryReader(options.get('--path', DEFAULT_PATH))
+    except (OSError, ValueError) as e:
+        print(f"Cannot open telemetry segment: {e}")
+        sys.exit(1)
+    try:
+        while True:
+            if '--field' in options:
+                print(reader.get(options['--field']))
+            else:
+                print(reader.snapshot())
+            if '--watch' not in options:
+                break
+            time.sleep(1)
+    except TimeoutError as e:
+        print(e)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
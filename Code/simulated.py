@@ -0,0 +1,298 @@
+import time
+import threading
+from collections import deque
+
+class SimulatedExpansion:
+    """
+    Stand-in for Expansion that keeps the board registers in memory.
+    It has the same public methods as Expansion, so Pi_Monitor, the replay
+    harness and the benchmarks can run on a machine without the MS51 board.
+    """
+    IIC_ADDRESS = 0x21
+
+    def __init__(self, bus_number=1, address=IIC_ADDRESS, temperature=35):
+        self.bus_number = bus_number
+        self.address = address
+        self.led_colors = [[0, 0, 0] for _ in range(4)]
+        self.led_mode = 1
+        self.fan_mode = 2
+        self.fan_frequency = 50
+        self.fan_duty = [0, 0]
+        self.fan_threshold = [30, 45]
+        self.power_on_check = 1
+        self.temperature = temperature
+        self.transactions = 0   # Number of simulated I2C transactions
+        self.io_delay = 0.0     # Optional per-transaction delay in seconds, to mimic the bus
+
+    def _transaction(self):
+        self.transactions += 1
+        if self.io_delay:
+            time.sleep(self.io_delay)
+
+    def write(self, reg, values):
+        # Raw register writes are accepted and ignored
+        self._transaction()
+
+    def read(self, reg, length=1):
+        # Raw register reads return zeros
+        self._transaction()
+        return 0 if length == 1 else [0] * length
+
+    def end(self):
+        pass
+
+    def set_i2c_addr(self, addr):
+        self._transaction()
+        self.address = addr
+
+    def set_led_color(self, led_id, r, g, b):
+        self._transaction()
+        self.led_colors[led_id] = [r, g, b]
+
+    def set_all_led_color(self, r, g, b):
+        self._transaction()
+        self.led_colors = [[r, g, b] for _ in range(4)]
+
+    def set_led_mode(self, mode):
+        self._transaction()
+        self.led_mode = mode
+
+    def set_fan_mode(self, mode):
+        self._transaction()
+        self.fan_mode = mode
+
+    def set_fan_frequency(self, freq):
+        self._transaction()
+        self.fan_frequency = freq
+
+    def set_fan_duty(self, duty0, duty1):
+        self._transaction()
+        self.fan_duty = [duty0, duty1]
+
+    def set_fan_threshold(self, low_threshold, high_threshold):
+        self._transaction()
+        self.fan_threshold = [low_threshold, high_threshold]
+
+    def set_power_on_check(self, state):
+        self._transaction()
+        self.power_on_check = state
+
+    def set_save_flash(self, state):
+        self._transaction()
+
+    def get_iic_addr(self):
+        self._transaction()
+        return self.address
+
+    def get_led_color(self, led_id):
+        self._transaction()
+        return list(self.led_colors[led_id])
+
+    def get_all_led_color(self):
+        self._transaction()
+        return [value for color in self.led_colors for value in color]
+
+    def get_led_mode(self):
+        self._transaction()
+        return self.led_mode
+
+    def get_fan_mode(self):
+        self._transaction()
+        return self.fan_mode
+
+    def get_fan_frequency(self):
+        self._transaction()
+        return self.fan_frequency
+
+    def get_fan0_duty(self):
+        self._transaction()
+        return self.fan_duty[0]
+
+    def get_fan1_duty(self):
+        self._transaction()
+        return self.fan_duty[1]
+
+    def get_fan_threshold(self):
+        self._transaction()
+        return list(self.fan_threshold)
+
+    def get_temp(self):
+        self._transaction()
+        return int(self.temperature)
+
+    def get_brand(self):
+        self._transaction()
+        return "Freenove"
+
+    def get_version(self):
+        self._transaction()
+        return "SIMULATED"
+
+
+class DummyDisplay:
+    """
+    Stand-in for the luma ssd1306 device, keeps the last displayed image.
+    Pass it as OLED(device=DummyDisplay()) to render without a display attached.
+    """
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.height = height
+        self.mode = '1'
+        self.frames = 0
+        self.last_image = None
+        self.last_data = None
+        self.commands = deque(maxlen=64)  # Most recent raw commands
+        self.bytes_sent = 0               # Command and data bytes a real display would have received
+
+    def display(self, image):
+        self.frames += 1
+        self.last_image = image
+        self.bytes_sent += 6 + self.width * self.height // 8  # luma sends the address window, then the frame
+
+    def command(self, *cmd):
+        self.commands.append(cmd)
+        self.bytes_sent += len(cmd)
+
+    def data(self, values):
+        # Raw page data as sent by OLED.show_packed
+        self.frames += 1
+        self.last_data = bytes(values)
+        self.bytes_sent += len(self.last_data)
+
+    def cleanup(self):
+        pass
+
+
+class SyntheticJpegSource:
+    """
+    Stand-in for the JpegEncoder: writes JPEG test frames into a StreamingOutput
+    (or any object with write()) from a background thread at a fixed rate.
+    Frames are pre-encoded once, so the source itself costs almost no CPU.
+    """
+    def __init__(self, output, size=(400, 300), fps=30, distinct_frames=30, quality=80, frames=None):
+        # frames: optional list of ready JPEG buffers, otherwise test frames are rendered with PIL
+        self.output = output
+        self.size = size
+        self.fps = fps
+        self.frames = frames if frames is not None else self._render(size, distinct_frames, quality)
+        self.count = 0
+        self._thread = None
+        self._running = False
+
+    @staticmethod
+    def _render(size, count, quality):
+        # Pre-encode a moving bar with a frame counter
+        import io
+        from PIL import Image, ImageDraw
+        frames = []
+        width, height = size
+        for index in range(count):
+            image = Image.new('RGB', size, (16, 16, 16))
+            draw = ImageDraw.Draw(image)
+            x = index * width // count
+            draw.rectangle((x, 0, x + width // 10, height - 1), fill=(230, 120, 20))
+            draw.text((4, 4), f"frame {index}", fill=(255, 255, 255))
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=quality)
+            frames.append(buffer.getvalue())
+        return frames
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        period = 1.0 / self.fps
+        next_time = time.monotonic()
+        while self._running:
+            self.output.write(self.frames[self.count % len(self.frames)])
+            self.count += 1
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class SyntheticFrameSource:
+    """
+    Stand-in for Camera.capture_array(): returns RGB arrays of a moving gradient,
+    optionally taking `capture_delay` seconds per frame like a real sensor readout.
+    """
+    def __init__(self, size=(640, 480), capture_delay=0.0):
+        import numpy as np
+        self.np = np
+        self.size = size
+        self.capture_delay = capture_delay
+        self.count = 0
+        width, height = size
+        self._x = np.arange(width, dtype=np.uint16)[None, :]
+        self._y = np.arange(height, dtype=np.uint16)[:, None]
+
+    def capture_array(self, name="main"):
+        np = self.np
+        if self.capture_delay:
+            time.sleep(self.capture_delay)
+        shift = self.count * 4
+        self.count += 1
+        width, height = self.size
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (self._x + shift) & 0xFF
+        frame[..., 1] = (self._y + shift) & 0xFF
+        frame[..., 2] = ((self._x + self._y) >> 2) & 0xFF
+        return frame
+
+
+class ThermalPlant:
+    """
+    Two-node thermal stand-in for a Pi in the case: the SoC heats the case air,
+    the case air loses heat to the room. Both conductances grow with the fan duty
+    of a SimulatedExpansion, whose temperature register follows the case air.
+    advance() moves the simulation forward, e.g. from a virtual sleep().
+    """
+    def __init__(self, expansion, ambient=25.0, idle_power=2.5, full_power=8.0):
+        self.expansion = expansion
+        self.ambient = ambient
+        self.idle_power = idle_power   # W
+        self.full_power = full_power   # W at load 1.0
+        self.load = 0.0                # CPU load 0..1
+        self.soc_capacity = 15.0       # J/K
+        self.case_capacity = 60.0      # J/K
+        fan = expansion.fan_duty[0] / 255.0
+        power = idle_power
+        self.case = ambient + power / self._case_conductance(fan)
+        self.soc = self.case + power / self._soc_conductance(fan)
+        expansion.temperature = self.case
+
+    @staticmethod
+    def _soc_conductance(fan):
+        return 0.25 + 0.35 * fan  # W/K, heatsink to case air
+
+    @staticmethod
+    def _case_conductance(fan):
+        return 0.5 + 0.3 * fan    # W/K, case air to room
+
+    def advance(self, seconds, step=0.5):
+        fan = self.expansion.fan_duty[0] / 255.0
+        power = self.idle_power + self.load * (self.full_power - self.idle_power)
+        soc_conductance = self._soc_conductance(fan)
+        case_conductance = self._case_conductance(fan)
+        while seconds > 0:
+            dt = min(step, seconds)
+            to_case = soc_conductance * (self.soc - self.case)
+            self.soc += dt * (power - to_case) / self.soc_capacity
+            self.case += dt * (to_case - case_conductance * (self.case - self.ambient)) / self.case_capacity
+            seconds -= dt
+        self.expansion.temperature = self.case
+
+    def cpu_temperature(self):
+        # Like the thermal zone: millidegree sensor, read as °C
+        return round(self.soc, 1)
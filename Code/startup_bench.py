@@ -0,0 +1,96 @@
+import os
+import re
+import sys
+import time
+import getopt
+import subprocess
+
+# Startup benchmark for application.py:
+#   - import time breakdown from `python -X importtime`
+#   - time to first frame / ready, measured from the launch of the interpreter
+# Runs against the stand-in devices (PI_MONITOR_SIMULATE=1) unless --hardware is given.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_breakdown(module='application', top=15):
+    """Return [(cumulative_us, self_us, module)] for the slowest top-level imports of a module"""
+    env = dict(os.environ, PI_MONITOR_SIMULATE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=HERE, env=env, capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(cumulative_us), int(self_us), len(indent) // 2, name))
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    # Only direct imports of the module (depth 1) and the module itself
+    top_level = [(cumulative, own, name) for cumulative, own, depth, name in entries if depth <= 1]
+    return sorted(top_level, reverse=True)[:top]
+
+
+def time_to_first_frame(simulate=True):
+    """Start application.py once and return its startup milestones in ms"""
+    env = dict(os.environ, PI_MONITOR_STARTUP_EXIT='1', PI_MONITOR_T0=repr(time.time()))
+    if simulate:
+        env['PI_MONITOR_SIMULATE'] = '1'
+    result = subprocess.run([sys.executable, os.path.join(HERE, 'application.py')],
+                            cwd=HERE, env=env, capture_output=True, text=True)
+    milestones = {}
+    for line in result.stdout.splitlines():
+        if line.startswith('startup: '):
+            name, ms, _ = line[len('startup: '):].rsplit(' ', 2)
+            milestones[name] = float(ms)
+    if not milestones:
+        print(result.stdout + result.stderr)
+    return milestones
+
+
+def main(argv):
+    usage = 'Usage: startup_bench.py [--runs N] [--budget-ms MS] [--hardware]'
+    try:
+        opts, args = getopt.getopt(argv, "h", ["help", "runs=", "budget-ms=", "hardware"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    runs = 5
+    budget_ms = None
+    simulate = True
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print(usage)
+            sys.exit()
+        elif opt == "--runs":
+            runs = int(arg)
+        elif opt == "--budget-ms":
+            budget_ms = float(arg)
+        elif opt == "--hardware":
+            simulate = False
+
+    print("Import time (cumulative / self, ms):")
+    for cumulative, own, name in import_breakdown():
+        print(f"  {cumulative / 1000:8.1f} {own / 1000:8.1f}  {name}")
+
+    samples = {}
+    for _ in range(runs):
+        for name, ms in time_to_first_frame(simulate).items():
+            samples.setdefault(name, []).append(ms)
+    print(f"Startup milestones over {runs} runs (min / median / max, ms):")
+    for name, values in sorted(samples.items(), key=lambda item: min(item[1])):
+        values.sort()
+        print(f"  {name:<16}{values[0]:8.1f}{values[len(values) // 2]:8.1f}{values[-1]:8.1f}")
+
+    if budget_ms is not None:
+        first_frame = sorted(samples.get('first_frame', [float('inf')]))
+        median = first_frame[len(first_frame) // 2]
+        if median > budget_ms:
+            print(f"Time to first frame {median:.1f} ms is over the budget of {budget_ms:.1f} ms")
+            sys.exit(1)
+        print(f"Time to first frame {median:.1f} ms is within the budget of {budget_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
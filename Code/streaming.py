@@ -0,0 +1,230 @@
+import sys
+import json
+import time
+import getopt
+import socket
+import threading
+from http import server
+from socketserver import ThreadingMixIn
+
+PAGE = b"""<html>
+<head><title>Freenove Computer Case Camera</title></head>
+<body><img src="stream.mjpg" style="max-width:100%"/></body>
+</html>
+"""
+
+BOUNDARY = b'FRAME'
+
+
+class ClientStats:
+    """Per-client counters: frames sent, frames skipped and a smoothed fps"""
+    __slots__ = ['address', 'connected_at', 'sent', 'dropped', 'bytes', 'fps', '_last_sent']
+
+    def __init__(self, address):
+        self.address = address
+        self.connected_at = time.monotonic()
+        self.sent = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.fps = 0.0
+        self._last_sent = None
+
+    def frame_sent(self, size, skipped):
+        now = time.monotonic()
+        if self._last_sent is not None:
+            interval = now - self._last_sent
+            if interval > 0:
+                # Exponential moving average over roughly the last 10 frames
+                self.fps += (1.0 / interval - self.fps) * 0.1
+        self._last_sent = now
+        self.sent += 1
+        self.dropped += skipped
+        self.bytes += size
+
+    def as_dict(self):
+        return {
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'seconds': round(time.monotonic() - self.connected_at, 1),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'bytes': self.bytes,
+            'fps': round(self.fps, 1),
+        }
+
+
+class StreamingHandler(server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        # Keep the request log out of the journal
+        pass
+
+    def do_GET(self):
+        if self.path in ('/', '/index.html'):
+            self._send_body(PAGE, 'text/html')
+        elif self.path == '/stream.mjpg':
+            self._stream()
+        elif self.path == '/snapshot.jpg':
+            latest = self.server.output.latest()
+            if latest is not None:
+                frame = latest[2]
+            else:
+                _, frame = self.server.output.wait_newer_than(0, timeout=self.server.frame_timeout)
+            if frame is None:
+                self.send_error(503)
+            else:
+                self._send_body(frame, 'image/jpeg')
+        elif self.path == '/stats':
+            body = json.dumps(self.server.stats(), indent=1).encode('utf-8')
+            self._send_body(body, 'application/json')
+        else:
+            self.send_error(404)
+
+    def _send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        self.send_response(200)
+        self.send_header('Age', '0')
+        self.send_header('Cache-Control', 'no-cache, private')
+        self.send_header('Pragma', 'no-cache')
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + BOUNDARY.decode())
+        self.end_headers()
+
+        output = self.server.output
+        stats = self.server.add_client(self.client_address)
+        # A client that cannot take a frame within send_timeout is disconnected
+        self.connection.settimeout(self.server.send_timeout)
+        min_interval = 1.0 / self.server.max_fps if self.server.max_fps else 0.0
+        sequence = output.sequence
+        try:
+            while not self.server.stopping:
+                newest, frame = output.wait_newer_than(sequence, timeout=self.server.frame_timeout)
+                if frame is None:
+                    continue
+                # Everything between the last frame sent and the newest one is skipped
+                skipped = newest - sequence - 1
+                sequence = newest
+                started = time.monotonic()
+                header = b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % (BOUNDARY, len(frame))
+                # The encoder buffer is shared by all clients, it is written without copying
+                self.wfile.write(header)
+                self.wfile.write(frame)
+                self.wfile.write(b'\r\n')
+                stats.frame_sent(len(frame), skipped)
+                if min_interval:
+                    remaining = min_interval - (time.monotonic() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            pass
+        finally:
+            self.server.remove_client(stats)
+
+
+class MJPEGServer(ThreadingMixIn, server.HTTPServer):
+    """
+    MJPEG-over-HTTP server fanning out the frames of one StreamingOutput.
+    Every client has its own thread and always sends the newest frame; frames
+    that arrive while a client is still sending are skipped for that client only,
+    so a slow client never delays the others or the encoder.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, output, address=('', 8000), max_fps=None, send_timeout=5.0, frame_timeout=1.0):
+        super().__init__(address, StreamingHandler)
+        self.output = output
+        self.max_fps = max_fps            # Optional per-client fps cap
+        self.send_timeout = send_timeout  # Seconds a client may block on one frame
+        self.frame_timeout = frame_timeout
+        self.stopping = False
+        self.clients = []
+        self.finished = []                # Stats of disconnected clients, most recent last
+        self.clients_lock = threading.Lock()
+        self._thread = None
+
+    def add_client(self, address):
+        stats = ClientStats(address)
+        with self.clients_lock:
+            self.clients.append(stats)
+        return stats
+
+    def remove_client(self, stats):
+        with self.clients_lock:
+            if stats in self.clients:
+                self.clients.remove(stats)
+            self.finished = (self.finished + [stats])[-20:]
+
+    def stats(self):
+        # Per-client statistics of connected and recently disconnected clients
+        with self.clients_lock:
+            return {
+                'frame_sequence': self.output.sequence,
+                'clients': [stats.as_dict() for stats in self.clients],
+                'finished': [stats.as_dict() for stats in self.finished],
+            }
+
+    def start(self):
+        # Serve from a background thread
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == '__main__':
+    usage = 'Usage: streaming.py [--port N] [--max-fps N] [--synthetic]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "port=", "max-fps=", "synthetic"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    port = 8000
+    max_fps = None
+    synthetic = False
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print(usage)
+            sys.exit()
+        elif opt == "--port":
+            port = int(arg)
+        elif opt == "--max-fps":
+            max_fps = float(arg)
+        elif opt == "--synthetic":
+            synthetic = True
+
+    from camera import StreamingOutput
+    camera = None
+    source = None
+    if synthetic:
+        from simulated import SyntheticJpegSource
+        output = StreamingOutput()
+        source = SyntheticJpegSource(output)
+        source.start()
+    else:
+        from camera import Camera
+        camera = Camera()
+        output = camera.streaming_output
+        camera.start_stream()
+
+    mjpeg_server = MJPEGServer(output, ('', port), max_fps=max_fps)
+    try:
+        print(f"Streaming on http://0.0.0.0:{port}/ (stats on /stats), use Ctrl+C to exit...")
+        mjpeg_server.serve_forever()
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
+    finally:
+        mjpeg_server.server_close()
+        if source is not None:
+            source.stop()
+        if camera is not None:
+            camera.close()
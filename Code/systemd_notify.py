@@ -0,0 +1,65 @@
+import os
+import socket
+import time
+
+
+class Notifier:
+    """
+    Minimal sd_notify client.
+    Sends READY/WATCHDOG/STOPPING datagrams to $NOTIFY_SOCKET when the process
+    runs under a Type=notify unit; every call is a no-op otherwise, so the
+    monitor behaves the same when started by hand.
+    """
+    def __init__(self, environ=None):
+        environ = os.environ if environ is None else environ
+        self.address = environ.get('NOTIFY_SOCKET')
+        if self.address and self.address.startswith('@'):
+            self.address = '\0' + self.address[1:]  # Abstract namespace socket
+        self.socket = None
+        if self.address:
+            try:
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+            except OSError:
+                self.socket = None
+        # WATCHDOG_USEC is only meant for us if WATCHDOG_PID is unset or our pid
+        watchdog_usec = int(environ.get('WATCHDOG_USEC', '0') or 0)
+        watchdog_pid = environ.get('WATCHDOG_PID')
+        if watchdog_pid and watchdog_pid != str(os.getpid()):
+            watchdog_usec = 0
+        self.watchdog_interval = watchdog_usec / 1e6  # Seconds, 0 when the watchdog is off
+        self._next_ping = 0.0
+
+    @property
+    def enabled(self):
+        return self.socket is not None
+
+    def notify(self, state):
+        # Send one state string, returns False when there is no manager to talk to
+        if self.socket is None:
+            return False
+        try:
+            self.socket.sendto(state.encode('utf-8'), self.address)
+            return True
+        except OSError:
+            return False
+
+    def ready(self, status=None):
+        return self.notify('READY=1' if status is None else f'READY=1\nSTATUS={status}')
+
+    def watchdog(self):
+        # Ping at most twice per watchdog interval, as systemd recommends
+        if not self.watchdog_interval or self.socket is None:
+            return False
+        now = time.monotonic()
+        if now < self._next_ping:
+            return False
+        self._next_ping = now + self.watchdog_interval / 2
+        return self.notify('WATCHDOG=1')
+
+    def stopping(self):
+        return self.notify('STOPPING=1')
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
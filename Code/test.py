@@ -2,7 +2,10 @@
 import sys
 import time
 import getopt
-from expansion import Expansion
+try:
+    from expansion import Expansion
+except ImportError:
+    Expansion = None  # smbus missing: only --bench works, with stand-in devices
 from camera import Camera
 from oled import OLED
 
@@ -75,14 +78,23 @@ def led_rainbow():
 
 def main(argv):
     try:
-        opts, args = getopt.getopt(argv, "h", ["help", "camera", "oled", "fan", "led="])
+        opts, args = getopt.getopt(argv, "h", ["help", "camera", "oled", "fan", "led=",
+                                               "bench", "simulate", "output=", "seconds="])
     except getopt.GetoptError:
-        print('Usage: test.py --camera | --oled | --fan | --led <mode:1-4>')
+        print('Usage: test.py --camera | --oled | --fan | --led <mode:1-4> | --bench [--simulate] [--output <json>] [--seconds N]')
         sys.exit(2)
 
+    options = dict(opts)
+    if "--bench" in options:
+        # Measure instead of demonstrating, stand-in devices are used for anything that does not respond
+        from hardware_bench import run
+        run(output_path=options.get("--output", "bench_results.json"), simulate="--simulate" in options,
+            seconds=float(options.get("--seconds", 2)))
+        return
+
     for opt, arg in opts:
         if opt in ("-h", "--help"):
-            print('Usage: test.py --camera | --oled | --fan | --led <mode:1-4>')
+            print('Usage: test.py --camera | --oled | --fan | --led <mode:1-4> | --bench [--simulate] [--output <json>] [--seconds N]')
             sys.exit()
         elif opt == "--camera":
             try:
@@ -101,8 +113,8 @@ def main(argv):
         elif opt == "--oled":
             try:
                 oled = OLED()
-                oled.draw_text("OLED Test!", position=(32, 15))
-                oled.draw_text("www.Freenove.com", position=(15, 35))
+                oled.draw_text_box("OLED Test!\nwww.Freenove.com", (0, 0, oled.device.width, oled.device.height),
+                                   align='center', valign='middle', spacing=10)
                 oled.show()
                 print("Use Ctrl+C to exit...")
                 while True:
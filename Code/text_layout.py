@@ -0,0 +1,164 @@
+import sys
+import time
+import getopt
+
+ALIGN = ('left', 'center', 'right')
+VALIGN = ('top', 'middle', 'bottom')
+
+
+class TextLayout:
+    """
+    Text measurement and layout for the OLED, memoized.
+    Widths are cached per (font, size, string) and line heights per (font, size),
+    so a string is measured by FreeType once. Complete layouts (chosen font size
+    and the position of every line in a box) are cached per distinct text and
+    parameters, so a screen that draws the same string every frame lays it out
+    once. Each cache is cleared when it grows past `max_entries`, which bounds
+    the memory of screens whose text changes every tick (clock, usage).
+    """
+    def __init__(self, get_font, font_id, max_entries=1024):
+        self.get_font = get_font  # font size (None: built-in bitmap font) -> PIL font
+        self.font_id = font_id    # Part of every key, e.g. the path of the TrueType font
+        self.max_entries = max_entries
+        self._widths = {}
+        self._heights = {}
+        self._layouts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, cache, key, value):
+        if len(cache) >= self.max_entries:
+            cache.clear()
+        cache[key] = value
+        return value
+
+    def width(self, text, font_size=None):
+        # Advance width of one line in pixels
+        key = (self.font_id, font_size, text)
+        try:
+            return self._widths[key]
+        except KeyError:
+            pass
+        return self._store(self._widths, key, self.get_font(font_size).getlength(text))
+
+    def line_height(self, font_size=None):
+        # Ascent plus descent of a font size in pixels
+        key = (self.font_id, font_size)
+        try:
+            return self._heights[key]
+        except KeyError:
+            pass
+        font = self.get_font(font_size)
+        if hasattr(font, 'getmetrics'):
+            ascent, descent = font.getmetrics()
+            height = ascent + descent
+        else:
+            left, top, right, bottom = font.getbbox("Ag")
+            height = bottom
+        return self._store(self._heights, key, height)
+
+    def wrap(self, text, width, font_size=None):
+        """Lines of `text` no wider than `width`: explicit newlines are kept, words are moved to the next
+        line and a word wider than the box is broken between characters"""
+        lines = []
+        for paragraph in text.split('\n'):
+            line = ''
+            for word in paragraph.split(' '):
+                candidate = f"{line} {word}" if line else word
+                if self.width(candidate, font_size) <= width:
+                    line = candidate
+                    continue
+                if line:
+                    lines.append(line)
+                line = ''
+                for char in word:
+                    if line and self.width(line + char, font_size) > width:
+                        lines.append(line)
+                        line = ''
+                    line += char
+            lines.append(line)
+        return lines
+
+    def _fits(self, lines, size, font_size, spacing):
+        width, height = size
+        total = len(lines) * self.line_height(font_size) + (len(lines) - 1) * spacing
+        return total <= height and all(self.width(line, font_size) <= width for line in lines)
+
+    def fit_size(self, text, size, min_size=8, max_size=32, wrap=True, spacing=0):
+        """Largest font size whose (wrapped) text fits a box of `size`, min_size when none fits"""
+        low, high, best = min_size, max_size, min_size
+        while low <= high:
+            font_size = (low + high) // 2
+            lines = self.wrap(text, size[0], font_size) if wrap else text.split('\n')
+            if self._fits(lines, size, font_size, spacing):
+                best, low = font_size, font_size + 1
+            else:
+                high = font_size - 1
+        return best
+
+    def layout(self, text, size, font_size=None, fit=False, min_size=8, max_size=32, align='left', valign='top',
+               wrap=True, spacing=0):
+        """
+        Lay out `text` in a box of `size` (width, height).
+        fit: use the largest font size from min_size to max_size that fits, instead of font_size.
+        Returns (font size, [(x, y, line), ...]) with positions relative to the box.
+        """
+        key = (self.font_id, text, size, font_size, fit, min_size, max_size, align, valign, wrap, spacing)
+        try:
+            result = self._layouts[key]
+            self.hits += 1
+            return result
+        except KeyError:
+            self.misses += 1
+        if align not in ALIGN or valign not in VALIGN:
+            raise ValueError(f"align must be one of {ALIGN} and valign one of {VALIGN}")
+        width, height = size
+        if fit:
+            font_size = self.fit_size(text, size, min_size, max_size, wrap, spacing)
+        lines = self.wrap(text, width, font_size) if wrap else text.split('\n')
+        line_height = self.line_height(font_size)
+        total = len(lines) * line_height + (len(lines) - 1) * spacing
+        y = {'top': 0, 'middle': (height - total) // 2, 'bottom': height - total}[valign]
+        placed = []
+        for line in lines:
+            free = width - self.width(line, font_size)
+            x = {'left': 0, 'center': free / 2, 'right': free}[align]
+            placed.append((int(round(x)), y, line))
+            y += line_height + spacing
+        return self._store(self._layouts, key, (font_size, tuple(placed)))
+
+    def clear(self):
+        self._widths.clear()
+        self._heights.clear()
+        self._layouts.clear()
+
+
+def benchmark(frames=500):
+    """Milliseconds per frame of a screen of fitted, wrapped and centred text, with and without the caches"""
+    from oled import OLED
+    from simulated import DummyDisplay
+    text = ("Host: raspberrypi", "Wlan0: 192.168.100.200", "CPU 12%  Mem 34%", "PI ℃: 48.3  PC ℃: 35")
+    for label, max_entries in (('cached', 1024), ('uncached', 0)):
+        oled = OLED(device=DummyDisplay())
+        oled.layout.max_entries = max_entries
+        started = time.perf_counter()
+        for _ in range(frames):
+            oled.clear()
+            for row, line in enumerate(text):
+                oled.draw_text_box(line, (0, row * 16, 128, 16), fit=True, max_size=12, align='center')
+        elapsed = time.perf_counter() - started
+        print(f"{label:<10}{1000 * elapsed / frames:8.3f} ms/frame  layouts computed: {oled.layout.misses}")
+
+
+if __name__ == '__main__':
+    usage = 'Usage: text_layout.py --bench [--frames N]'
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "bench", "frames="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '--bench' not in options:
+        print(usage)
+        sys.exit(2)
+    benchmark(int(options.get('--frames', 500)))
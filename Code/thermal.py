@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import time
+import getopt
+import datetime
+
+# Result of the last characterization run, read by application.py for the fan thresholds
+FAN_CURVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fan_curve.json")
+DEFAULT_THRESHOLD = (45, 70)
+
+# Fan duties held under full load, from full speed down so the SoC heats up step by step
+DEFAULT_LEVELS = (255, 192, 128, 64, 0)
+
+
+def read_cpu_temperature():
+    """SoC temperature in °C from the thermal zone, like Pi_Monitor.get_raspberry_cpu_temperature"""
+    with open('/sys/devices/virtual/thermal/thermal_zone0/temp', 'r') as f:
+        return int(f.read().strip()) / 1000.0
+
+
+def _spin(stop):
+    # Busy loop of one load worker
+    x = 0
+    while not stop.is_set():
+        for _ in range(10000):
+            x += 1
+
+
+class CpuLoad:
+    """Controlled CPU load: one busy process per core while on"""
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._processes = []
+        self._stop = None
+
+    def set(self, on):
+        if on and not self._processes:
+            import multiprocessing
+            self._stop = multiprocessing.Event()
+            self._processes = [multiprocessing.Process(target=_spin, args=(self._stop,), daemon=True)
+                               for _ in range(self.workers)]
+            for process in self._processes:
+                process.start()
+        elif not on and self._processes:
+            self._stop.set()
+            for process in self._processes:
+                process.join()
+            self._processes = []
+
+
+class Characterizer:
+    """
+    Steps the fan through `levels` (manual fan mode) and records the SoC and case
+    temperature response: first idle with the fan off, then under full load at
+    every level for `settle` seconds each. The fan mode and thresholds of the
+    board are restored afterwards. A step is cut short and the fan set to full
+    speed when the SoC reaches `limit` °C.
+    set_load(bool) switches the load, clock and sleep can be virtual (see --simulate).
+    """
+    def __init__(self, expansion, read_soc=read_cpu_temperature, set_load=None, clock=time.monotonic,
+                 sleep=time.sleep, limit=82.0):
+        self.expansion = expansion
+        self.read_soc = read_soc
+        self.set_load = set_load or CpuLoad().set
+        self.clock = clock
+        self.sleep = sleep
+        self.limit = limit
+        self.samples = []   # (seconds, step, load, duty, SoC °C, case °C)
+        self.aborted = False
+
+    def _hold(self, step, load, duty, seconds, interval):
+        self.expansion.set_fan_duty(duty, duty)
+        self.set_load(load)
+        start = self.clock()
+        while self.clock() - start < seconds:
+            soc = self.read_soc()
+            case = self.expansion.get_temp()
+            self.samples.append((self.clock() - self.started, step, load, duty, soc, case))
+            if soc >= self.limit:
+                print(f"SoC at {soc} °C, stopping the run")
+                self.expansion.set_fan_duty(255, 255)
+                self.aborted = True
+                return False
+            self.sleep(interval)
+        return True
+
+    def run(self, levels=DEFAULT_LEVELS, settle=300, interval=2.0, verbose=True):
+        expansion = self.expansion
+        fan_mode = expansion.get_fan_mode()
+        threshold = expansion.get_fan_threshold()
+        self.started = self.clock()
+        steps = [('idle', False, 0)] + [(f"load@{duty}", True, duty) for duty in levels]
+        try:
+            expansion.set_fan_mode(1)
+            for step, load, duty in steps:
+                if verbose:
+                    print(f"{step}: {settle} s")
+                if not self._hold(step, load, duty, settle, interval):
+                    break
+        finally:
+            self.set_load(False)
+            expansion.set_fan_mode(fan_mode)
+            expansion.set_fan_threshold(*threshold)
+        return self.samples
+
+
+def _line(xs, ys):
+    # Least squares y = intercept + slope * x, None when x does not vary
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    if sxx <= 1e-12:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sxx
+    return mean_y - slope * mean_x, slope
+
+
+def settled_value(values):
+    """
+    Steady-state value of a first-order response, extrapolated from the second
+    half of a step with x[k+1] = alpha * x[k] + beta (x settles at beta / (1 - alpha)).
+    Falls back to the mean of the last quarter when the step is flat or noisy.
+    """
+    tail = values[len(values) // 2:]
+    fallback = sum(values[-max(1, len(values) // 4):]) / max(1, len(values) // 4)
+    if len(tail) < 4:
+        return fallback
+    fit = _line(tail[:-1], tail[1:])
+    if fit is None:
+        return fallback
+    beta, alpha = fit
+    if not 0.0 < alpha < 0.999:
+        return fallback
+    value = beta / (1.0 - alpha)
+    # An extrapolation far beyond what was seen is noise, not a trend
+    if abs(value - tail[-1]) > 2.0 * abs(tail[-1] - tail[0]) + 1.0:
+        return fallback
+    return value
+
+
+def fit_model(samples, ambient=None):
+    """
+    Fit the steady SoC temperature under full load to
+        T(u) = ambient + 1 / (a + b * u)      u = fan duty / 255
+    (a and b are thermal conductances per watt of full load), the idle power as a
+    fraction of the full load power, and the case temperature as a linear function
+    of the SoC temperature. The ambient temperature is fitted too unless given.
+    """
+    steps = {}
+    for _, step, load, duty, soc, case in samples:
+        steps.setdefault(step, (load, duty, [], []))
+        steps[step][2].append(soc)
+        steps[step][3].append(case)
+    summary = []
+    for step, (load, duty, socs, cases) in steps.items():
+        summary.append({'step': step, 'load': load, 'duty': duty, 'samples': len(socs),
+                        'soc': round(settled_value(socs), 2), 'case': round(settled_value(cases), 2)})
+    loaded = [s for s in summary if s['load'] and s['samples'] >= 8]
+    idle = [s for s in summary if not s['load']]
+    if len(loaded) < 2:
+        raise ValueError("Need at least two completed load steps to fit the model")
+
+    def conductances(amb):
+        # Linear fit of 1 / (T - ambient) against u, and the squared temperature error of that fit
+        us = [s['duty'] / 255.0 for s in loaded]
+        ys = [1.0 / (s['soc'] - amb) for s in loaded]
+        fit = _line(us, ys)
+        if fit is None:
+            return None, float('inf')
+        a, b = fit
+        error = 0.0
+        for u, s in zip(us, loaded):
+            g = a + b * u
+            if g <= 0:
+                return None, float('inf')
+            error += (amb + 1.0 / g - s['soc']) ** 2
+        return (a, b), error
+
+    coolest = min(s['soc'] for s in summary)
+    if ambient is None:
+        if len(loaded) < 3:
+            raise ValueError("Need three load steps or --ambient to fit the ambient temperature")
+        candidates = [coolest - 0.5 - 0.1 * i for i in range(400)]
+        ambient = min(candidates, key=lambda amb: conductances(amb)[1])
+    conductance, error = conductances(ambient)
+    if conductance is None:
+        raise ValueError(f"Steady temperatures do not fit an ambient of {ambient} °C")
+    a, b = conductance
+    idle_fraction = (idle[0]['soc'] - ambient) * a if idle else 0.3
+    case_fit = _line([s['soc'] for s in summary], [s['case'] for s in summary]) or (0.0, 1.0)
+    return {
+        'ambient': round(ambient, 2),
+        'a': a,
+        'b': b,
+        'idle_fraction': max(0.0, min(1.0, idle_fraction)),
+        'case_offset': case_fit[0],
+        'case_slope': case_fit[1],
+        'rms_error': round((error / len(loaded)) ** 0.5, 3),
+        'steps': summary,
+    }
+
+
+def steady_temperature(model, load, duty):
+    """Modelled steady SoC temperature at load 0..1 and fan duty 0..255"""
+    power = model['idle_fraction'] + (1.0 - model['idle_fraction']) * load
+    return model['ambient'] + power / (model['a'] + model['b'] * duty / 255.0)
+
+
+def required_duty(model, load, temperature):
+    """Lowest fan duty 0..255 that holds the SoC at `temperature` under `load`, 255 if even full speed is not enough"""
+    power = model['idle_fraction'] + (1.0 - model['idle_fraction']) * load
+    if temperature <= model['ambient'] or model['b'] <= 0:
+        return 255
+    u = (power / (temperature - model['ambient']) - model['a']) / model['b']
+    return int(round(255 * max(0.0, min(1.0, u))))
+
+
+def fan_curve(model, target=70.0, min_duty=50, points=9):
+    """
+    Duty-vs-SoC-temperature curve with the least fan for a peak of `target` °C.
+    The fan starts where the SoC settles at idle without fan; from there every
+    load level gets the equilibrium temperature of a straight line up to `target`
+    at full load, and the curve point is the duty the model needs to hold it.
+    Duties below `min_duty` (where the fan stalls) are raised to it.
+    Returns ([(°C, duty), ...], feasible), feasible is False when full load
+    exceeds `target` even at full speed.
+    """
+    start = min(steady_temperature(model, 0.0, 0), target - 5.0)
+    curve = []
+    for i in range(points):
+        load = i / (points - 1)
+        temperature = start + load * (target - start)
+        duty = required_duty(model, load, temperature)
+        if 0 < duty < min_duty:
+            duty = min_duty
+        curve.append((round(temperature, 1), duty))
+    # Monotonic: a hotter SoC never gets less fan
+    for i in range(1, len(curve)):
+        if curve[i][1] < curve[i - 1][1]:
+            curve[i] = (curve[i][0], curve[i - 1][1])
+    return curve, steady_temperature(model, 1.0, 255) <= target
+
+
+def board_thresholds(model, curve):
+    """
+    (low, high) for Expansion.set_fan_threshold: the board's auto mode ramps the
+    fan from off at `low` to full speed at `high` of its own (case) sensor. The
+    ramp starts where the curve switches the fan on and has the least squares
+    slope through the powered points; its SoC temperatures are mapped to the case.
+    """
+    low_soc = curve[0][0]
+    for temperature, duty in curve:
+        if duty > 0:
+            break
+        low_soc = temperature
+    powered = [(temperature - low_soc, duty) for temperature, duty in curve if duty > 0]
+    spread = sum(x * x for x, _ in powered)
+    slope = sum(x * duty for x, duty in powered) / spread if spread > 0 else 0.0
+    high_soc = low_soc + (255.0 / slope if slope > 0 else 10.0)
+
+    def to_case(soc):
+        return model['case_offset'] + model['case_slope'] * soc
+    low = int(round(to_case(low_soc)))
+    high = max(low + 1, int(round(to_case(high_soc))))
+    return low, high
+
+
+def characterize(expansion, target=70.0, levels=DEFAULT_LEVELS, settle=300, interval=2.0, ambient=None,
+                 min_duty=50, verbose=True, **characterizer_options):
+    """Run the steps, fit the model and return the result saved by save_curve()"""
+    characterizer = Characterizer(expansion, **characterizer_options)
+    samples = characterizer.run(levels, settle, interval, verbose)
+    model = fit_model(samples, ambient)
+    curve, feasible = fan_curve(model, target, min_duty)
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'target': target,
+        'feasible': feasible,
+        'aborted': characterizer.aborted,
+        'threshold': board_thresholds(model, curve),
+        'curve': curve,
+        'model': model,
+    }
+
+
+def save_curve(result, path=FAN_CURVE_PATH):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(result, f, indent=1)
+    os.replace(temporary, path)
+
+
+def load_fan_threshold(path=FAN_CURVE_PATH, default=DEFAULT_THRESHOLD):
+    """(low, high) fan thresholds of the last characterization run, `default` without one"""
+    try:
+        with open(path, 'r') as f:
+            low, high = json.load(f)['threshold']
+        return int(low), int(high)
+    except (OSError, ValueError, KeyError, TypeError):
+        return default
+
+
+def print_result(result):
+    model = result['model']
+    print(f"{'step':<10}{'duty':>6}{'SoC °C':>9}{'case °C':>9}")
+    for step in model['steps']:
+        print(f"{step['step']:<10}{step['duty']:>6}{step['soc']:>9.1f}{step['case']:>9.1f}")
+    print(f"ambient {model['ambient']:.1f} °C, idle power {100 * model['idle_fraction']:.0f}% of full load, "
+          f"fit error {model['rms_error']} °C")
+    print(f"Curve for a peak of {result['target']} °C" + ("" if result['feasible'] else " (not reachable at full load)"))
+    for temperature, duty in result['curve']:
+        print(f"  {temperature:5.1f} °C  {duty:3d}  " + '#' * (duty // 8))
+    print("Board thresholds: set_fan_threshold({}, {})".format(*result['threshold']))
+
+
+def simulate(target=70.0, settle=300, interval=2.0, ambient=None, verbose=True):
+    """Characterize a SimulatedExpansion with a ThermalPlant on virtual time (seconds instead of half an hour)"""
+    from adaptive import VirtualClock
+    from simulated import SimulatedExpansion, ThermalPlant
+    expansion = SimulatedExpansion()
+    plant = ThermalPlant(expansion)
+    clock = VirtualClock()
+
+    def sleep(seconds):
+        plant.advance(seconds)
+        clock.sleep(seconds)
+
+    def set_load(on):
+        plant.load = 1.0 if on else 0.0
+    result = characterize(expansion, target, settle=settle, interval=interval, ambient=ambient, verbose=verbose,
+                          read_soc=plant.cpu_temperature, set_load=set_load, clock=clock.monotonic, sleep=sleep)
+    if verbose:
+        print_result(result)
+        # Check what Pi_Monitor applies against the plant itself: the thresholds are sent with set_fan_threshold,
+        # and the board's auto mode ramps the fan from off at `low` to full speed at `high` of the case sensor
+        expansion.fan_duty = [0, 0]
+        expansion.set_fan_mode(2)
+        expansion.set_fan_threshold(*result['threshold'])
+        low, high = expansion.get_fan_threshold()
+        plant = ThermalPlant(expansion)
+        plant.load = 1.0
+        peak = 0.0
+        for _ in range(1800):
+            ramp = (plant.case - low) / (high - low)
+            duty = int(255 * min(1.0, max(0.0, ramp)))
+            expansion.fan_duty = [duty, duty]
+            plant.advance(1.0)
+            peak = max(peak, plant.soc)
+        print(f"Simulated full load with set_fan_threshold({low}, {high}): peak {peak:.1f} °C, "
+              f"case {plant.case:.1f} °C, fan duty {expansion.fan_duty[0]}")
+    return result
+
+
+if __name__ == '__main__':
+    usage = ('Usage: thermal.py --characterize | --simulate | --show  [--target C] [--settle S] [--interval S] '
+             '[--ambient C] [--output <json>] [--apply]')
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "characterize", "simulate", "show", "target=",
+                                                       "settle=", "interval=", "ambient=", "output=", "apply"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    output = options.get('--output', FAN_CURVE_PATH)
+    target = float(options.get('--target', 70))
+    settle = float(options.get('--settle', 300))
+    interval = float(options.get('--interval', 2))
+    ambient = float(options['--ambient']) if '--ambient' in options else None
+    if '--show' in options:
+        try:
+            with open(output, 'r') as f:
+                print_result(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"No fan curve: {e}")
+            sys.exit(1)
+    elif '--simulate' in options:
+        simulate(target, settle, interval, ambient)
+    elif '--characterize' in options:
+        # Stop the monitor service first, it sets the fan mode and thresholds itself
+        from expansion import Expansion
+        board = Expansion()
+        try:
+            result = characterize(board, target, settle=settle, interval=interval, ambient=ambient)
+            print_result(result)
+            save_curve(result, output)
+            print(f"Saved {output}")
+            if '--apply' in options:
+                board.set_fan_mode(2)
+                board.set_fan_threshold(*result['threshold'])
+        except KeyboardInterrupt:
+            print("KeyboardInterrupt")
+        finally:
+            board.end()
+    else:
+        print(usage)
+        sys.exit(2)
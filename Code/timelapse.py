@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import queue
+import getopt
+import shutil
+import threading
+import subprocess
+
+from PIL import Image
+
+
+class Timelapse:
+    """
+    Timelapse capture with a drift-free schedule.
+    Frame n is captured at start + n * interval (late frames never push the
+    schedule back). Captured arrays go through a bounded queue to a pool of
+    worker threads that JPEG encode and write them, so a slow SD card costs
+    frames, not timing. When the queue is full the drop policy decides:
+    'newest' skips the frame just captured, 'oldest' discards the oldest queued one.
+    """
+    def __init__(self, source, directory, interval=5.0, count=None, duration=None, workers=2,
+                 queue_size=4, drop_policy='newest', quality=90):
+        if drop_policy not in ('newest', 'oldest'):
+            raise ValueError("drop_policy must be 'newest' or 'oldest'")
+        self.source = source                 # Object with capture_array(), e.g. Camera or SyntheticFrameSource
+        self.directory = directory
+        self.interval = interval
+        self.count = count                   # Stop after this many scheduled frames
+        self.duration = duration             # Or after this many seconds
+        self.workers = workers
+        self.drop_policy = drop_policy
+        self.quality = quality
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.missed = 0                      # Schedule slots skipped because capture fell behind
+        self.max_lateness = 0.0
+        self.encode_seconds = 0.0
+        self.files = []
+
+    def run(self):
+        # Capture until count/duration is reached or stop() is called, then drain the workers
+        os.makedirs(self.directory, exist_ok=True)
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        started = time.monotonic()
+        slot = 0
+        try:
+            while not self.stop_event.is_set():
+                if self.count is not None and slot >= self.count:
+                    break
+                due = started + slot * self.interval
+                if self.duration is not None and due - started > self.duration:
+                    break
+                delay = due - time.monotonic()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+                lateness = time.monotonic() - due
+                if lateness > self.max_lateness:
+                    self.max_lateness = lateness
+                frame = self.source.capture_array("main")
+                self._enqueue(slot, frame)
+                self.captured += 1
+                # Next slot in the future; slots that already passed are counted as missed
+                next_slot = slot + 1
+                behind = int((time.monotonic() - started) / self.interval)
+                if behind > next_slot:
+                    self.missed += behind - next_slot
+                    next_slot = behind
+                slot = next_slot
+        finally:
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+        return self.files
+
+    def _enqueue(self, slot, frame):
+        try:
+            self.queue.put_nowait((slot, frame))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            if self.drop_policy == 'oldest':
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self.queue.put_nowait((slot, frame))
+                except queue.Full:
+                    pass
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            slot, frame = item
+            started = time.perf_counter()
+            if frame.ndim == 3 and frame.shape[2] == 4:
+                frame = frame[..., :3]  # Drop the padding byte of XBGR8888
+            path = os.path.join(self.directory, f"frame_{slot:06d}.jpg")
+            Image.fromarray(frame).save(path, quality=self.quality)
+            with self.lock:
+                self.written += 1
+                self.encode_seconds += time.perf_counter() - started
+                self.files.append(path)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {
+            'captured': self.captured,
+            'written': self.written,
+            'dropped': self.dropped,
+            'missed': self.missed,
+            'max_lateness_ms': round(self.max_lateness * 1000, 1),
+            'encode_ms_per_frame': round(1000 * self.encode_seconds / self.written, 1) if self.written else 0.0,
+        }
+
+
+def assemble_video(directory, output_path, fps=25):
+    """Assemble the written frames into an H.264 video with ffmpeg, returns False if ffmpeg is missing"""
+    if shutil.which('ffmpeg') is None:
+        print("ffmpeg not found, skipping video assembly")
+        return False
+    frames = sorted(name for name in os.listdir(directory) if name.startswith('frame_') and name.endswith('.jpg'))
+    if not frames:
+        return False
+    # Dropped frames leave gaps in the numbering, so feed ffmpeg an explicit list
+    list_path = os.path.join(directory, 'frames.txt')
+    with open(list_path, 'w') as f:
+        for name in frames:
+            f.write(f"file '{name}'\nduration {1.0 / fps}\n")
+    result = subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                             '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-r', str(fps), output_path])
+    os.remove(list_path)
+    return result.returncode == 0
+
+
+if __name__ == '__main__':
+    usage = ('Usage: timelapse.py --dir <folder> [--interval S] [--count N] [--duration S] [--workers N] '
+             '[--drop newest|oldest] [--video out.mp4] [--synthetic]')
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "dir=", "interval=", "count=", "duration=",
+                                                        "workers=", "drop=", "video=", "synthetic"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    options = dict(opts)
+    if '-h' in options or '--help' in options or '--dir' not in options:
+        print(usage)
+        sys.exit(2)
+
+    camera = None
+    if '--synthetic' in options:
+        from simulated import SyntheticFrameSource
+        source = SyntheticFrameSource()
+    else:
+        from camera import Camera
+        camera = source = Camera()
+    timelapse = Timelapse(source, options['--dir'],
+                          interval=float(options.get('--interval', 5)),
+                          count=int(options['--count']) if '--count' in options else None,
+                          duration=float(options['--duration']) if '--duration' in options else None,
+                          workers=int(options.get('--workers', 2)),
+                          drop_policy=options.get('--drop', 'newest'))
+    try:
+        print("Use Ctrl+C to stop...")
+        timelapse.run()
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
+        timelapse.stop()
+    finally:
+        if camera is not None:
+            camera.close()
+    print(timelapse.stats())
+    if '--video' in options:
+        assemble_video(options['--dir'], options['--video'])